@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+analysis_cache.py
+
+Content-addressed on-disk cache for rda_disassembler_enhanced.py results.
+
+Each entry is a directory named after a SHA-256 key (firmware hash + the
+analysis options that change the result) holding:
+  - meta.json      JSON-serializable results (strings, loops, string pools, ...)
+  - <name>.npz     NumPy array groups (instruction table columns, CFG edges, ...)
+
+The same entry layout is used for standalone analysis artifacts
+(--save-artifact / --baseline), see write_entry() and read_entry().
+
+Entries are written to a temporary directory and renamed into place, so a
+concurrent reader never sees a half-written entry. The cache is bounded by
+total size; the least recently used entries (by meta.json mtime, refreshed
+on every hit) are evicted first. Sub-caches (subcache(), e.g. the angr CFG
+snapshots) live in subdirectories and count against the same total.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+# Bump when the layout of cached results changes
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.environ.get("RDA_CACHE_DIR", "firmware/cache")
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+META_FILE = "meta.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_of(data):
+    """
+    SHA-256 hex digest of a bytes-like object (bytes, memoryview, mmap) or of
+    the file at path 'data', read in chunks.
+    """
+    digest = hashlib.sha256()
+    if isinstance(data, (str, os.PathLike)):
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def cache_key(content_hash, options):
+    """
+    Combine a firmware hash with the options that affect the analysis result.
+    'options' must be JSON-serializable; key order does not matter.
+    """
+    payload = json.dumps({"version": CACHE_VERSION, "content": content_hash,
+                          "options": options}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def write_entry(path, meta, arrays):
+    """
+    Atomically write one entry (meta.json + one .npz per array group) to the
+    directory 'path', replacing whatever was there.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    meta = dict(meta, _array_groups=sorted(arrays))
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        for name, group in arrays.items():
+            np.savez(os.path.join(tmp_dir, f"{name}.npz"), **group)
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            json.dump(meta, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_dir, path)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_entry(path, meta_only=False):
+    """
+    Read an entry written by write_entry(). Returns (meta, arrays), or None
+    if it is missing or unreadable. With 'meta_only', 'arrays' is left
+    empty and the .npz files are not opened.
+    """
+    try:
+        with open(os.path.join(path, META_FILE), "r") as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in ([] if meta_only else meta.get("_array_groups", [])):
+            with np.load(os.path.join(path, f"{name}.npz"), allow_pickle=False) as npz:
+                arrays[name] = {col: npz[col] for col in npz.files}
+    except (OSError, ValueError):
+        return None
+    return meta, arrays
+
+
+class AnalysisCache:
+    """
+    Size-bounded LRU cache of analysis results in 'cache_dir'.
+
+    store(key, meta, arrays) saves one entry; load(key) returns
+    (meta, arrays) or None. 'arrays' maps a group name to a dict of NumPy
+    arrays, one .npz file per group.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._root = self
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def subcache(self, name):
+        """
+        A cache of other entries in the subdirectory 'name' that shares this
+        cache's max_bytes: storing in either evicts from both, LRU first.
+        """
+        sub = AnalysisCache(os.path.join(self.cache_dir, name), self.max_bytes)
+        sub._root = self._root
+        return sub
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        entry = self.entry_dir(key)
+        loaded = read_entry(entry)
+        if loaded is not None:
+            os.utime(os.path.join(entry, META_FILE))  # mark as recently used
+        return loaded
+
+    def store(self, key, meta, arrays):
+        """Atomically write an entry, then evict down to max_bytes."""
+        write_entry(self.entry_dir(key), meta, arrays)
+        self._root.evict(keep=self.entry_dir(key))
+
+    def entries(self):
+        """
+        Return [(last_used, size_bytes, entry_dir)] for every complete entry,
+        including those of sub-caches (subdirectories without a meta.json).
+        """
+        results = []
+        for name in os.listdir(self.cache_dir):
+            entry = self.entry_dir(name)
+            meta_path = os.path.join(entry, META_FILE)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            if not os.path.isfile(meta_path):
+                results += AnalysisCache(entry, self.max_bytes).entries()
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, name))
+                       for name in os.listdir(entry))
+            results.append((os.path.getmtime(meta_path), size, entry))
+        return results
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache and its sub-caches
+        fit max_bytes together. 'keep' (an entry_dir()) is never removed.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
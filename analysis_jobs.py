@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+analysis_jobs.py
+
+Background job queue for api.py.
+
+Every uploaded firmware image becomes a Job with its own workspace
+directory (<jobs_dir>/<job id>/) holding the input, the log, the CFG, the
+JSON Lines events, the --profile metrics and the --save-artifact results
+of that run, so concurrent jobs never share an output file. Jobs run on a
+bounded pool of worker threads, each handing its job to a warm worker
+process, so as many analyses run in parallel as there are workers (one
+per core by default).
+
+A warm worker (WarmWorker) is a long-lived process that imports
+rda_disassembler_enhanced once and then calls its run() entry point for
+one job after another, so a job does not pay for interpreter startup and
+the capstone/networkx (and, after the first --angr job, angr) imports.
+Workers are retired and replaced after RDA_WORKER_MAX_JOBS jobs, or once
+their peak RSS passes RDA_WORKER_MAX_RSS_MB, so memory that an analysis
+leaves behind does not accumulate. A worker that crashes or runs past the
+job timeout is replaced the same way.
+
+The state of each job is kept in <workspace>/job.json as well. Jobs
+survive an API restart, and any job that was still queued or running at
+the restart is marked failed.
+
+Jobs are indexed by the SHA-256 of their input, so find() can return an
+earlier job on the same firmware instead of analyzing it again.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+
+from analysis_cache import DEFAULT_CACHE_DIR
+
+try:
+    import resource  # POSIX only; without it workers are only recycled by job count
+except ImportError:
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+JOBS_DIR = os.environ.get("RDA_JOBS_DIR", "firmware/jobs")
+DEFAULT_WORKERS = int(os.environ.get("RDA_JOB_WORKERS", os.cpu_count() or 1))
+DEFAULT_MAX_PENDING = int(os.environ.get("RDA_JOB_MAX_PENDING", 64))
+DEFAULT_KEEP_JOBS = int(os.environ.get("RDA_JOB_KEEP", 200))
+DEFAULT_WORKER_MAX_JOBS = int(os.environ.get("RDA_WORKER_MAX_JOBS", 50))
+DEFAULT_WORKER_MAX_RSS_MB = int(os.environ.get("RDA_WORKER_MAX_RSS_MB", 2048))
+
+# Seconds a retiring worker gets to exit before it is killed
+WORKER_EXIT_TIMEOUT = 5
+
+JOB_FILE = "job.json"
+INPUT_FILE = "firmware.bin"
+LOG_FILE = "disassembly.log"
+EVENTS_FILE = "events.jsonl"
+PROFILE_FILE = "profile.json"
+ARTIFACT_DIR = "artifact"  # --save-artifact entry queried by analysis_query.py
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# stderr lines kept in a failed job's result
+ERROR_TAIL_LINES = 20
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.create() when max_pending jobs are already waiting or running."""
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _run_in_workspace(analyzer, workspace, argv):
+    """
+    Call analyzer.run(argv) with 'workspace' as the working directory and
+    capture what it prints. Returns (returncode, stdout, stderr) like a
+    subprocess would.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    cwd = os.getcwd()
+    returncode = 0
+    try:
+        os.chdir(workspace)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            analyzer.run(argv)
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            returncode = e.code or 0
+        else:
+            returncode = 1
+            stderr.write(f"{e.code}\n")
+    except Exception:
+        returncode = 1
+        stderr.write(traceback.format_exc())
+    finally:
+        os.chdir(cwd)
+    return returncode, stdout.getvalue(), stderr.getvalue()
+
+
+def _warm_worker_main(conn, max_jobs, max_rss_mb):
+    """
+    WarmWorker process: import the analyzer once, then run (workspace,
+    argv) tasks from 'conn' until told to stop (None) or until it has run
+    'max_jobs' jobs or its peak RSS passed 'max_rss_mb'.
+    """
+    sys.path.insert(0, REPO_DIR)
+    import rda_disassembler_enhanced as analyzer
+
+    jobs_done = 0
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        returncode, stdout, stderr = _run_in_workspace(analyzer, *task)
+        jobs_done += 1
+        retire = jobs_done >= max_jobs or (max_rss_mb and _peak_rss_mb() > max_rss_mb)
+        conn.send((returncode, stdout, stderr, retire))
+        if retire:
+            return
+
+
+class WorkerLost(Exception):
+    """The worker process died during a job (crash, kill or timeout)."""
+
+
+class WarmWorker:
+    """
+    One long-lived analysis process fed one job at a time over a pipe. It
+    is started with the 'spawn' method, because the API process has
+    threads that a forked child must not inherit.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_WORKER_MAX_JOBS, max_rss_mb=DEFAULT_WORKER_MAX_RSS_MB):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_warm_worker_main, name="rda-worker",
+                                       args=(child_conn, max_jobs, max_rss_mb))
+        self.process.start()
+        child_conn.close()
+        self.retired = False
+
+    @property
+    def alive(self):
+        return not self.retired and self.process.is_alive()
+
+    def run(self, workspace, argv, timeout=None):
+        """
+        Run one job. Returns (returncode, stdout, stderr). Raises WorkerLost
+        if the process dies or 'timeout' seconds pass (it is then killed).
+        """
+        try:
+            self._conn.send((workspace, argv))
+            if not self._conn.poll(timeout):
+                self.kill()
+                raise WorkerLost(f"timed out after {timeout} s")
+            returncode, stdout, stderr, retire = self._conn.recv()
+        except (EOFError, OSError):
+            self.kill()
+            raise WorkerLost(f"worker exited with code {self.process.exitcode}")
+        if retire:
+            self.retired = True
+            self.process.join(WORKER_EXIT_TIMEOUT)
+        return returncode, stdout, stderr
+
+    def close(self):
+        """Ask the worker to exit after its current job; kill it if it does not."""
+        self.retired = True
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self.process.join(WORKER_EXIT_TIMEOUT)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.retired = True
+        self.process.kill()
+        self.process.join()
+
+
+class Job:
+    """One analysis request and its workspace directory."""
+
+    def __init__(self, job_id, workspace, filename, options=(), sha256=None, size=None):
+        self.id = job_id
+        self.workspace = workspace
+        self.filename = filename
+        self.options = list(options)
+        self.sha256 = sha256
+        self.size = size
+        self.status = JOB_QUEUED
+        self.created = time.time()
+        self.started = self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def input_path(self):
+        return os.path.join(self.workspace, INPUT_FILE)
+
+    def path(self, name):
+        """Absolute path of a file in the workspace."""
+        return os.path.join(self.workspace, name)
+
+    def to_dict(self):
+        return {"id": self.id, "status": self.status, "filename": self.filename,
+                "sha256": self.sha256, "size": self.size,
+                "options": self.options, "created": self.created, "started": self.started,
+                "finished": self.finished, "result": self.result, "error": self.error}
+
+    @classmethod
+    def from_dict(cls, workspace, state):
+        job = cls(state["id"], workspace, state["filename"], state.get("options", ()),
+                  state.get("sha256"), state.get("size"))
+        for key in ("status", "created", "started", "finished", "result", "error"):
+            setattr(job, key, state.get(key))
+        return job
+
+    def save(self):
+        """Write job.json atomically, so readers never see half a file."""
+        tmp_path = self.path(JOB_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, self.path(JOB_FILE))
+
+
+class JobQueue:
+    """
+    Bounded pool of analysis workers.
+
+        path = queue.upload_path()          # stream the upload here
+        job, queued = queue.enqueue("fw.elf", path, sha256)
+        queue.get(job.id).status            # queued -> running -> done/failed
+
+    enqueue() (and create()) raise QueueFull when max_pending jobs are
+    waiting or running.
+
+    'on_finish(job)' is called from the worker thread after each job.
+    start() launches the warm worker processes ahead of the first job;
+    otherwise they start on demand.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 keep_jobs=DEFAULT_KEEP_JOBS, cache_dir=DEFAULT_CACHE_DIR, timeout=None,
+                 on_finish=None, worker_max_jobs=DEFAULT_WORKER_MAX_JOBS,
+                 worker_max_rss_mb=DEFAULT_WORKER_MAX_RSS_MB):
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.keep_jobs = keep_jobs
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.timeout = timeout
+        self.on_finish = on_finish
+        self.worker_max_jobs = worker_max_jobs
+        self.worker_max_rss_mb = worker_max_rss_mb
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._enqueue_lock = threading.Lock()
+        self._idle_workers = queue.SimpleQueue()
+        self._all_workers = set()
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._load()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="rda-job")
+
+    def start(self):
+        """Launch the warm worker processes now rather than on the first jobs."""
+        with self._lock:
+            missing = self.workers - len(self._all_workers)
+        for _ in range(missing):
+            self._idle_workers.put(self._spawn_worker())
+
+    def _spawn_worker(self):
+        worker = WarmWorker(self.worker_max_jobs, self.worker_max_rss_mb)
+        with self._lock:
+            self._all_workers.add(worker)
+        return worker
+
+    def _acquire_worker(self):
+        """An idle warm worker, replacing retired or dead ones."""
+        while True:
+            try:
+                worker = self._idle_workers.get_nowait()
+            except queue.Empty:
+                return self._spawn_worker()
+            if worker.alive:
+                return worker
+            self._release_worker(worker)
+
+    def _release_worker(self, worker):
+        """Return 'worker' to the idle pool, or forget it if it is gone."""
+        if worker.alive:
+            self._idle_workers.put(worker)
+            return
+        with self._lock:
+            self._all_workers.discard(worker)
+        if worker.process.is_alive():
+            worker.close()
+
+    def _load(self):
+        """Pick up the jobs of an earlier run from their job.json files."""
+        for job_id in os.listdir(self.jobs_dir):
+            workspace = os.path.join(self.jobs_dir, job_id)
+            if job_id.startswith(".upload-"):
+                os.remove(workspace)  # upload cut short by the restart
+                continue
+            try:
+                with open(os.path.join(workspace, JOB_FILE)) as f:
+                    job = Job.from_dict(workspace, json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            if job.status in (JOB_QUEUED, JOB_RUNNING):
+                job.status, job.error = JOB_FAILED, "interrupted by an API restart"
+                job.save()
+            self._jobs[job.id] = job
+
+    def upload_path(self):
+        """A fresh temporary path in jobs_dir (same file system) for an incoming upload."""
+        return os.path.join(self.jobs_dir, f".upload-{uuid.uuid4().hex}")
+
+    def create(self, filename, options=(), input_file=None, sha256=None, size=None):
+        """
+        Reserve a job and its workspace. 'input_file' (e.g. from
+        upload_path()) is moved to job.input_path; otherwise the caller puts
+        the input there. Call submit() next.
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values()
+                          if job.status in (JOB_QUEUED, JOB_RUNNING))
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already queued or running")
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, os.path.join(self.jobs_dir, job_id),
+                      os.path.basename(filename or "") or INPUT_FILE, options, sha256, size)
+            os.makedirs(job.workspace)
+            if input_file is not None:
+                os.replace(input_file, job.input_path)
+            job.save()
+            self._jobs[job_id] = job
+        return job
+
+    def find(self, sha256, options=()):
+        """
+        The newest job on input 'sha256' with the same options that is done
+        or still on its way; None if there is none (failed jobs are retried).
+        """
+        options = list(options)
+        with self._lock:
+            matches = [job for job in self._jobs.values()
+                       if job.sha256 == sha256 and job.options == options
+                       and job.status != JOB_FAILED]
+        return max(matches, key=lambda job: job.created) if matches else None
+
+    def submit(self, job):
+        self._executor.submit(self._run, job)
+        return job
+
+    def enqueue(self, filename, input_file, sha256, size=None, options=()):
+        """
+        Queue the uploaded 'input_file' unless find() has a job for the same
+        input and options. Returns (job, queued). When no new job is queued,
+        'input_file' is deleted.
+        """
+        with self._enqueue_lock:
+            existing = self.find(sha256, options)
+            if existing is not None:
+                os.remove(input_file)
+                return existing, False
+            job = self.create(filename, options, input_file, sha256, size)
+        return self.submit(job), True
+
+    def discard(self, job):
+        """Drop a created job whose upload failed."""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        shutil.rmtree(job.workspace, ignore_errors=True)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All known jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def arguments(self, job):
+        """Analyzer arguments for 'job' (run with the workspace as cwd)."""
+        return [job.input_path, "--quiet",
+                "--log-file", job.path(LOG_FILE), "--jsonl", job.path(EVENTS_FILE),
+                "--profile", job.path(PROFILE_FILE), "--cache-dir", self.cache_dir,
+                "--save-artifact", job.path(ARTIFACT_DIR),
+                *job.options]
+
+    def _run(self, job):
+        job.status, job.started = JOB_RUNNING, time.time()
+        job.save()
+        worker = None
+        try:
+            worker = self._acquire_worker()
+            returncode, stdout, stderr = worker.run(job.workspace, self.arguments(job), self.timeout)
+        except WorkerLost as e:
+            job.status, job.error = JOB_FAILED, str(e)
+        except Exception as e:  # the executor would swallow it and leave the job running
+            job.status, job.error = JOB_FAILED, f"{type(e).__name__}: {e}"
+        else:
+            job.result = {"returncode": returncode,
+                          "summary": [line for line in stdout.splitlines() if line.strip()],
+                          "files": self.files(job)}
+            if returncode == 0:
+                job.status = JOB_DONE
+            else:
+                job.status = JOB_FAILED
+                job.error = "\n".join(stderr.splitlines()[-ERROR_TAIL_LINES:])
+        finally:
+            if worker is not None:
+                self._release_worker(worker)
+        job.finished = time.time()
+        job.save()
+        if self.on_finish is not None:
+            self.on_finish(job)
+        self._prune()
+
+    def files(self, job):
+        """Workspace files produced by the analysis (relative paths)."""
+        found = []
+        for root, _dirs, names in os.walk(job.workspace):
+            for name in names:
+                rel = os.path.relpath(os.path.join(root, name), job.workspace)
+                if rel not in (JOB_FILE, INPUT_FILE):
+                    found.append(rel)
+        return sorted(found)
+
+    def _prune(self):
+        """Delete the oldest finished jobs beyond keep_jobs."""
+        with self._lock:
+            finished = sorted((job for job in self._jobs.values()
+                               if job.status in (JOB_DONE, JOB_FAILED)),
+                              key=lambda job: job.finished or job.created)
+            expired = finished[:max(0, len(finished) - self.keep_jobs)]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.workspace, ignore_errors=True)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        with self._lock:
+            workers = list(self._all_workers)
+            self._all_workers.clear()
+        for worker in workers:
+            if wait:
+                worker.close()
+            else:
+                worker.kill()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+analysis_profile.py
+
+Per-stage metrics for rda_disassembler_enhanced.py (--profile) and api.py.
+
+A StageProfiler times named stages of one run:
+  - wall_s       elapsed wall-clock time
+  - cpu_s        user + system CPU time of this process and of the worker
+                 processes it reaped during the stage (process pools)
+  - peak_rss_mb  peak resident set size of the run so far, so the stage
+                 where it jumps is the one that needed the memory. The
+                 peak is reset when the profiler is created (see
+                 reset_peak_rss()), so a long-lived worker process reports
+                 this run's peak and not that of an earlier job.
+  - counts       whatever the stage processed (instructions, blocks, ...)
+
+to_dict() / write_json() give the whole run as one JSON document and
+summary() a single line for the log. api.py appends every run's document to
+a JSON Lines history (append_history()) and reports per-stage statistics
+over it with aggregate_history().
+"""
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # POSIX only; without it CPU/RSS fall back to time.process_time()/None
+except ImportError:
+    resource = None
+
+PROFILE_VERSION = 1
+
+DEFAULT_PROFILE_PATH = "firmware/profile.json"
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# ru_maxrss at the last reset_peak_rss() where the peak could not be reset
+_maxrss_floor = 0
+
+
+def reset_peak_rss():
+    """
+    Start a new peak RSS measurement for this process. On Linux this
+    resets VmHWM (and with it ru_maxrss) through /proc/self/clear_refs.
+    Elsewhere the current ru_maxrss is remembered, and peak_rss() reports
+    None until the process grows past it. Returns True if the peak was reset.
+    """
+    global _maxrss_floor
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        _maxrss_floor = 0
+        return True
+    except OSError:
+        if resource is not None:
+            _maxrss_floor = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return False
+
+
+def peak_rss():
+    """Peak RSS of this process in bytes since reset_peak_rss() (None if unknown)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss * _MAXRSS_UNIT if maxrss > _maxrss_floor else None
+
+
+def _usage(children_maxrss0=0):
+    """
+    (cpu_seconds, peak_rss_bytes) of this process plus its reaped children.
+    Children count only if their ru_maxrss grew past 'children_maxrss0'
+    (its value when the run began); a lower one belongs to an earlier run.
+    """
+    if resource is None:
+        return time.process_time(), None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    peaks = [peak for peak in (peak_rss(),) if peak is not None]
+    if children.ru_maxrss > children_maxrss0:
+        peaks.append(children.ru_maxrss * _MAXRSS_UNIT)
+    return cpu, max(peaks, default=None)
+
+
+def _mb(nbytes):
+    return None if nbytes is None else round(nbytes / (1024 * 1024), 1)
+
+
+class StageProfiler:
+    """
+    Collects one record per stage, in the order the stages ran. Either wrap
+    a stage in a block:
+
+        profiler = StageProfiler(binary="fw.elf")
+        with profiler.stage("disassembly") as counts:
+            ...
+            counts["instructions"] = len(table)
+
+    or mark consecutive stages of a long function with start(), which ends
+    the stage before it, and stop() after the last one.
+
+    'info' keyword arguments are stored with the run (binary, options, ...).
+    If set, 'on_start(name)' is called whenever a stage starts (e.g. to
+    report progress). Creating a profiler resets the process's peak RSS,
+    so use one per run and not several at once.
+    """
+
+    def __init__(self, **info):
+        self.info = info
+        self.stages = []
+        self.on_start = None
+        reset_peak_rss()
+        self._children_maxrss0 = (resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                                  if resource is not None else 0)
+        self._wall0 = time.perf_counter()
+        self._cpu0, _ = _usage()
+        self._started = time.time()
+        self._current = None
+
+    def start(self, name, **counts):
+        """End the running stage (if any) and start 'name'. Returns its counts dict."""
+        self.stop()
+        if self.on_start is not None:
+            self.on_start(name)
+        cpu0, _ = _usage()
+        self._current = (name, counts, time.perf_counter(), cpu0)
+        return counts
+
+    def stop(self):
+        """End the running stage, if any."""
+        if self._current is None:
+            return
+        name, counts, wall0, cpu0 = self._current
+        self._current = None
+        cpu1, peak = _usage(self._children_maxrss0)
+        self.stages.append({"name": name,
+                            "wall_s": round(time.perf_counter() - wall0, 6),
+                            "cpu_s": round(cpu1 - cpu0, 6),
+                            "peak_rss_mb": _mb(peak),
+                            "counts": counts})
+
+    def count(self, **counts):
+        """Add item counts to the running stage."""
+        if self._current is not None:
+            self._current[1].update(counts)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        counts = self.start(name, **counts)
+        try:
+            yield counts
+        finally:
+            self.stop()
+
+    def add_stages(self, stages, prefix=""):
+        """Merge stage records from another profile (e.g. a subprocess's JSON)."""
+        for record in stages:
+            self.stages.append(dict(record, name=prefix + record["name"]))
+
+    def to_dict(self):
+        self.stop()
+        cpu, peak = _usage(self._children_maxrss0)
+        return {"version": PROFILE_VERSION,
+                "started": round(self._started, 3),
+                **self.info,
+                "total": {"wall_s": round(time.perf_counter() - self._wall0, 6),
+                          "cpu_s": round(cpu - self._cpu0, 6),
+                          "peak_rss_mb": _mb(peak)},
+                "stages": self.stages}
+
+    def write_json(self, path=DEFAULT_PROFILE_PATH):
+        """Write to_dict() to 'path' and return the document."""
+        document = self.to_dict()
+        out_dir = os.path.dirname(path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2)
+        return document
+
+    def summary(self):
+        """One line: totals, then every stage's wall time and main count."""
+        total = self.to_dict()["total"]
+        parts = [f"total {total['wall_s']:.2f}s wall, {total['cpu_s']:.2f}s cpu"
+                 + (f", peak {total['peak_rss_mb']:.0f} MB" if total["peak_rss_mb"] else "")]
+        for record in self.stages:
+            part = f"{record['name']} {record['wall_s']:.2f}s"
+            if record["counts"]:
+                key, value = next(iter(record["counts"].items()))
+                part += f" ({key}={value})"
+            parts.append(part)
+        return "[PROFILE] " + " | ".join(parts)
+
+
+def read_profile(path):
+    """Load a profile written by write_json(), or None if missing or unreadable."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def append_history(path, document):
+    """Append one run's profile to a JSON Lines history file."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(document) + "\n")
+
+
+def read_history(path, limit=None):
+    """Profiles in a history file, oldest first (only the last 'limit' if given)."""
+    documents = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    documents.append(json.loads(line))
+                except ValueError:
+                    continue  # a line cut short by a crash
+    except OSError:
+        return []
+    return documents[-limit:] if limit else documents
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def aggregate_history(documents):
+    """
+    Per-stage statistics over many profiles: {stage: {"runs", "wall_s":
+    {"mean", "p50", "p95", "max"}, "cpu_s": {...}, "peak_rss_mb_max"}},
+    plus the same for the run totals under "total".
+    """
+    samples = {}
+    for document in documents:
+        records = list(document.get("stages", []))
+        if "total" in document:
+            records.append(dict(document["total"], name="total"))
+        for record in records:
+            entry = samples.setdefault(record["name"], {"wall_s": [], "cpu_s": [], "rss": []})
+            for key, column in (("wall_s", "wall_s"), ("cpu_s", "cpu_s"), ("peak_rss_mb", "rss")):
+                if record.get(key) is not None:
+                    entry[column].append(record[key])
+
+    stats = {}
+    for name, entry in samples.items():
+        stats[name] = {"runs": len(entry["wall_s"])}
+        for key in ("wall_s", "cpu_s"):
+            values = sorted(entry[key])
+            if not values:
+                stats[name][key] = None
+                continue
+            stats[name][key] = {"mean": round(sum(values) / len(values), 6),
+                                "p50": _percentile(values, 0.5),
+                                "p95": _percentile(values, 0.95),
+                                "max": values[-1]}
+        stats[name]["peak_rss_mb_max"] = max(entry["rss"]) if entry["rss"] else None
+    return stats
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+analysis_query.py
+
+Structured queries over one analysis artifact (the --save-artifact entry
+that every api.py job writes, see analysis_cache.read_entry()), so a
+client can fetch one function, one loop or the strings that contain a
+word without downloading and parsing the whole disassembly log.
+
+AnalysisResults loads the artifact once and answers:
+  - instructions() by address range, function or code section
+  - functions()    by name substring, function() for one of them
+  - strings()      by substring, data section or address range
+  - loops()        by function, loop() by id (the N of "Loop N" in the log)
+
+List queries return one page: {"items", "total", "next_cursor"}. Pass
+'next_cursor' back as 'cursor' for the following page; it is None on the
+last one. Cursors are positions in the artifact, which never changes
+once written, so they stay valid for the life of the job.
+
+Addresses are reported as "0x..." strings, as in the --jsonl events, and
+accepted as hex ("0x1139") or decimal.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from analysis_cache import read_entry
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 2000
+
+# Artifacts kept loaded by load_results(); a large image takes tens of MB
+RESULTS_CACHE_SIZE = 4
+
+NO_TARGET = -1
+
+
+class QueryError(ValueError):
+    """A malformed query parameter (address, cursor, limit)."""
+
+
+class UnknownName(QueryError):
+    """The function, section or loop asked for is not in the results."""
+
+
+@lru_cache(maxsize=RESULTS_CACHE_SIZE)
+def _load_results(path):
+    # Raises instead of returning None, so a miss is never cached
+    loaded = read_entry(path)
+    if loaded is None:
+        raise FileNotFoundError(path)
+    return AnalysisResults(*loaded)
+
+
+def load_results(path):
+    """AnalysisResults of the artifact at 'path', or None if there is none (yet)."""
+    try:
+        return _load_results(path)
+    except FileNotFoundError:
+        return None
+
+
+def parse_address(text):
+    """'0x1139' or '4409' -> 4409; None stays None."""
+    if text is None:
+        return None
+    try:
+        addr = int(text, 0)
+    except ValueError:
+        raise QueryError(f"Not an address: {text!r}")
+    if addr < 0:
+        raise QueryError(f"Not an address: {text!r}")
+    return addr
+
+
+def _hex(addr):
+    return f"0x{int(addr):x}"
+
+
+def _page(lo, hi, cursor, limit):
+    """
+    Rows [first, stop) of the page of [lo, hi) that starts at 'cursor'
+    (default 'lo'), and the cursor of the next page (None at the end).
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise QueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    first = lo
+    if cursor is not None:
+        try:
+            first = int(cursor)
+        except ValueError:
+            raise QueryError(f"Invalid cursor: {cursor!r}")
+        if not lo <= first <= hi:
+            raise QueryError(f"Cursor {cursor!r} does not belong to this query")
+    stop = min(first + limit, hi)
+    return first, stop, (str(stop) if stop < hi else None)
+
+
+class AnalysisResults:
+    """
+    Read-only view of one artifact's (meta, arrays). Instructions stay in
+    the artifact's NumPy columns; only the requested page is turned into
+    JSON-ready dicts.
+    """
+
+    def __init__(self, meta, arrays):
+        insns = arrays["insns"]
+        self.addrs = insns["addrs"]
+        self.sizes = insns["sizes"]
+        self.mnem_ids = insns["mnem_ids"]
+        self.op_ids = insns["op_ids"]
+        self.targets = insns["targets"]
+        self.mnemonics = meta["mnemonics"]
+        self.operands = meta["operands"]
+
+        # [name, start, end] of the analyzer's FunctionIndex, in address
+        # order: the same extents that tag loops in the log and partition the
+        # loop analysis. A name shared by several functions (static ones)
+        # gets "#2", "#3", ... appended from its second occurrence on.
+        functions = meta.get("function_index", [])
+        seen = {}
+        self.function_names = []
+        for (name, _start, _end) in functions:
+            seen[name] = seen.get(name, 0) + 1
+            self.function_names.append(name if seen[name] == 1 else f"{name}#{seen[name]}")
+        self.function_starts = np.array([record[1] for record in functions], dtype=np.uint64)
+        self.function_ends = np.array([record[2] for record in functions], dtype=np.uint64)
+        self._function_index = {name: i for i, name in enumerate(self.function_names)}
+
+        self.code_sections = [tuple(section) for section in meta.get("code_sections", [])]
+        self.data_sections = meta.get("data_sections", {})
+        # Flattened (section, addr, value), in section then address order
+        self.string_records = [(name, addr, value)
+                               for (name, _base, _size, found) in meta["strings"]
+                               for (addr, value) in found]
+        self.loop_nodes = meta["loops"]
+
+        blocks = arrays.get("blocks")
+        self.blocks = None
+        if blocks is not None:
+            order = np.argsort(blocks["start"], kind="stable")
+            self.blocks = {field: column[order] for field, column in blocks.items()}
+        # CFG nodes: block starts, or instruction addresses with --insn-cfg
+        self.cfg_nodes = self.blocks["start"] if self.blocks is not None else self.addrs
+
+        # Per-function loop analysis outcome, [name, nodes, status, loops].
+        # Partitions come in function order and only for functions with CFG
+        # nodes, so same-named records are matched up in that order.
+        pending = {}
+        for record in meta.get("loop_results") or []:
+            pending.setdefault(record[0], []).append(record)
+        self.loop_search = {}
+        for i, (name, _start, _end) in enumerate(functions):
+            lo, hi = self._node_rows(int(self.function_starts[i]), int(self.function_ends[i]))
+            if hi > lo and pending.get(name):
+                _name, nodes, status, loops = pending[name].pop(0)
+                self.loop_search[self.function_names[i]] = {"nodes": nodes, "status": status,
+                                                            "loops": loops}
+
+    # --------------------------------------------------------------------------
+    # Lookups
+    # --------------------------------------------------------------------------
+    def function_of(self, addrs):
+        """Function names (None outside any function) of a uint64 address array."""
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        idx = np.searchsorted(self.function_starts, addrs, side="right").astype(np.int64) - 1
+        names = []
+        for addr, i in zip(addrs.tolist(), idx.tolist()):
+            inside = i >= 0 and addr < int(self.function_ends[i])
+            names.append(self.function_names[i] if inside else None)
+        return names
+
+    def function_range(self, name):
+        if name not in self._function_index:
+            raise UnknownName(f"Unknown function {name!r}")
+        i = self._function_index[name]
+        return int(self.function_starts[i]), int(self.function_ends[i])
+
+    def section_range(self, name):
+        for (sec_name, base_addr, size) in self.code_sections:
+            if sec_name == name:
+                return base_addr, base_addr + size
+        if name in self.data_sections:
+            base_addr, size, _digest = self.data_sections[name]
+            return base_addr, base_addr + size
+        raise UnknownName(f"Unknown section {name!r}")
+
+    def address_range(self, start=None, end=None, function=None, section=None):
+        """
+        Intersect the given bounds into one [start, end) address range;
+        None for a side that nothing bounds.
+        """
+        lo, hi = start, end
+        bounds = []
+        if function is not None:
+            bounds.append(self.function_range(function))
+        if section is not None:
+            bounds.append(self.section_range(section))
+        for bound_lo, bound_hi in bounds:
+            lo = bound_lo if lo is None else max(lo, bound_lo)
+            hi = bound_hi if hi is None else min(hi, bound_hi)
+        return lo, hi
+
+    def _rows(self, lo_addr, hi_addr):
+        """Instruction rows [lo, hi) with lo_addr <= address < hi_addr."""
+        lo = 0 if lo_addr is None else int(np.searchsorted(self.addrs, np.uint64(lo_addr)))
+        hi = (len(self.addrs) if hi_addr is None
+              else int(np.searchsorted(self.addrs, np.uint64(hi_addr))))
+        return lo, max(lo, hi)
+
+    def _block_rows(self, lo_addr, hi_addr):
+        starts = self.blocks["start"]
+        return (int(np.searchsorted(starts, np.uint64(lo_addr), "left")),
+                int(np.searchsorted(starts, np.uint64(hi_addr), "left")))
+
+    def _node_rows(self, lo_addr, hi_addr):
+        return (int(np.searchsorted(self.cfg_nodes, np.uint64(lo_addr), "left")),
+                int(np.searchsorted(self.cfg_nodes, np.uint64(hi_addr), "left")))
+
+    def _block(self, i):
+        return {"start": _hex(self.blocks["start"][i]), "end": _hex(self.blocks["end"][i]),
+                "instructions": int(self.blocks["insn_count"][i])}
+
+    # --------------------------------------------------------------------------
+    # Queries
+    # --------------------------------------------------------------------------
+    def summary(self):
+        return {"instructions": len(self.addrs),
+                "functions": len(self.function_names),
+                "blocks": None if self.blocks is None else len(self.blocks["start"]),
+                "loops": len(self.loop_nodes),
+                "strings": len(self.string_records),
+                "code_sections": [{"name": name, "start": _hex(base), "end": _hex(base + size)}
+                                  for (name, base, size) in self.code_sections],
+                "data_sections": [{"name": name, "start": _hex(base), "end": _hex(base + size)}
+                                  for name, (base, size, _digest) in self.data_sections.items()]}
+
+    def instructions(self, start=None, end=None, function=None, section=None,
+                     cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Instructions in [start, end), further limited to a function and/or section."""
+        lo_addr, hi_addr = self.address_range(start, end, function, section)
+        lo, hi = self._rows(lo_addr, hi_addr)
+        first, stop, next_cursor = _page(lo, hi, cursor, limit)
+        addrs = self.addrs[first:stop]
+        items = []
+        for addr, size, mnem_id, op_id, target, func in zip(
+                addrs.tolist(), self.sizes[first:stop].tolist(), self.mnem_ids[first:stop].tolist(),
+                self.op_ids[first:stop].tolist(), self.targets[first:stop].tolist(),
+                self.function_of(addrs)):
+            item = {"addr": _hex(addr), "size": size, "mnemonic": self.mnemonics[mnem_id],
+                    "op_str": self.operands[op_id], "function": func}
+            if target != NO_TARGET:
+                item["target"] = _hex(target)
+            items.append(item)
+        return {"items": items, "total": hi - lo, "next_cursor": next_cursor}
+
+    def _function_record(self, i):
+        start, end = int(self.function_starts[i]), int(self.function_ends[i])
+        lo, hi = self._rows(start, end)
+        return {"name": self.function_names[i], "start": _hex(start), "end": _hex(end),
+                "instructions": hi - lo}
+
+    def functions(self, contains=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Functions in address order, optionally only those whose name contains 'contains'."""
+        matches = [i for i, name in enumerate(self.function_names)
+                   if contains is None or contains in name]
+        first, stop, next_cursor = _page(0, len(matches), cursor, limit)
+        return {"items": [self._function_record(i) for i in matches[first:stop]],
+                "total": len(matches), "next_cursor": next_cursor}
+
+    def function(self, name):
+        """One function: its extent, basic blocks, and the loops inside it."""
+        self.function_range(name)
+        record = self._function_record(self._function_index[name])
+        start, end = int(record["start"], 16), int(record["end"], 16)
+        if self.blocks is not None:
+            lo, hi = self._block_rows(start, end)
+            record["blocks"] = [self._block(i) for i in range(lo, hi)]
+        record["loops"] = [loop_id for loop_id, nodes in enumerate(self.loop_nodes, 1)
+                           if nodes and start <= nodes[0] < end]
+        if name in self.loop_search:
+            record["loop_search"] = self.loop_search[name]
+        return record
+
+    def strings(self, contains=None, section=None, start=None, end=None,
+                cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Strings containing 'contains' (case-sensitive), by section and address range."""
+        if section is not None and section not in self.data_sections:
+            raise UnknownName(f"Unknown data section {section!r}")
+        matches = [(sec_name, addr, value) for (sec_name, addr, value) in self.string_records
+                   if (section is None or sec_name == section)
+                   and (start is None or addr >= start) and (end is None or addr < end)
+                   and (contains is None or contains in value)]
+        first, stop, next_cursor = _page(0, len(matches), cursor, limit)
+        return {"items": [{"addr": _hex(addr), "section": sec_name, "value": value}
+                          for (sec_name, addr, value) in matches[first:stop]],
+                "total": len(matches), "next_cursor": next_cursor}
+
+    def _loop_record(self, loop_id):
+        nodes = self.loop_nodes[loop_id - 1]
+        record = {"id": loop_id, "nodes": [_hex(node) for node in nodes],
+                  "function": self.function_of(nodes[:1])[0] if nodes else None}
+        if self.blocks is not None:
+            starts = self.blocks["start"]
+            idx = np.searchsorted(starts, np.asarray(nodes, dtype=np.uint64), "left")
+            record["blocks"] = [self._block(i) for i in idx.tolist()
+                                if i < len(starts) and int(starts[i]) in nodes]
+        return record
+
+    def loops(self, function=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Detected loops (ids from 1, in log order), optionally only those in 'function'."""
+        if function is not None:
+            self.function_range(function)
+        matches = [loop_id for loop_id, nodes in enumerate(self.loop_nodes, 1)
+                   if function is None or (nodes and self.function_of(nodes[:1])[0] == function)]
+        first, stop, next_cursor = _page(0, len(matches), cursor, limit)
+        return {"items": [self._loop_record(loop_id) for loop_id in matches[first:stop]],
+                "total": len(matches), "next_cursor": next_cursor}
+
+    def loop(self, loop_id):
+        if not 1 <= loop_id <= len(self.loop_nodes):
+            raise UnknownName(f"Unknown loop {loop_id}")
+        return self._loop_record(loop_id)
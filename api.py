@@ -1,53 +1,390 @@
 import os
-import sys
-import shutil
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import FileResponse
-import subprocess
+import gzip
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Optional
+from fastapi import (FastAPI, File, Header, HTTPException, Request, UploadFile, WebSocket,
+                     WebSocketDisconnect)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from analysis_jobs import (ARTIFACT_DIR, EVENTS_FILE, JOB_DONE, JOB_FAILED, LOG_FILE,
+                           PROFILE_FILE, JobQueue, QueueFull)
+from analysis_profile import (PROFILE_VERSION, aggregate_history, append_history,
+                              read_history, read_profile)
+from analysis_query import (DEFAULT_PAGE_SIZE, QueryError, UnknownName, load_results,
+                            parse_address)
+
+try:
+    import brotli  # optional; without it responses are only gzip-compressed
+except ImportError:
+    brotli = None
 
 # Ensure the firmware directory exists
 FIRMWARE_DIR = "firmware"
 os.makedirs(FIRMWARE_DIR, exist_ok=True)
 
+# Per-stage metrics of every /analyze job, one JSON document per line
+METRICS_HISTORY = os.path.join(FIRMWARE_DIR, "metrics.jsonl")
+_metrics_lock = threading.Lock()
+
+# Uploads are read, hashed and written in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Analyzer JSONL events forwarded by /jobs/{id}/events and /jobs/{id}/ws
+PROGRESS_EVENTS = ("arch", "stage", "progress", "section", "coverage", "strings",
+                   "loop", "loop_budget", "rss", "profile", "done")
+EVENT_POLL_SECONDS = 0.2
+EVENT_READ_BYTES = 64 * 1024
+KEEPALIVE_SECONDS = 15
+
+# Query responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+
+def record_metrics(job):
+    """JobQueue callback: append the job's timings and the analyzer's stages to the history."""
+    analyzer_profile = read_profile(job.path(PROFILE_FILE)) or {}
+    stages = [{"name": "queued", "wall_s": round(job.started - job.created, 6), "counts": {}},
+              {"name": "analyze", "wall_s": round(job.finished - job.started, 6),
+               "counts": {"status": job.status}}]
+    stages += [dict(record, name="rda." + record["name"])
+               for record in analyzer_profile.get("stages", [])]
+    document = {"version": PROFILE_VERSION, "started": round(job.created, 3),
+                "binary": job.filename, "source": "api", "job": job.id,
+                "total": {"wall_s": round(job.finished - job.created, 6),
+                          "peak_rss_mb": analyzer_profile.get("total", {}).get("peak_rss_mb")},
+                "stages": stages}
+    with _metrics_lock:
+        append_history(METRICS_HISTORY, document)
+
+
+job_queue = JobQueue(on_finish=record_metrics)
+
 app = FastAPI()
 
+
+@app.on_event("startup")
+def start_job_queue():
+    job_queue.start()
+
+
+@app.on_event("shutdown")
+def stop_job_queue():
+    job_queue.shutdown(wait=False)
+
+
+def job_links(job):
+    return {"self": f"/jobs/{job.id}", "log": f"/jobs/{job.id}/log",
+            "events": f"/jobs/{job.id}/events", "results": f"/jobs/{job.id}/results"}
+
+
+def accepted_encodings(header):
+    """Content codings a client accepts ('gzip;q=0' means it does not)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def json_response(request, document):
+    """
+    Compact JSON, compressed with br (if brotli is installed) or gzip when
+    the client accepts it and the body is worth compressing.
+    """
+    body = json.dumps(document, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = accepted_encodings(request.headers.get("accept-encoding"))
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted or "*" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def job_results(job_id):
+    """The finished job's AnalysisResults, or the matching HTTP error."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if job.status != JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}; no results")
+    results = await run_in_threadpool(load_results, os.path.abspath(job.path(ARTIFACT_DIR)))
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no stored results")
+    return results
+
+
+def run_query(request, query, *args, **kwargs):
+    """Call a query, turning its errors into 404 (unknown name) or 400 responses."""
+    try:
+        return json_response(request, query(*args, **kwargs))
+    except UnknownName as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _event_name(line):
+    """The "event" of a JSONL record without parsing the whole line (None if absent)."""
+    start = line.find(b'"event": "')
+    if start < 0:
+        return None
+    start += len(b'"event": "')
+    return line[start:line.find(b'"', start)].decode()
+
+
+def parse_event_filter(events):
+    """Comma-separated event names -> set of names (all progress events if empty)."""
+    if not events:
+        return set(PROGRESS_EVENTS)
+    return {name.strip() for name in events.split(",") if name.strip()}
+
+
+async def follow_job_events(job, after=0, kinds=PROGRESS_EVENTS):
+    """
+    Tail the job's events.jsonl while the analyzer writes it and yield
+    (event_id, event, data) for every record whose event is in 'kinds'.
+    The event id is the record's line number, so a client that reconnects
+    with 'after' set to the last id it saw continues where it stopped.
+    Status changes of the job itself are yielded as "status" events
+    (event_id None); the final one comes after the last analyzer event.
+    Yields (None, None, None) when nothing happened for KEEPALIVE_SECONDS.
+    """
+    path = job.path(EVENTS_FILE)
+    position, line_no, partial = 0, 0, b""
+    status, idle = None, 0.0
+    while True:
+        # Read the status before draining, so events written just before the
+        # job finished are still picked up on this pass
+        finished = job.status in (JOB_DONE, JOB_FAILED)
+        sent = False
+        if not finished and job.status != status:
+            status = job.status
+            yield None, "status", {"status": status, "error": None}
+            sent = True
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                f.seek(position)
+                # The listing adds one record per instruction, so the file can be
+                # hundreds of MB: it is read in bounded chunks and only the
+                # wanted records are parsed
+                while True:
+                    chunk = f.read(EVENT_READ_BYTES)
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    lines = (partial + chunk).split(b"\n")
+                    partial = lines.pop()  # an incomplete last line waits for the next read
+                    for line in lines:
+                        line_no += 1
+                        if line_no <= after or _event_name(line) not in kinds:
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        yield line_no, record.pop("event"), record
+                        sent = True
+        if finished:
+            yield None, "status", {"status": job.status, "error": job.error}
+            return
+        idle = 0.0 if sent else idle + EVENT_POLL_SECONDS
+        if idle >= KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield None, None, None
+        await asyncio.sleep(EVENT_POLL_SECONDS)
+
+
+async def save_upload(upload, path):
+    """
+    Stream 'upload' to 'path' in UPLOAD_CHUNK_SIZE pieces, hashing as it
+    goes, so memory use does not grow with the file. Returns (sha256, size).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # File I/O runs in the thread pool so a slow disk does not stall the event loop
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+            size += len(chunk)
+    finally:
+        await run_in_threadpool(f.close)
+    return digest.hexdigest(), size
+
+
+def _discard_upload(path):
+    """Delete an upload that enqueue() did not take over."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
 @app.get("/")
 async def root():
     return {"message": "API is working!"}
 
-@app.post("/analyze")
+@app.post("/analyze", status_code=202)
 async def analyze_firmware(file: UploadFile = File(...)):
-    # Save the uploaded file
-    file_location = os.path.join(FIRMWARE_DIR, file.filename)
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
+    """
+    Queue the upload for analysis and return its job id right away. An
+    image that was already analyzed (or is being analyzed) returns that
+    job instead of queuing it again.
+    """
+    upload_path = job_queue.upload_path()
+    try:
+        sha256, size = await save_upload(file, upload_path)
+        # enqueue() moves the upload into a new workspace and writes job.json
+        job, queued = await run_in_threadpool(job_queue.enqueue, file.filename, upload_path,
+                                              sha256, size)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        await run_in_threadpool(_discard_upload, upload_path)
+    return {"job_id": job.id, "status": job.status, "sha256": sha256,
+            "deduplicated": not queued, "links": job_links(job)}
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50):
+    return {"jobs": [{"id": job.id, "status": job.status, "filename": job.filename,
+                      "created": job.created} for job in job_queue.jobs()[:limit]]}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return dict(job.to_dict(), links=job_links(job))
+
+@app.get("/jobs/{job_id}/log")
+async def download_job_log(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if not os.path.exists(job.path(LOG_FILE)):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}; no log yet")
+    return FileResponse(job.path(LOG_FILE), filename="disassembly.log")
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, events: Optional[str] = None,
+                            last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events: stage changes with percent complete, then partial
+    results (sections decoded, strings per section, loops) as the analyzer
+    produces them, and the job's status changes. 'events' limits the stream
+    to a comma-separated list of event names; a reconnecting client's
+    Last-Event-ID header resumes after the last event it received.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    kinds = parse_event_filter(events)
+
+    async def sse():
+        async for event_id, event, data in follow_job_events(job, after, kinds):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            head = f"id: {event_id}\n" if event_id is not None else ""
+            yield f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/jobs/{job_id}/ws")
+async def job_events_websocket(websocket: WebSocket, job_id: str, events: Optional[str] = None,
+                               after: int = 0):
+    """The /jobs/{id}/events stream over a WebSocket, one JSON message per event."""
+    job = job_queue.get(job_id)
+    if job is None:
+        await websocket.close(code=1008, reason=f"Unknown job {job_id}")
+        return
+    await websocket.accept()
+    try:
+        async for event_id, event, data in follow_job_events(job, after, parse_event_filter(events)):
+            if event is not None:
+                await websocket.send_json(dict(data, id=event_id, event=event))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(request: Request, job_id: str):
+    """Counts and code/data section ranges of a finished job, with the query endpoints."""
+    results = await job_results(job_id)
+    base = f"/jobs/{job_id}"
+    return run_query(request, lambda: dict(results.summary(), links={
+        "instructions": f"{base}/instructions", "functions": f"{base}/functions",
+        "strings": f"{base}/strings", "loops": f"{base}/loops"}))
 
-    # Run the disassembler
-    result = subprocess.run(
-        [sys.executable, "rda_disassembler_enhanced.py", file_location], 
-        capture_output=True, text=True
-    )
+@app.get("/jobs/{job_id}/instructions")
+async def query_instructions(request: Request, job_id: str, start: Optional[str] = None,
+                             end: Optional[str] = None, function: Optional[str] = None,
+                             section: Optional[str] = None, cursor: Optional[str] = None,
+                             limit: int = DEFAULT_PAGE_SIZE):
+    """Instructions in [start, end), of one function and/or code section, one page at a time."""
+    results = await job_results(job_id)
+    return run_query(request, lambda: results.instructions(
+        parse_address(start), parse_address(end), function, section, cursor, limit))
 
-    # Save output to a log file inside the container
-    DISASSEMBLY_LOG = os.path.join(FIRMWARE_DIR, "disassembly.log")
+@app.get("/jobs/{job_id}/functions")
+async def query_functions(request: Request, job_id: str, name: Optional[str] = None,
+                          cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Functions whose name contains 'name' (all if omitted)."""
+    results = await job_results(job_id)
+    return run_query(request, results.functions, name, cursor, limit)
 
-    # Write disassembly results to the log file
-    with open(DISASSEMBLY_LOG, "w") as log_file:
-        log_file.write("=== Disassembly Results ===\n")
-        log_file.write(result.stdout if result.stdout else "No output from disassembler.\n")
+@app.get("/jobs/{job_id}/functions/{name}")
+async def get_function(request: Request, job_id: str, name: str):
+    """One function's extent, basic blocks and loop ids."""
+    results = await job_results(job_id)
+    return run_query(request, results.function, name)
 
-    # **Change Auto-Save Directory to `Binary_Program_VC`**
-    AUTO_SAVE_DIR = "/app"
-    os.makedirs(AUTO_SAVE_DIR, exist_ok=True)
+@app.get("/jobs/{job_id}/strings")
+async def query_strings(request: Request, job_id: str, contains: Optional[str] = None,
+                        section: Optional[str] = None, start: Optional[str] = None,
+                        end: Optional[str] = None, cursor: Optional[str] = None,
+                        limit: int = DEFAULT_PAGE_SIZE):
+    """Printable strings containing 'contains', by data section and address range."""
+    results = await job_results(job_id)
+    return run_query(request, lambda: results.strings(
+        contains, section, parse_address(start), parse_address(end), cursor, limit))
 
-    # Define the auto-save log file path
-    AUTO_SAVE_PATH = os.path.join(AUTO_SAVE_DIR, "disassembly_output.log")
+@app.get("/jobs/{job_id}/loops")
+async def query_loops(request: Request, job_id: str, function: Optional[str] = None,
+                      cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Potential infinite loops, optionally only those in 'function'."""
+    results = await job_results(job_id)
+    return run_query(request, results.loops, function, cursor, limit)
 
-    # Save the disassembly output to the correct location
-    shutil.copy(DISASSEMBLY_LOG, AUTO_SAVE_PATH)
+@app.get("/jobs/{job_id}/loops/{loop_id}")
+async def get_loop(request: Request, job_id: str, loop_id: int):
+    """Loop 'loop_id' (the N of "Loop N" in the log): its blocks and function."""
+    results = await job_results(job_id)
+    return run_query(request, results.loop, loop_id)
 
-    return {"status": "PASS", "message": "Disassembly complete!", "log_saved_to": AUTO_SAVE_PATH}
+@app.get("/metrics")
+async def metrics(limit: int = 100):
+    """Per-stage wall/CPU time and peak RSS statistics over the last 'limit' analyses."""
+    history = read_history(METRICS_HISTORY, limit)
+    return {"runs": len(history), "stages": aggregate_history(history)}
 
 @app.get("/download")
 async def download_disassembly():
-    return FileResponse("firmware/disassembly.log", filename="disassembly.log")
+    """Log of the most recently finished job (see /jobs/{id}/log for a specific one)."""
+    done = [job for job in job_queue.jobs() if job.status == JOB_DONE]
+    if not done:
+        raise HTTPException(status_code=404, detail="No finished analysis yet")
+    return await download_job_log(max(done, key=lambda job: job.finished).id)
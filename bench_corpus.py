@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+bench_corpus.py
+
+End-to-end benchmark for rda_disassembler_enhanced.py on generated code.
+
+For every size in the corpus a C program is generated with a controlled
+number of functions, loop nesting depth and branch density (the same seed
+always gives the same source), compiled with gcc and analyzed with
+'--profile'. Each stage's throughput (instructions per second of stage
+wall time, best of --runs) is compared with a stored baseline. The suite
+fails when a stage is slower than the baseline by more than --threshold.
+
+Every program also contains one unconditional spin loop, so a run where
+loop detection stops finding it fails as well.
+
+Usage:
+  python bench_corpus.py [--sizes small,medium,large] [--runs N]
+                         [--baseline PATH] [--update-baseline] [--threshold 0.25]
+
+Baselines depend on the machine; record one with --update-baseline on the
+machine that will run the comparison.
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+
+from analysis_profile import read_profile
+
+SCRIPT = "rda_disassembler_enhanced.py"
+BENCH_DIR = "firmware/bench"
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# name -> (functions, max loop nesting, branch density)
+CORPUS_SIZES = {
+    "small": (100, 2, 0.3),
+    "medium": (1000, 3, 0.4),
+    "large": (5000, 3, 0.5),
+}
+DEFAULT_SIZES = "small,medium"
+
+STATEMENTS_PER_FUNCTION = 8
+
+# Stages shorter than this in the baseline are timer noise, not throughput
+MIN_STAGE_SECONDS = 0.02
+
+
+# ------------------------------------------------------------------------------
+# Program Generation
+# ------------------------------------------------------------------------------
+def _statement(rng, depth, indent, branch_density):
+    """One generated statement: arithmetic, a branch or a nested loop."""
+    pad = "    " * indent
+    choice = rng.random()
+    if depth > 0 and choice < 0.25:
+        var = f"i{depth}"
+        lines = [f"{pad}for (int {var} = 0; {var} < (x & 7) + 2; {var}++) {{"]
+        for _ in range(2):
+            lines += _statement(rng, depth - 1, indent + 1, branch_density)
+        return lines + [f"{pad}}}"]
+    if choice < 0.25 + branch_density / 2:
+        k = rng.randint(1, 97)
+        return [f"{pad}if ((acc ^ {k}) & 1) {{",
+                f"{pad}    acc += {k};",
+                f"{pad}}} else {{",
+                f"{pad}    acc -= x >> {k % 5};",
+                f"{pad}}}"]
+    if choice < 0.25 + branch_density:
+        cases = rng.randint(3, 8)
+        lines = [f"{pad}switch (acc % {cases}) {{"]
+        for case in range(cases):
+            lines.append(f"{pad}case {case}: acc = acc * {case + 3} + x; break;")
+        return lines + [f"{pad}default: acc ^= x; break;", f"{pad}}}"]
+    return [f"{pad}acc = acc * {rng.randint(2, 31)} + (x ^ {rng.randint(0, 255)});"]
+
+
+def generate_program(n_functions, max_depth, branch_density, seed=0):
+    """
+    C source with 'n_functions' functions of STATEMENTS_PER_FUNCTION
+    statements each. 'branch_density' is the share of statements that are
+    if/else or switch; loops nest up to 'max_depth' deep. Functions call
+    earlier ones, and spin() never returns.
+    """
+    rng = random.Random(seed)
+    lines = ["#include <stdio.h>", "", "volatile int sink;", "",
+             "void spin(void) {", "    for (;;) {", "        sink++;", "    }", "}", ""]
+    for i in range(n_functions):
+        lines.append(f"int f{i}(int x) {{")
+        lines.append("    int acc = x;")
+        depth = rng.randint(0, max_depth)
+        for _ in range(STATEMENTS_PER_FUNCTION):
+            lines += _statement(rng, depth, 1, branch_density)
+        if i and rng.random() < 0.5:
+            lines.append(f"    acc += f{rng.randrange(i)}(acc & 15);")
+        lines += ["    return acc;", "}", ""]
+    lines += ["int main(int argc, char **argv) {",
+              "    int total = 0;",
+              "    if (argc > 100)",
+              "        spin();"]
+    lines += [f"    total += f{i}(argc);" for i in range(n_functions)]
+    lines += ['    printf("%d\\n", total);', "    return 0;", "}", ""]
+    return "\n".join(lines)
+
+
+def build_corpus_binary(name, out_dir, cc="gcc", opt="-O0"):
+    """Generate and compile the program for corpus size 'name'; returns its path."""
+    n_functions, max_depth, branch_density = CORPUS_SIZES[name]
+    os.makedirs(out_dir, exist_ok=True)
+    source = os.path.join(out_dir, f"{name}.c")
+    binary = os.path.join(out_dir, f"{name}.bin")
+    with open(source, "w") as f:
+        f.write(generate_program(n_functions, max_depth, branch_density, seed=n_functions))
+    subprocess.run([cc, opt, "-fno-inline", source, "-o", binary], check=True)
+    return binary
+
+
+# ------------------------------------------------------------------------------
+# Measurement
+# ------------------------------------------------------------------------------
+def profile_binary(binary, out_dir, runs, extra_args=()):
+    """
+    Analyze 'binary' 'runs' times and keep each stage's fastest wall time.
+    Returns {"instructions", "loops", "stages": {stage: wall_s}}.
+    """
+    profile_path = os.path.join(out_dir, "profile.json")
+    best, counts = {}, {}
+    for _ in range(runs):
+        subprocess.run([sys.executable, SCRIPT, binary, "--no-cache", "--quiet",
+                        "--log-file", os.path.join(out_dir, "bench.log"),
+                        "--profile", profile_path, *extra_args],
+                       stdout=subprocess.DEVNULL, check=True)
+        document = read_profile(profile_path)
+        for record in document["stages"]:
+            best[record["name"]] = min(best.get(record["name"], float("inf")), record["wall_s"])
+            counts.update(record["counts"])
+    return {"instructions": counts.get("instructions", 0), "loops": counts.get("loops", 0),
+            "stages": best}
+
+
+def throughput(result):
+    """Instructions per second of every stage in a profile_binary() result."""
+    return {stage: result["instructions"] / wall if wall > 0 else None
+            for stage, wall in result["stages"].items()}
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return one message per stage whose throughput fell by more than 'threshold'."""
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            continue
+        current = throughput(result)
+        for stage, base_wall in base["stages"].items():
+            if base_wall < MIN_STAGE_SECONDS or current.get(stage) is None:
+                continue
+            base_rate = base["instructions"] / base_wall
+            if current[stage] < base_rate * (1 - threshold):
+                regressions.append(f"{size}/{stage}: {current[stage]:,.0f} insn/s vs baseline "
+                                   f"{base_rate:,.0f} insn/s ({current[stage] / base_rate - 1:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the disassembler on generated ELF corpora")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated corpus sizes from {', '.join(CORPUS_SIZES)} "
+                             f"(default {DEFAULT_SIZES})")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per size, best kept (default 3)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help=f"Baseline JSON (default {DEFAULT_BASELINE})")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed throughput drop per stage, as a fraction (default 0.25)")
+    parser.add_argument("--cc", default="gcc", help="C compiler (default gcc)")
+    parser.add_argument("--opt", default="-O0", help="Optimization flag for the corpus (default -O0)")
+    parser.add_argument("--jobs", type=int, default=1, help="Passed through to the disassembler")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in CORPUS_SIZES]
+    if unknown:
+        parser.error(f"unknown corpus size(s): {', '.join(unknown)}")
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    results, failures = {}, []
+    for size in sizes:
+        out_dir = os.path.join(BENCH_DIR, size)
+        binary = build_corpus_binary(size, out_dir, args.cc, args.opt)
+        result = profile_binary(binary, out_dir, args.runs, ["--jobs", str(args.jobs)])
+        results[size] = result
+        stages = " | ".join(f"{stage} {wall:.3f}s" for stage, wall in result["stages"].items())
+        print(f"[BENCH] {size}: {result['instructions']} instructions, "
+              f"{os.path.getsize(binary)} bytes | {stages}")
+        if result["loops"] < 1:
+            failures.append(f"{size}: the spin() loop was not detected")
+
+    document = {"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                            "cpus": os.cpu_count()},
+                "options": {"cc": args.cc, "opt": args.opt, "jobs": args.jobs},
+                "sizes": results}
+    with open(os.path.join(BENCH_DIR, "results.json"), "w") as f:
+        json.dump(document, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"[BENCH] Baseline written to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"[BENCH] No baseline at {args.baseline}; record one with --update-baseline.")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("options") != document["options"]:
+            print(f"[WARNING] Baseline was recorded with {baseline.get('options')}, "
+                  f"this run used {document['options']}.")
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        failures += regressions
+        if not regressions:
+            print(f"[BENCH] No stage regressed by more than {args.threshold:.0%} "
+                  f"against {args.baseline}.")
+
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+
+Startup-time benchmark for rda_disassembler_enhanced.py. Every sample runs
+in a fresh interpreter, so nothing is already imported:
+  - import:  'import rda_disassembler_enhanced'
+  - help:    'rda_disassembler_enhanced.py --help' (argument parsing included)
+
+The median of each is compared against a limit, and the modules that only
+specific options need (angr, pydot, matplotlib) must not be loaded by a
+plain import. Exits non-zero on a regression, so CI can run it as a gate.
+
+Usage:
+  python bench_startup.py [--runs N] [--max-import-seconds S] [--max-help-seconds S]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+SCRIPT = "rda_disassembler_enhanced.py"
+MODULE = "rda_disassembler_enhanced"
+
+# Only loaded on demand (--angr, Graphviz/matplotlib drawing)
+DEFERRED_MODULES = ("angr", "pydot", "matplotlib")
+
+# Generous defaults: an eager angr import alone takes well over a second
+DEFAULT_MAX_IMPORT_SECONDS = 1.0
+DEFAULT_MAX_HELP_SECONDS = 1.5
+
+IMPORT_PROBE = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    f"import {MODULE}\n"
+    "elapsed = time.perf_counter() - t\n"
+    "import json\n"
+    "print(json.dumps({'seconds': elapsed, 'loaded': sorted(m for m in %r if m in sys.modules)}))\n"
+    % (DEFERRED_MODULES,)
+)
+
+
+def time_import(repo_dir):
+    """Seconds spent in the module import, and the deferred modules it loaded."""
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=repo_dir,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def time_help(repo_dir):
+    """Wall time of a whole '--help' invocation, interpreter start included."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, SCRIPT, "--help"], cwd=repo_dir,
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guard rda_disassembler_enhanced.py startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Samples per measurement (default 5)")
+    parser.add_argument("--max-import-seconds", type=float, default=DEFAULT_MAX_IMPORT_SECONDS,
+                        help=f"Median import time limit (default {DEFAULT_MAX_IMPORT_SECONDS})")
+    parser.add_argument("--max-help-seconds", type=float, default=DEFAULT_MAX_HELP_SECONDS,
+                        help=f"Median '--help' wall time limit (default {DEFAULT_MAX_HELP_SECONDS})")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # One untimed run warms the OS page cache and writes the .pyc files
+    time_import(repo_dir)
+
+    import_samples, loaded = [], set()
+    for _ in range(args.runs):
+        seconds, modules = time_import(repo_dir)
+        import_samples.append(seconds)
+        loaded.update(modules)
+    help_samples = [time_help(repo_dir) for _ in range(args.runs)]
+
+    import_median = statistics.median(import_samples)
+    help_median = statistics.median(help_samples)
+    print(f"import {MODULE}: median {import_median:.3f}s "
+          f"(min {min(import_samples):.3f}s, limit {args.max_import_seconds:.3f}s)")
+    print(f"{SCRIPT} --help: median {help_median:.3f}s "
+          f"(min {min(help_samples):.3f}s, limit {args.max_help_seconds:.3f}s)")
+
+    failures = []
+    if loaded:
+        failures.append(f"importing {MODULE} loads {', '.join(sorted(loaded))}; "
+                        "import these where they are used")
+    if import_median > args.max_import_seconds:
+        failures.append(f"import time {import_median:.3f}s exceeds {args.max_import_seconds:.3f}s")
+    if help_median > args.max_help_seconds:
+        failures.append(f"--help time {help_median:.3f}s exceeds {args.max_help_seconds:.3f}s")
+    for failure in failures:
+        print(f"[ERROR] {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,66 @@
 #!/usr/bin/env python3
 """
-rda_enhanced_with_data_and_cfg.py
-
-Extended from your original script to:
- 1) Detect ELF architecture (x86_64, ARM, etc.)
- 2) Disassemble all executable sections linearly
- 3) Extract printable strings from non-executable data sections
- 4) Build a BASIC Control Flow Graph (CFG) from the instruction-level disassembly
+rda_disassembler_enhanced.py
+
+Static analysis of an ELF firmware image:
+ 1) Detect the ELF architecture (x86_64, ARM, AArch64, RISC-V, PowerPC, MIPS)
+ 2) Disassemble the executable sections: a linear sweep of every byte
+    (--disasm-mode linear, the default; --jobs N splits it over N worker
+    processes) or recursive descent from the entry point and function
+    symbols (--disasm-mode recursive; unreached gaps are still swept
+    unless --no-gap-sweep)
+ 3) Build the control flow graph from basic blocks (one node per
+    instruction with --insn-cfg) and write it as DOT, .npz or GraphML
+ 4) Report infinite loops (closed SCCs of the CFG), one function at a time
+    under --loop-budget / --loop-max-nodes, plus the loops that span
+    several functions
+ 5) Extract printable strings from the non-executable data sections
+ 6) Optionally lift every function to VEX IR with angr (--angr)
+
+Results are cached by image content in --cache-dir, so a rerun of the same
+image and options reuses the earlier results. --save-artifact DIR keeps a
+run for a later --baseline DIR run, which reports the functions that
+changed and re-analyzes only those. --stream bounds memory for very large images by
+decoding in windows and spilling the CFG to disk (see --memory-budget).
+--profile and --jsonl record per-stage metrics and progress events; see
+analysis_profile.py and api.py.
 
 Usage:
-  python rda_enhanced_with_data_and_cfg.py <firmware.elf>
+  python rda_disassembler_enhanced.py <firmware.elf> [options]   (--help lists them)
 
 Dependencies:
-  pip install capstone pyelftools
+  pip install -r requirements.txt
   Also install Graphviz to convert .dot to .png: 'sudo apt-get install graphviz' (Linux)
 """
 
+import gc
 import sys
 import os
-import string
-import angr
+import json
+import time
+import mmap
+import re
+import heapq
+import signal
+import threading
 import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+import numpy as np
 import networkx as nx
 from elftools.elf.elffile import ELFFile
 from elftools.elf.constants import SH_FLAGS
 from elftools.elf.enums import ENUM_E_MACHINE
 from capstone import *
-from angr.errors import SimTranslationError, SimEngineError
-import networkx.drawing.nx_pydot as nx_pydot
+from capstone import arm_const, arm64_const, mips_const, ppc_const, riscv_const, x86_const
+from analysis_cache import (AnalysisCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES,
+                            cache_key, read_entry, sha256_of, write_entry)
+from analysis_profile import DEFAULT_PROFILE_PATH, StageProfiler, peak_rss
 
 # Handle older Capstone versions lacking RISC-V modes
 try:
@@ -39,17 +72,118 @@ except ImportError:
 # ------------------------------------------------------------------------------
 # Logging Setup
 # ------------------------------------------------------------------------------
-LOG_PATH = "firmware/disassembly.log"
-os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+LOG_PATH = "firmware/disassembly.log"  # default, see configure_logging()
+
+# Verbosity levels. The log file always gets everything; the terminal only
+# gets messages at or above the console level (--quiet => LOG_SUMMARY).
+LOG_DETAIL = 0   # per-instruction / per-string / per-statement listings
+LOG_INFO = 1     # progress messages
+LOG_SUMMARY = 2  # results, alerts, warnings and errors
+
+LOG_LEVEL_NAMES = {LOG_DETAIL: "detail", LOG_INFO: "info", LOG_SUMMARY: "summary"}
+
+LOG_BUFFER_SIZE = 1024 * 1024
+
+
+class AnalysisLog:
+    """
+    Log sink shared by every log_message() call: the terminal (filtered by
+    'console_level'), an optional plain-text log file and an optional JSON
+    Lines file carrying the same events in machine-readable form. Files are
+    opened once and written through a large buffer.
+    """
+
+    def __init__(self, log_path=None, jsonl_path=None, console_level=LOG_DETAIL):
+        self.log_path = log_path
+        self.jsonl_path = jsonl_path
+        self.console_level = console_level
+        self._file = self._open(log_path)
+        self._jsonl = self._open(jsonl_path)
+
+    @staticmethod
+    def _open(path):
+        if not path:
+            return None
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        return open(path, "w", buffering=LOG_BUFFER_SIZE)
+
+    def emit(self, msg, level=LOG_INFO, event=None, fields=None):
+        if level >= self.console_level:
+            print(msg)
+        if self._file is not None:
+            self._file.write(msg + "\n")
+        if self._jsonl is not None:
+            record = {"ts": round(time.time(), 6), "level": LOG_LEVEL_NAMES[level],
+                      "event": event or "message", "msg": msg.strip()}
+            if fields:
+                record.update(fields)
+            self._jsonl.write(json.dumps(record) + "\n")
+
+    def event(self, event, fields):
+        """
+        Write a JSON Lines-only event (no text line) and flush the sink at
+        once, so a reader following the file (api.py) sees it live.
+        """
+        if self._jsonl is not None:
+            record = {"ts": round(time.time(), 6), "level": LOG_LEVEL_NAMES[LOG_INFO],
+                      "event": event}
+            record.update(fields)
+            self._jsonl.write(json.dumps(record) + "\n")
+            self._jsonl.flush()
+
+    def flush(self):
+        for sink in (self._file, self._jsonl):
+            if sink is not None:
+                sink.flush()
+        sys.stdout.flush()
+
+    def close(self):
+        for sink in (self._file, self._jsonl):
+            if sink is not None:
+                sink.close()
+        self._file = self._jsonl = None
+
+
+# Terminal-only until main() (or a library caller) calls configure_logging()
+_log = AnalysisLog()
+
+
+def configure_logging(log_path=LOG_PATH, jsonl_path=None, quiet=False):
+    """
+    (Re)open the log sinks: truncate 'log_path', optionally write JSON Lines
+    events to 'jsonl_path', and with 'quiet' only print summaries.
+    """
+    global _log
+    _log.close()
+    _log = AnalysisLog(log_path, jsonl_path,
+                       console_level=LOG_SUMMARY if quiet else LOG_DETAIL)
+    if _log._file is not None:
+        _log._file.write("[INFO] Disassembly & Data Extraction Log Initialized.\n")
+    return _log
+
+
+def flush_log():
+    """Push buffered log output to disk (e.g. before forking workers)."""
+    _log.flush()
+
+
+def close_logging():
+    _log.close()
+
+
+def log_message(msg, level=LOG_INFO, event=None, **fields):
+    """
+    Log to file *and* print to terminal (subject to the console verbosity).
+    'event' and 'fields' only show up in the JSON Lines sink.
+    """
+    _log.emit(msg, level, event, fields)
 
-with open(LOG_PATH, "w") as f:
-    f.write("[INFO] Disassembly & Data Extraction Log Initialized.\n")
 
-def log_message(msg):
-    """Log to file *and* print to terminal."""
-    print(msg)
-    with open(LOG_PATH, "a") as f:
-        f.write(msg + "\n")
+def log_event(event, **fields):
+    """Progress event for --jsonl followers only (stage, progress, section, ...)."""
+    _log.event(event, fields)
 
 # ------------------------------------------------------------------------------
 # Architecture Detection
@@ -62,61 +196,125 @@ def detect_arch(elffile):
     if isinstance(e_machine, str):
         e_machine = ENUM_E_MACHINE.get(e_machine, None)
     if e_machine is None:
-        log_message("[ERROR] Could not determine architecture (e_machine=None).")
+        log_message("[ERROR] Could not determine architecture (e_machine=None).", LOG_SUMMARY)
         sys.exit(1)
 
     arch_str = ENUM_E_MACHINE.get(e_machine, "UNKNOWN")
-    log_message(f"[DEBUG] e_machine = {arch_str} (ID={e_machine})")
+    log_message(f"[DEBUG] e_machine = {arch_str} (ID={e_machine})", LOG_DETAIL)
 
     if e_machine == 62:  # EM_X86_64
-        log_message("[INFO] Architecture: x86_64.")
+        log_message("[INFO] Architecture: x86_64.", LOG_SUMMARY, "arch")
         return (CS_ARCH_X86, CS_MODE_64, 8)
     elif e_machine == 40:  # EM_ARM (32-bit)
-        log_message("[INFO] Architecture: ARM (32-bit).")
+        log_message("[INFO] Architecture: ARM (32-bit).", LOG_SUMMARY, "arch")
         return (CS_ARCH_ARM, CS_MODE_ARM, 4)
     elif e_machine == 183:  # EM_AARCH64 (ARM64)
-        log_message("[INFO] Architecture: AArch64.")
+        log_message("[INFO] Architecture: AArch64.", LOG_SUMMARY, "arch")
         return (CS_ARCH_ARM64, CS_MODE_LITTLE_ENDIAN, 8)
     elif e_machine == 243:  # EM_RISCV
         ei_class = elffile.header.e_ident['EI_CLASS']
         if ei_class == 1:  # 32-bit
-            log_message("[INFO] Architecture: RISC-V 32-bit.")
+            log_message("[INFO] Architecture: RISC-V 32-bit.", LOG_SUMMARY, "arch")
             return (CS_ARCH_RISCV, CS_MODE_RISC_V32, 4)
         else:  # 64-bit
-            log_message("[INFO] Architecture: RISC-V 64-bit.")
+            log_message("[INFO] Architecture: RISC-V 64-bit.", LOG_SUMMARY, "arch")
             return (CS_ARCH_RISCV, CS_MODE_RISC_V64, 8)
     elif e_machine == 20:  # EM_PPC (32-bit)
-        log_message("[INFO] Architecture: PowerPC 32-bit.")
+        log_message("[INFO] Architecture: PowerPC 32-bit.", LOG_SUMMARY, "arch")
         return (CS_ARCH_PPC, CS_MODE_32, 4)
     elif e_machine == 21:  # EM_PPC64 (64-bit)
-        log_message("[INFO] Architecture: PowerPC 64-bit.")
+        log_message("[INFO] Architecture: PowerPC 64-bit.", LOG_SUMMARY, "arch")
         return (CS_ARCH_PPC, CS_MODE_64, 8)
     elif e_machine == 8:  # EM_MIPS (32-bit)
-        log_message("[INFO] Architecture: MIPS 32-bit.")
+        log_message("[INFO] Architecture: MIPS 32-bit.", LOG_SUMMARY, "arch")
         return (CS_ARCH_MIPS, CS_MODE_32, 4)
 
-    log_message(f"[ERROR] Unsupported architecture: {e_machine} ({arch_str})")
+    log_message(f"[ERROR] Unsupported architecture: {e_machine} ({arch_str})", LOG_SUMMARY)
     sys.exit(1)
 
 # ------------------------------------------------------------------------------
 # Section Loading
 # ------------------------------------------------------------------------------
-def load_executable_sections(elffile):
+class MappedFile:
+    """
+    mmap an open file once and hand out zero-copy memoryview slices of it.
+
+    The mapping is ACCESS_COPY (private copy-on-write), not ACCESS_READ:
+    Capstone only passes *writable* buffers to C by reference and copies
+    read-only ones with tobytes(). Nothing ever writes to the views, so no
+    page is actually copied and the file on disk is never modified.
+
+    Use as a context manager; close() releases every view handed out, so
+    they must not be used afterwards.
+    """
+
+    def __init__(self, fileobj):
+        self._mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._base = memoryview(self._mmap)
+        self._views = []
+
+    def view(self, offset, size):
+        """Return a memoryview of 'size' bytes at file offset 'offset'."""
+        view = self._base[offset:offset + size]
+        self._views.append(view)
+        return view
+
+    def release(self, offset, size):
+        """
+        Drop the resident pages of [offset, offset + size) (whole pages
+        only). They are re-read from the file if touched again, so this only
+        lowers RSS; it is a no-op where madvise() isn't available.
+        """
+        if not hasattr(self._mmap, "madvise"):
+            return
+        start = -(-offset // mmap.PAGESIZE) * mmap.PAGESIZE
+        end = min((offset + size) // mmap.PAGESIZE * mmap.PAGESIZE, len(self._mmap))
+        if end > start:
+            self._mmap.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._base.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def section_bytes(section, mapped=None):
+    """
+    Return the contents of an ELF section: a zero-copy view into 'mapped'
+    when possible, otherwise pyelftools' copied (and, for SHF_COMPRESSED,
+    decompressed) section.data().
+    """
+    if mapped is None or section['sh_flags'] & SH_FLAGS.SHF_COMPRESSED:
+        return section.data()
+    return mapped.view(section['sh_offset'], section['sh_size'])
+
+
+def load_executable_sections(elffile, mapped=None):
     """
     Returns [(name, bytes, base_addr, size)] for SHF_EXECINSTR sections.
+    With 'mapped' (a MappedFile of the same ELF), 'bytes' is a memoryview.
     """
     results = []
     for section in elffile.iter_sections():
         flags = section['sh_flags']
         if flags & SH_FLAGS.SHF_EXECINSTR:
-            results.append((section.name, section.data(),
+            results.append((section.name, section_bytes(section, mapped),
                             section['sh_addr'], section['sh_size']))
     return results
 
-def load_data_sections(elffile):
+def load_data_sections(elffile, mapped=None):
     """
     Returns [(name, bytes, base_addr, size)] for sections that are *not* executable
     but do have data (like .rodata, .data). Excludes SHT_NOBITS (e.g. .bss).
+    With 'mapped' (a MappedFile of the same ELF), 'bytes' is a memoryview.
     """
     results = []
     for section in elffile.iter_sections():
@@ -126,8 +324,8 @@ def load_data_sections(elffile):
         if not (flags & SH_FLAGS.SHF_EXECINSTR):  # Not executable
             # Exclude "NOBITS" sections which have no real data (like .bss).
             if sh_type != 'SHT_NOBITS':
-                data = section.data()
-                if data:  # Non-empty
+                data = section_bytes(section, mapped)
+                if len(data):  # Non-empty
                     results.append((section.name, data, section['sh_addr'], section['sh_size']))
     return results
 
@@ -147,330 +345,2843 @@ def gather_symbols(elffile):
                     sym_map[sym['st_value']] = (sym.name, is_func)
     return sym_map
 
+
+class FunctionIndex:
+    """
+    Sorted, non-overlapping [start, end) address intervals of the function
+    symbols (STT_FUNC / STT_GNU_IFUNC) of an ELF, for mapping any address to
+    its containing function and offset.
+
+    A function's extent is its st_size. Size-less symbols run up to the next
+    function or the end of their section, and an interval is clipped where
+    the next function starts.
+    When several symbols share a start address the one with the largest
+    size wins (ties: first seen, so .symtab names beat .dynsym ones).
+    """
+
+    def __init__(self, starts, ends, names):
+        self.starts = np.asarray(starts, dtype=np.uint64)
+        self.ends = np.asarray(ends, dtype=np.uint64)
+        self.names = list(names)
+
+    @classmethod
+    def from_elf(cls, elffile):
+        best = {}
+        section_ends = {}
+        for section in elffile.iter_sections():
+            if section.header['sh_type'] not in ('SHT_SYMTAB', 'SHT_DYNSYM'):
+                continue
+            for sym in section.iter_symbols():
+                if (sym['st_info']['type'] not in ('STT_FUNC', 'STT_GNU_IFUNC')
+                        or sym['st_value'] == 0 or sym['st_shndx'] == 'SHN_UNDEF'):
+                    continue
+                start, size = sym['st_value'], sym['st_size']
+                if not size and isinstance(sym['st_shndx'], int):
+                    shndx = sym['st_shndx']
+                    if shndx not in section_ends:
+                        header = elffile.get_section(shndx).header
+                        section_ends[shndx] = header['sh_addr'] + header['sh_size']
+                    size = max(section_ends[shndx] - start, 0)
+                if start not in best or size > best[start][1]:
+                    best[start] = (sym.name, size)
+
+        starts = sorted(best)
+        ends = []
+        for i, start in enumerate(starts):
+            next_start = starts[i + 1] if i + 1 < len(starts) else None
+            size = best[start][1]
+            end = start + size if size else (next_start or start + 1)
+            if next_start is not None:
+                end = min(end, next_start)
+            ends.append(end)
+        return cls(starts, ends, [best[start][0] for start in starts])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        """Yield (name, start, end) in address order."""
+        return iter(zip(self.names, self.starts.tolist(), self.ends.tolist()))
+
+    def lookup(self, addr):
+        """Return (name, offset) of the function containing 'addr', or None."""
+        idx = int(np.searchsorted(self.starts, np.uint64(addr), side="right")) - 1
+        if idx >= 0 and addr < int(self.ends[idx]):
+            return self.names[idx], addr - int(self.starts[idx])
+        return None
+
+    def lookup_indices(self, addrs):
+        """
+        Vectorized lookup: returns (func_idx, offsets) arrays for a uint64
+        array of addresses, func_idx being -1 (offset 0) outside any function.
+        """
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        idx = np.searchsorted(self.starts, addrs, side="right").astype(np.int64) - 1
+        inside = idx >= 0
+        inside[inside] = addrs[inside] < self.ends[idx[inside]]
+        idx[~inside] = -1
+        offsets = np.zeros(len(addrs), dtype=np.uint64)
+        offsets[inside] = addrs[inside] - self.starts[idx[inside]]
+        return idx, offsets
+
+    def partition(self, sorted_addrs):
+        """
+        For an address-sorted uint64 array (e.g. InsnTable.addrs), return
+        (lo, hi) arrays so that sorted_addrs[lo[i]:hi[i]] are the addresses
+        inside function i.
+        """
+        lo = np.searchsorted(sorted_addrs, self.starts, side="left")
+        hi = np.searchsorted(sorted_addrs, self.ends, side="left")
+        return lo, hi
+
+    def annotate(self, addrs):
+        """
+        Return one "<name>" / "<name+0xoff>" hint per address (empty outside
+        any function), computed in bulk.
+        """
+        idx, offsets = self.lookup_indices(addrs)
+        names = self.names
+        return [("" if func < 0 else f"<{names[func]}>" if off == 0
+                 else f"<{names[func]}+{off:#x}>")
+                for func, off in zip(idx.tolist(), offsets.tolist())]
+
 # ------------------------------------------------------------------------------
-# Linear-Sweep Disassembly for Code Sections
+# Columnar Instruction Table
 # ------------------------------------------------------------------------------
-def linear_sweep_disassemble(md, code, base_addr):
+# Per-instruction flag bits (InsnTable.flags)
+FLAG_BRANCH = 0x1          # intraprocedural jump: 'target' is a CFG edge
+FLAG_NO_FALLTHROUGH = 0x2  # never falls through to the next address
+FLAG_CALL = 0x4            # call: falls through, 'target' is not a CFG edge
+FLAG_RET = 0x8             # return (always with FLAG_NO_FALLTHROUGH)
+
+NO_TARGET = -1
+
+
+class InsnTableBuilder:
     """
-    Disassemble code from start to end in one pass.
-    Returns {addr: (mnemonic, op_str, size)} so we can build a CFG.
+    Append-only builder for an InsnTable. Columns live in compact
+    array.array buffers while decoding; mnemonics and operand strings are
+    interned so each distinct string is stored once.
+    """
+
+    def __init__(self):
+        self.addrs = array("Q")
+        self.sizes = array("H")
+        self.mnem_ids = array("I")
+        self.op_ids = array("I")
+        self.targets = array("q")
+        self.flags = array("B")
+        self.mnemonics = []
+        self.operands = []
+        self._mnem_index = {}
+        self._op_index = {}
+
+    def _intern_mnemonic(self, mnemonic):
+        mnem_id = self._mnem_index.get(mnemonic)
+        if mnem_id is None:
+            mnem_id = len(self.mnemonics)
+            self._mnem_index[mnemonic] = mnem_id
+            self.mnemonics.append(mnemonic)
+        return mnem_id
+
+    def _intern_operand(self, op_str):
+        op_id = self._op_index.get(op_str)
+        if op_id is None:
+            op_id = len(self.operands)
+            self._op_index[op_str] = op_id
+            self.operands.append(op_str)
+        return op_id
+
+    def append(self, addr, mnemonic, op_str, size, flags, target):
+        """Add one instruction; 'flags'/'target' come from a BranchClassifier."""
+        self.addrs.append(addr)
+        self.sizes.append(size)
+        self.mnem_ids.append(self._intern_mnemonic(mnemonic))
+        self.op_ids.append(self._intern_operand(op_str))
+        self.targets.append(target)
+        self.flags.append(flags)
+
+    def extend_from(self, table, lo, hi):
+        """
+        Append rows [lo, hi) of an existing InsnTable in bulk, re-interning
+        its mnemonic and operand ids into this builder's pools.
+        """
+        if hi <= lo:
+            return
+        mnem_map = np.array([self._intern_mnemonic(m) for m in table.mnemonics], dtype=np.uint32)
+        op_map = np.array([self._intern_operand(o) for o in table.operands], dtype=np.uint32)
+        self.addrs.extend(table.addrs[lo:hi].tolist())
+        self.sizes.extend(table.sizes[lo:hi].tolist())
+        self.mnem_ids.extend(mnem_map[table.mnem_ids[lo:hi]].tolist())
+        self.op_ids.extend(op_map[table.op_ids[lo:hi]].tolist())
+        self.targets.extend(table.targets[lo:hi].tolist())
+        self.flags.extend(table.flags[lo:hi].tolist())
+
+    def finish(self):
+        """
+        Return an address-sorted InsnTable. If the same address was decoded
+        twice (overlapping sections), the last one wins, like dict.update().
+        """
+        addrs = np.frombuffer(self.addrs, dtype=np.uint64) if self.addrs else np.zeros(0, np.uint64)
+        order = np.argsort(addrs, kind="stable")
+        sorted_addrs = addrs[order]
+        if len(order) > 1:
+            keep = np.ones(len(order), dtype=bool)
+            keep[:-1] = sorted_addrs[1:] != sorted_addrs[:-1]
+            order = order[keep]
+
+        def column(buf, dtype):
+            col = np.frombuffer(buf, dtype=dtype) if buf else np.zeros(0, dtype)
+            return col[order]
+
+        return InsnTable(
+            column(self.addrs, np.uint64),
+            column(self.sizes, np.uint16),
+            column(self.mnem_ids, np.uint32),
+            column(self.op_ids, np.uint32),
+            column(self.targets, np.int64),
+            column(self.flags, np.uint8),
+            self.mnemonics,
+            self.operands,
+        )
+
+
+class InsnTable:
     """
-    insn_map = {}
-    for insn in md.disasm(code, base_addr):
-        insn_map[insn.address] = (insn.mnemonic, insn.op_str, insn.size)
-    return insn_map
+    Address-sorted, columnar table of decoded instructions.
+
+    Columns are NumPy arrays indexed by row: addrs, sizes, mnem_ids, op_ids,
+    targets (parsed branch target or NO_TARGET) and flags. 'mnemonics' and
+    'operands' are the interned string pools that mnem_ids/op_ids point into.
+
+    For compatibility with the old {addr: (mnemonic, op_str, size)} map,
+    'addr in table' and 'table[addr]' work too (binary search).
+    """
+
+    def __init__(self, addrs, sizes, mnem_ids, op_ids, targets, flags,
+                 mnemonics, operands):
+        self.addrs = addrs
+        self.sizes = sizes
+        self.mnem_ids = mnem_ids
+        self.op_ids = op_ids
+        self.targets = targets
+        self.flags = flags
+        self.mnemonics = mnemonics
+        self.operands = operands
+
+    COLUMNS = ("addrs", "sizes", "mnem_ids", "op_ids", "targets", "flags")
+
+    @classmethod
+    def from_arrays(cls, columns, mnemonics, operands):
+        """Rebuild a table from to_arrays() output and its string pools."""
+        return cls(*(columns[name] for name in cls.COLUMNS), list(mnemonics), list(operands))
+
+    def to_arrays(self):
+        """Return the columns as {name: ndarray} (string pools not included)."""
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def index_of(self, addr):
+        """Row index of 'addr', or -1 if no instruction starts there."""
+        idx = int(np.searchsorted(self.addrs, addr))
+        if idx < len(self.addrs) and int(self.addrs[idx]) == addr:
+            return idx
+        return -1
+
+    def __contains__(self, addr):
+        return self.index_of(addr) >= 0
+
+    def __getitem__(self, addr):
+        idx = self.index_of(addr)
+        if idx < 0:
+            raise KeyError(addr)
+        return self.row(idx)[1:]
+
+    def row(self, idx):
+        """Return (addr, mnemonic, op_str, size) for row 'idx'."""
+        return (int(self.addrs[idx]),
+                self.mnemonics[self.mnem_ids[idx]],
+                self.operands[self.op_ids[idx]],
+                int(self.sizes[idx]))
+
+    def rows(self):
+        """Iterate (addr, mnemonic, op_str, size) in address order."""
+        mnemonics, operands = self.mnemonics, self.operands
+        for addr, mnem_id, op_id, size in zip(self.addrs.tolist(), self.mnem_ids.tolist(),
+                                              self.op_ids.tolist(), self.sizes.tolist()):
+            yield addr, mnemonics[mnem_id], operands[op_id], size
+
+    def lookup_indices(self, addrs):
+        """Vectorized index_of(): row index per address, -1 where absent."""
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        idx = np.searchsorted(self.addrs, addrs)
+        found = idx < len(self.addrs)
+        found[found] = self.addrs[idx[found]] == addrs[found]
+        return np.where(found, idx, -1).astype(np.int64)
+
+    def fallthrough_indices(self):
+        """
+        Row index of each instruction's fall-through successor (addr + size),
+        or -1 if it's a terminating instruction or nothing was decoded there.
+        """
+        next_addrs = self.addrs + self.sizes.astype(np.uint64)
+        succ = self.lookup_indices(next_addrs)
+        succ[(self.flags & FLAG_NO_FALLTHROUGH) != 0] = -1
+        return succ
+
+    def branch_indices(self):
+        """Row index of each jump's (FLAG_BRANCH) decoded target, or -1."""
+        succ = np.full(len(self.addrs), -1, dtype=np.int64)
+        has_target = (self.targets > 0) & ((self.flags & FLAG_BRANCH) != 0)
+        succ[has_target] = self.lookup_indices(self.targets[has_target].astype(np.uint64))
+        return succ
+
 
 # ------------------------------------------------------------------------------
-# Extracting Printable ASCII Strings from Data Sections
+# Branch Classification
 # ------------------------------------------------------------------------------
-def extract_printable_strings(data, base_addr, min_len=4):
+BRANCH_NONE = 0
+BRANCH_COND = FLAG_BRANCH
+BRANCH_JUMP = FLAG_BRANCH | FLAG_NO_FALLTHROUGH
+BRANCH_CALL = FLAG_CALL
+BRANCH_RET = FLAG_RET | FLAG_NO_FALLTHROUGH
+
+# Per-arch instruction ids that Capstone's groups get wrong or can't tell
+# apart: unconditional jumps (the jump group covers conditional ones too),
+# and calls/returns that only carry the jump group (MIPS jal, PPC bl/blr).
+BRANCH_RULES = {
+    CS_ARCH_X86: {
+        "jump": {x86_const.X86_INS_JMP, x86_const.X86_INS_LJMP},
+    },
+    CS_ARCH_ARM: {
+        "jump": {arm_const.ARM_INS_B, arm_const.ARM_INS_BX},
+    },
+    CS_ARCH_ARM64: {
+        "jump": {arm64_const.ARM64_INS_B, arm64_const.ARM64_INS_BR},
+    },
+    CS_ARCH_MIPS: {
+        "jump": {mips_const.MIPS_INS_J, mips_const.MIPS_INS_JR, mips_const.MIPS_INS_B},
+        "call": {mips_const.MIPS_INS_JAL, mips_const.MIPS_INS_JALR, mips_const.MIPS_INS_BAL,
+                 mips_const.MIPS_INS_JALX, mips_const.MIPS_INS_BGEZAL,
+                 mips_const.MIPS_INS_BLTZAL},
+    },
+    CS_ARCH_PPC: {
+        "jump": {ppc_const.PPC_INS_B, ppc_const.PPC_INS_BA, ppc_const.PPC_INS_BCTR},
+        "call": {ppc_const.PPC_INS_BL, ppc_const.PPC_INS_BLA, ppc_const.PPC_INS_BCTRL,
+                 ppc_const.PPC_INS_BLRL},
+        "ret": {ppc_const.PPC_INS_BLR},
+    },
+    CS_ARCH_RISCV: {
+        "jump": {riscv_const.RISCV_INS_C_J, riscv_const.RISCV_INS_C_JR},
+        "call": {riscv_const.RISCV_INS_C_JAL, riscv_const.RISCV_INS_C_JALR},
+    },
+}
+
+# Condition codes meaning "always" on ARM/AArch64 (b.al, bx, plain b)
+ALWAYS_CONDITIONS = {
+    CS_ARCH_ARM: {arm_const.ARM_CC_AL, arm_const.ARM_CC_INVALID},
+    CS_ARCH_ARM64: {arm64_const.ARM64_CC_AL, arm64_const.ARM64_CC_NV,
+                    arm64_const.ARM64_CC_INVALID},
+}
+
+# RISC-V jal/jalr put every alias (j, jr, ret) in the call group; the
+# alias mnemonic is the only reliable signal.
+RISCV_LINK_IDS = {riscv_const.RISCV_INS_JAL, riscv_const.RISCV_INS_JALR}
+RISCV_LINK_ALIASES = {"j": BRANCH_JUMP, "jr": BRANCH_JUMP, "ret": BRANCH_RET}
+
+# ARM has no return instruction and Capstone puts no group on most writes
+# to pc: pc as the destination ("mov pc, lr", "ldr pc, [r3]") or in the
+# register list ("pop {r4, pc}", "ldm r0, {r4, pc}"), plus "bx lr". These
+# are returns when pc is reloaded from the stack (pop, ldm sp) or from lr,
+# and indirect jumps otherwise. Their kind depends on the operands, so
+# they are looked up by (mnemonic, operands) rather than by mnemonic.
+ARM_PC_OPERANDS = re.compile(r"^pc\b|\bpc\}|^lr$")
+ARM_STACK_LOADS = {arm_const.ARM_INS_POP, arm_const.ARM_INS_LDM}  # returns if based on sp
+ARM_LINK_MOVES = {arm_const.ARM_INS_BX, arm_const.ARM_INS_MOV}    # returns if moving lr
+
+# Elsewhere a register-indirect jump through the link register is the
+# usual return ("jr $ra", "c.jr ra", "br x30"); any other register makes it
+# an indirect jump. x86 and PowerPC have real return instructions (ret,
+# blr) that Capstone already groups.
+LINK_REGISTER_JUMPS = {
+    CS_ARCH_ARM64: re.compile(r"^x30$"),
+    CS_ARCH_MIPS: re.compile(r"^\$ra$"),
+    CS_ARCH_RISCV: re.compile(r"^ra$"),
+}
+
+
+class BranchClassifier:
     """
-    Scan 'data' for runs of printable ASCII (length >= min_len).
-    Returns list of (absolute_addr, string).
+    Classify decoded instructions as conditional jump, unconditional jump,
+    call, return or neither, from Capstone instruction ids and groups, and
+    resolve their immediate targets.
+
+    classify(insn) needs a detail-mode instruction and reads the target
+    from its operand structs. classify_lite() works on disasm_lite() tuples:
+    the first time a mnemonic is seen its bytes are decoded once more with
+    detail to classify it, after which the kind comes from a per-mnemonic
+    table and the target from the operand string. Instructions whose
+    operands match 'operand_kinds' (ARM writes to pc, jumps through the
+    link register) are tabled by (mnemonic, operands) instead.
+
+    Use branch_classifier() to get the shared instance for an arch.
     """
-    results = []
-    current_chars = []
-    start_offset = 0
-
-    def flush_string(end_offset):
-        s = ''.join(current_chars)
-        absolute_addr = base_addr + start_offset
-        results.append((absolute_addr, s))
-
-    is_printable = set(string.printable)  # includes digits, letters, punctuation, whitespace
-
-    for i, byte_val in enumerate(data):
-        ch = chr(byte_val)
-        if ch in is_printable and byte_val not in ("\x0B", "\x0C"):
-            # Accumulate
-            if not current_chars:
-                start_offset = i
-            current_chars.append(ch)
+
+    def __init__(self, cs_arch, cs_mode):
+        self.cs_arch = cs_arch
+        rules = BRANCH_RULES.get(cs_arch, {})
+        self._jump_ids = rules.get("jump", set())
+        self._call_ids = rules.get("call", set())
+        self._ret_ids = rules.get("ret", set())
+        self._always = ALWAYS_CONDITIONS.get(cs_arch)
+        self.operand_kinds = (ARM_PC_OPERANDS if cs_arch == CS_ARCH_ARM
+                              else LINK_REGISTER_JUMPS.get(cs_arch))
+        # RISC-V immediates are pc-relative, everyone else's are absolute
+        self.relative_targets = cs_arch == CS_ARCH_RISCV
+        self._detail_md = Cs(cs_arch, cs_mode)
+        self._detail_md.detail = True
+        self._mnemonic_kinds = {}
+
+    def kind_of(self, insn):
+        """BRANCH_* kind (= its InsnTable flags) of a detail-mode instruction."""
+        insn_id = insn.id
+        if self.cs_arch == CS_ARCH_RISCV and insn_id in RISCV_LINK_IDS:
+            return RISCV_LINK_ALIASES.get(insn.mnemonic, BRANCH_CALL)
+        groups = insn.groups
+        if insn_id in self._ret_ids or CS_GRP_RET in groups:
+            return BRANCH_RET
+        if insn_id in self._call_ids or CS_GRP_CALL in groups:
+            return BRANCH_CALL
+        if self.operand_kinds is not None and self.operand_kinds.search(insn.op_str):
+            if self.cs_arch == CS_ARCH_ARM:
+                return self._arm_pc_write_kind(insn)
+            if insn_id in self._jump_ids or CS_GRP_JUMP in groups:
+                return BRANCH_RET
+        if insn_id in self._jump_ids:
+            if self._always is not None and insn.cc not in self._always:
+                return BRANCH_COND
+            return BRANCH_JUMP
+        if CS_GRP_JUMP in groups:
+            return BRANCH_COND
+        return BRANCH_NONE
+
+    def _arm_pc_write_kind(self, insn):
+        """Kind of an ARM instruction matching ARM_PC_OPERANDS (see there)."""
+        if arm_const.ARM_REG_PC not in insn.regs_access()[1]:
+            return BRANCH_NONE
+        regs = [op.reg for op in insn.operands if op.type == CS_OP_REG]
+        if insn.id in ARM_STACK_LOADS:
+            is_return = insn.id == arm_const.ARM_INS_POP or regs[0] == arm_const.ARM_REG_SP
         else:
-            if len(current_chars) >= min_len:
-                flush_string(i)
-            current_chars = []
+            is_return = insn.id in ARM_LINK_MOVES and regs[-1] == arm_const.ARM_REG_LR
+        if insn.cc not in self._always:
+            return BRANCH_COND  # conditional: ends the block, falls through otherwise
+        return BRANCH_RET if is_return else BRANCH_JUMP
+
+    def target_of(self, insn):
+        """Immediate target of a detail-mode instruction, or NO_TARGET."""
+        for op in reversed(insn.operands):
+            if op.type == CS_OP_IMM:
+                imm = op.imm
+                return insn.address + imm if self.relative_targets else imm
+        return NO_TARGET
+
+    def classify(self, insn):
+        """Return (flags, target) for a detail-mode instruction."""
+        kind = self.kind_of(insn)
+        if kind & (FLAG_BRANCH | FLAG_CALL):
+            return kind, self.target_of(insn)
+        return kind, NO_TARGET
+
+    def classify_lite(self, address, mnemonic, op_str, insn_bytes):
+        """
+        Return (flags, target) for one disasm_lite() instruction whose raw
+        bytes are 'insn_bytes'.
+        """
+        key = mnemonic
+        if self.operand_kinds is not None and self.operand_kinds.search(op_str):
+            key = (mnemonic, op_str)
+        kind = self._mnemonic_kinds.get(key)
+        if kind is None:
+            kind = BRANCH_NONE
+            for insn in self._detail_md.disasm(bytes(insn_bytes), address, 1):
+                kind = self.kind_of(insn)
+            self._mnemonic_kinds[key] = kind
+        if not kind & (FLAG_BRANCH | FLAG_CALL):
+            return kind, NO_TARGET
+        return kind, self.parse_target(address, op_str)
+
+    def parse_target(self, address, op_str):
+        """
+        Target from an operand string: the last operand, if it is an
+        immediate ("0x401050", "#0x8000", "x0, #0x8000", "a0, a1, 12").
+        """
+        token = op_str.rsplit(",", 1)[-1].strip().lstrip("#")
+        if not token or not (token[0].isdigit() or token[0] == "-"):
+            return NO_TARGET
+        try:
+            imm = int(token, 0)
+        except ValueError:
+            return NO_TARGET
+        return address + imm if self.relative_targets else imm
 
-    # leftover run
-    if len(current_chars) >= min_len:
-        flush_string(len(data))
 
-    return results
+@lru_cache(maxsize=None)
+def branch_classifier(cs_arch, cs_mode):
+    """Shared BranchClassifier for an arch/mode, built on first use."""
+    return BranchClassifier(cs_arch, cs_mode)
 
-##### ANGR INTEGRATION #####
-def analyze_vex_ir_with_angr(binary_path):
-    log_message("[ANGR] Loading binary with angr for IR analysis...")
-    proj = angr.Project(binary_path, auto_load_libs=False)
 
-    log_message("[ANGR] Building CFGEmulated...")
-    cfg = proj.analyses.CFGEmulated()
+def decode_instructions(md, code, base_addr, count=0):
+    """
+    Decode 'code' with 'md' and yield (address, size, mnemonic, op_str,
+    flags, target) per instruction. Uses md.disasm() and operand structs
+    when md.detail is set, and the much cheaper md.disasm_lite() otherwise.
+    """
+    classifier = branch_classifier(md.arch, md.mode)
+    if md.detail:
+        for insn in md.disasm(code, base_addr, count):
+            flags, target = classifier.classify(insn)
+            yield insn.address, insn.size, insn.mnemonic, insn.op_str, flags, target
+        return
+    kinds = classifier._mnemonic_kinds
+    operand_kinds = classifier.operand_kinds
+    for address, size, mnemonic, op_str in md.disasm_lite(code, base_addr, count):
+        kind = kinds.get(mnemonic)
+        if kind == BRANCH_NONE and (operand_kinds is None or not operand_kinds.search(op_str)):
+            yield address, size, mnemonic, op_str, BRANCH_NONE, NO_TARGET
+            continue
+        offset = address - base_addr
+        flags, target = classifier.classify_lite(address, mnemonic, op_str,
+                                                 code[offset:offset + size])
+        yield address, size, mnemonic, op_str, flags, target
+
+
+def linear_sweep_disassemble(md, code, base_addr, table=None):
+    """
+    Disassemble code from start to end in one pass, appending every
+    instruction to 'table' (an InsnTableBuilder, created if not given).
+    Returns the builder so callers can keep adding sections to it.
+    """
+    if table is None:
+        table = InsnTableBuilder()
+    if not len(code):
+        return table
+    for address, size, mnemonic, op_str, flags, target in decode_instructions(md, code, base_addr):
+        table.append(address, mnemonic, op_str, size, flags, target)
+    return table
+
+# ------------------------------------------------------------------------------
+# Parallel Chunked Linear Sweep (--jobs N)
+# ------------------------------------------------------------------------------
+# Chunks smaller than this are merged with their neighbour; larger ones are
+# split into fixed-size windows.
+SWEEP_MIN_CHUNK = 64 * 1024
+SWEEP_MAX_CHUNK = 1024 * 1024
 
-    for func_addr, func in cfg.kb.functions.items():
-        log_message(f"[ANGR] Function {func.name} at 0x{func_addr:x}")
+# Below this much code the pool start-up and chunk merging cost more than
+# the workers save (libc's 1.3 MiB sweep: 1.3 s serial, 1.9 s with 4 jobs),
+# so --jobs leaves the sweep serial.
+SWEEP_MIN_PARALLEL_BYTES = 4 * SWEEP_MAX_CHUNK
 
-        # ✅ Create a new graph for this function
-        func_graph = nx.DiGraph()
+# Longest instruction on any supported arch (x86: 15 bytes). A chunk's worker
+# gets this many extra bytes so an instruction straddling the chunk end
+# decodes exactly like it does in the serial sweep.
+MAX_INSN_BYTES = 16
 
-        for block in func.blocks:
-            try:
-                irsb = block.vex  # Attempt to lift block to VEX IR
-            except (SimTranslationError, SimEngineError) as e:
-                log_message(f"  [WARN] Could not lift block @ 0x{block.addr:x} ({e}), skipping.")
+# Per-process state set up by _init_sweep_worker()
+_worker_md = None
+_worker_data = None
+
+
+def plan_sweep_chunks(sec_addr, sec_size, split_addrs,
+                      min_chunk=SWEEP_MIN_CHUNK, max_chunk=SWEEP_MAX_CHUNK):
+    """
+    Split [sec_addr, sec_addr + sec_size) into [(start, end)] chunks, cut at
+    the given (function) addresses where possible and at fixed windows of
+    'max_chunk' bytes otherwise.
+    """
+    sec_end = sec_addr + sec_size
+    cuts = [sec_addr]
+    for addr in sorted(set(split_addrs)):
+        if addr - cuts[-1] >= min_chunk and sec_end - addr >= min_chunk:
+            cuts.append(addr)
+    cuts.append(sec_end)
+
+    chunks = []
+    for start, end in zip(cuts, cuts[1:]):
+        while end - start > max_chunk:
+            chunks.append((start, start + max_chunk))
+            start += max_chunk
+        chunks.append((start, end))
+    return chunks
+
+
+def _init_sweep_worker(elf_path, cs_arch, cs_mode, detail=False):
+    """Process-pool initializer: one Capstone handle and one mmap per worker."""
+    global _worker_md, _worker_data
+    _worker_md = Cs(cs_arch, cs_mode)
+    _worker_md.detail = detail
+    with open(elf_path, "rb") as f:
+        _worker_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
+def _sweep_chunk(task):
+    """
+    Worker: decode one chunk, keeping instructions that start before the
+    chunk end. Returns (addrs, mnemonics, op_strs, sizes, flags, targets,
+    stop_addr) where 'stop_addr' is where Capstone hit an undecodable
+    instruction inside the chunk, or None if it got to the end.
+    """
+    file_offset, sec_addr, sec_size, start, end = task
+    sec_end = sec_addr + sec_size
+    stop = min(end + MAX_INSN_BYTES, sec_end)
+    code = memoryview(_worker_data)[file_offset + (start - sec_addr):
+                                    file_offset + (stop - sec_addr)]
+    addrs, mnemonics, op_strs, sizes, flags, targets = [], [], [], [], [], []
+    pos = start
+    try:
+        for (address, size, mnemonic, op_str,
+             insn_flags, target) in decode_instructions(_worker_md, code, start):
+            if address >= end:
+                break
+            addrs.append(address)
+            sizes.append(size)
+            mnemonics.append(mnemonic)
+            op_strs.append(op_str)
+            flags.append(insn_flags)
+            targets.append(target)
+            pos = address + size
+    finally:
+        code.release()
+    stop_addr = pos if pos < end else None
+    return addrs, mnemonics, op_strs, sizes, flags, targets, stop_addr
+
+
+def _merge_sweep_chunks(md, data, sec_addr, chunks, results, table):
+    """
+    Stitch per-chunk results into 'table' so that the output is exactly what
+    a serial sweep of the section would produce.
+
+    The serial stream position 'pos' is carried from chunk to chunk. When it
+    lands on an instruction the next chunk also decoded, that chunk is
+    reused from there; otherwise (a window started mid-instruction) the
+    section is re-decoded serially from 'pos' until it re-synchronises with
+    the chunk's instruction stream or passes the chunk end.
+    Returns the number of instructions appended.
+    """
+    pos = sec_addr
+    count = 0
+    for (start, end), chunk in zip(chunks, results):
+        addrs, mnemonics, op_strs, sizes, flags, targets, stop_addr = chunk
+        if pos >= end:
+            continue
+        resume = bisect_left(addrs, pos)
+        if resume == len(addrs) or addrs[resume] != pos:
+            # Out of sync: decode from 'pos' until we meet the chunk's stream
+            known = set(addrs)
+            code = data[pos - sec_addr:min(end + MAX_INSN_BYTES, sec_addr + len(data)) - sec_addr]
+            resync_pos = pos
+            for (address, size, mnemonic, op_str,
+                 insn_flags, target) in decode_instructions(md, code, pos):
+                if address >= end or address in known:
+                    break
+                table.append(address, mnemonic, op_str, size, insn_flags, target)
+                count += 1
+                resync_pos = address + size
+            pos = resync_pos
+            if pos >= end:
+                continue
+            resume = bisect_left(addrs, pos)
+            if resume == len(addrs) or addrs[resume] != pos:
+                # Capstone stopped on an invalid instruction: so does the serial sweep
+                return count
+
+        for i in range(resume, len(addrs)):
+            table.append(addrs[i], mnemonics[i], op_strs[i], sizes[i], flags[i], targets[i])
+        count += len(addrs) - resume
+        if stop_addr is not None:
+            return count
+        pos = addrs[-1] + sizes[-1] if addrs else pos
+    return count
+
+
+def parallel_sweep_disassemble(elf_path, elffile, mapped, md, cs_arch, cs_mode,
+                               symbol_map, jobs, table=None,
+                               min_chunk=SWEEP_MIN_CHUNK, max_chunk=SWEEP_MAX_CHUNK):
+    """
+    Linear sweep of every executable section using a pool of 'jobs' worker
+    processes. Sections are cut into chunks at function symbols (falling
+    back to fixed windows), each worker decodes chunks with its own Capstone
+    handle straight from its own mmap of the ELF, and the results are merged
+    in address order. The result is identical to linear_sweep_disassemble()
+    over the same sections.
+
+    Returns the InsnTableBuilder holding the instructions.
+    """
+    if table is None:
+        table = InsnTableBuilder()
+    func_addrs = [addr for addr, (_name, is_func) in symbol_map.items() if is_func]
+
+    sections = []
+    for section in elffile.iter_sections():
+        if section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR:
+            sections.append(section)
+
+    flush_log()  # don't let forked workers inherit unflushed log buffers
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_sweep_worker,
+                             initargs=(elf_path, cs_arch, cs_mode, md.detail)) as pool:
+        for section in sections:
+            name, sec_addr, sec_size = section.name, section['sh_addr'], section['sh_size']
+            log_message(f"  >> Section '{name}' at 0x{sec_addr:X}, size={sec_size}")
+            data = section_bytes(section, mapped)
+            if (section['sh_type'] == 'SHT_NOBITS'
+                    or section['sh_flags'] & SH_FLAGS.SHF_COMPRESSED
+                    or sec_size <= min_chunk):
+                linear_sweep_disassemble(md, data, sec_addr, table)
                 continue
 
-            log_message(f"  -- BasicBlock @ 0x{block.addr:x}, IR statements:")
-            for i, stmt in enumerate(irsb.statements):
-                log_message(f"    Stmt[{i}]: {stmt}")
+            in_section = [addr for addr in func_addrs if sec_addr < addr < sec_addr + sec_size]
+            chunks = plan_sweep_chunks(sec_addr, sec_size, in_section, min_chunk, max_chunk)
+            tasks = [(section['sh_offset'], sec_addr, sec_size, start, end)
+                     for (start, end) in chunks]
+            results = pool.map(_sweep_chunk, tasks)
+            _merge_sweep_chunks(md, data, sec_addr, chunks, results, table)
+    return table
 
-            # ✅ Add node for the block 
-            func_graph.add_node(block.addr, instructions=len(irsb.statements))
+# ------------------------------------------------------------------------------
+# Recursive-Descent Disassembly (--disasm-mode recursive)
+# ------------------------------------------------------------------------------
+# Instructions decoded per Capstone call while following one path; the path
+# usually ends (ret/jmp) well before that.
+RD_BATCH = 32
 
-            # ✅ Add edges for control flow
-            for successor in cfg.get_successors(block.addr, excluding_fakeret=True):
-                func_graph.add_edge(block.addr, successor.addr)
 
-        # ✅ Save function CFG as a .dot file **after processing all blocks**
-        dot_file_path = f"cfg_{func.name}.dot"
-        nx_pydot.write_dot(func_graph, dot_file_path)
-        log_message(f"[INFO] CFG saved for {func.name} as {dot_file_path}")
+def recursive_descent_disassemble(md, exec_sections, seeds, table=None, sweep_gaps=True):
+    """
+    Decode only code reachable from 'seeds' (entry point + function symbols)
+    by following fall-through and resolved branch/call targets with a
+    worklist. Bytes that were never reached are then linear-swept gap by gap
+    when 'sweep_gaps' is set (each gap decoded on its own, so nothing
+    overlaps reached code).
+
+    Returns (InsnTableBuilder, reached_bytes, total_bytes) where the byte
+    counts measure how much of the executable sections was reached.
+    """
+    if table is None:
+        table = InsnTableBuilder()
+    sections = sorted((base_addr, base_addr + size, data)
+                      for (_name, data, base_addr, size) in exec_sections)
+    section_starts = [start for (start, _end, _data) in sections]
+
+    def section_of(addr):
+        idx = bisect_right(section_starts, addr) - 1
+        if idx >= 0 and addr < sections[idx][1]:
+            return sections[idx]
+        return None
+
+    decoded = {}
+    worklist = [addr for addr in seeds if section_of(addr) is not None]
+    while worklist:
+        pos = worklist.pop()
+        if pos in decoded:
+            continue
+        sec = section_of(pos)
+        if sec is None:
+            continue
+        sec_start, sec_end, data = sec
+        running = True
+        while running and pos < sec_end:
+            code = data[pos - sec_start:min(pos - sec_start + RD_BATCH * MAX_INSN_BYTES,
+                                            sec_end - sec_start)]
+            count = 0
+            for (address, size, mnemonic, op_str,
+                 flags, target) in decode_instructions(md, code, pos, RD_BATCH):
+                count += 1
+                if address in decoded:
+                    running = False  # joined an already decoded path
+                    break
+                decoded[address] = size
+                table.append(address, mnemonic, op_str, size, flags, target)
+                pos = address + size
+
+                # Jumps and calls with a resolved target inside the code
+                if target > 0 and target not in decoded and section_of(target) is not None:
+                    worklist.append(target)
+                if flags & FLAG_NO_FALLTHROUGH:
+                    running = False
+                    break
+            if count == 0:
+                break  # undecodable bytes end this path
+
+    total = sum(end - start for (start, end, _data) in sections)
+    reached = 0
+    covered_until = {start: start for (start, _end, _data) in sections}
+    gaps = []
+    for addr in sorted(decoded):
+        sec_start, sec_end, _data = section_of(addr)
+        if addr > covered_until[sec_start]:
+            gaps.append((sec_start, covered_until[sec_start], addr))
+        end = min(addr + decoded[addr], sec_end)
+        if end > covered_until[sec_start]:
+            reached += end - max(addr, covered_until[sec_start])
+            covered_until[sec_start] = end
+    for (sec_start, sec_end, _data) in sections:
+        if covered_until[sec_start] < sec_end:
+            gaps.append((sec_start, covered_until[sec_start], sec_end))
+
+    if sweep_gaps:
+        for (sec_start, gap_start, gap_end) in gaps:
+            _start, _end, data = section_of(sec_start)
+            linear_sweep_disassemble(md, data[gap_start - sec_start:gap_end - sec_start],
+                                     gap_start, table)
+    return table, reached, total
 
-    log_message("[ANGR] IR analysis complete.")
+# ------------------------------------------------------------------------------
+# Extracting Printable ASCII Strings from Data Sections
+# ------------------------------------------------------------------------------
+# Bytes counted as printable: everything in string.printable
+# (letters, digits, punctuation and whitespace incl. \t \n \r \x0b \x0c).
+PRINTABLE_BYTE_CLASS = b"[\\t\\n\\r\\x0b\\x0c\\x20-\\x7e]"
+
+
+@lru_cache(maxsize=None)
+def _ascii_string_regex(min_len):
+    return re.compile(PRINTABLE_BYTE_CLASS + b"{%d,}" % min_len)
+
+
+@lru_cache(maxsize=None)
+def _utf16le_string_regex(min_len):
+    return re.compile(b"(?:" + PRINTABLE_BYTE_CLASS + b"\\x00){%d,}" % min_len)
+
+
+def iter_printable_strings(data, base_addr, min_len=4, utf16=False):
+    """
+    Lazily yield (absolute_addr, string) for every run of printable ASCII of
+    length >= min_len in 'data' (bytes, bytearray, memoryview or mmap),
+    in address order.
+
+    With 'utf16', UTF-16LE strings (printable ASCII code units) are found
+    too and merged into the same address-ordered stream.
+    """
+    ascii_matches = ((base_addr + m.start(), m.group().decode("ascii"))
+                     for m in _ascii_string_regex(min_len).finditer(data))
+    if not utf16:
+        yield from ascii_matches
+        return
+
+    utf16_matches = ((base_addr + m.start(), m.group().decode("utf-16-le"))
+                     for m in _utf16le_string_regex(min_len).finditer(data))
+    yield from heapq.merge(ascii_matches, utf16_matches, key=lambda item: item[0])
+
+
+def extract_printable_strings(data, base_addr, min_len=4, utf16=False, max_results=None):
+    """
+    Scan 'data' for runs of printable ASCII (length >= min_len).
+    Returns list of (absolute_addr, string), at most 'max_results' of them.
+    See iter_printable_strings() to stream results instead.
+    """
+    return list(islice(iter_printable_strings(data, base_addr, min_len, utf16), max_results))
+
+##### ANGR INTEGRATION #####
+ANGR_MODES = ("fast", "emulated")
+
+# Per-function DOT files from analyze_vex_ir_with_angr()
+ANGR_DOT_DIR = "firmware/angr_cfg"
+
+# angr CFG snapshots: an AnalysisCache in this subdirectory of --cache-dir
+ANGR_SNAPSHOT_SUBDIR = "angr"
+
+# Per-process angr project set up by _init_angr_worker()
+_angr_project = None
+
+
+@lru_cache(maxsize=None)
+def load_angr():
+    """
+    Import angr on first use. It takes seconds to import, so it is kept out
+    of the module imports and only paid for by --angr runs.
+    """
+    import angr
+    return angr
+
+
+def _init_angr_worker(binary_path):
+    """Process-pool initializer: each worker loads its own angr project."""
+    global _angr_project
+    _angr_project = load_angr().Project(binary_path, auto_load_libs=False)
+
+
+def lift_blocks(proj, blocks, dump_stmts=False):
+    """
+    Lift [(addr, size)] blocks to VEX IR. Returns one (addr, n_stmts,
+    statements, error) tuple per block; 'statements' (their text) is only
+    filled in with 'dump_stmts', and 'n_stmts' is None if lifting failed.
+    """
+    from angr.errors import SimTranslationError, SimEngineError
+
+    results = []
+    for addr, size in blocks:
+        try:
+            irsb = proj.factory.block(addr, size).vex
+        except (SimTranslationError, SimEngineError) as e:
+            results.append((addr, None, None, str(e)))
+            continue
+        stmts = [str(stmt) for stmt in irsb.statements] if dump_stmts else None
+        results.append((addr, len(irsb.statements), stmts, None))
+    return results
+
+
+def _lift_task(task):
+    """Worker: lift the blocks of one function."""
+    blocks, dump_stmts = task
+    return lift_blocks(_angr_project, blocks, dump_stmts)
+
+
+def recover_angr_functions(cfg):
+    """
+    Pull what the rest of the analysis needs out of an angr CFG: returns
+    (functions, successors) where 'functions' is [(addr, name, [(block_addr,
+    block_size)])] and 'successors' maps a block address to the list of its
+    successor block addresses (fake returns excluded).
+    """
+    # Successors of every block in one pass over the CFG
+    successors = {}
+    for src, dst, data in cfg.graph.edges(data=True):
+        if data.get("jumpkind") != "Ijk_FakeRet":
+            succs = successors.setdefault(src.addr, [])
+            if dst.addr not in succs:
+                succs.append(dst.addr)
+
+    # SimProcedures (imports, unresolvable targets) have no code to lift
+    functions = [(func_addr, func.name,
+                  sorted((node.addr, node.size) for node in func.graph.nodes() if node.size))
+                 for func_addr, func in cfg.kb.functions.items()
+                 if not func.is_simprocedure]
+    return functions, successors
+
+
+def angr_snapshot_key(binary_hash, mode):
+    """Snapshot cache key: the binary, the angr release and the CFG mode."""
+    return cache_key(binary_hash, {"angr_snapshot": load_angr().__version__, "mode": mode})
+
+
+def pack_angr_snapshot(functions, successors, mode):
+    """Turn recover_angr_functions() output into (meta, arrays) for AnalysisCache."""
+    block_offsets = [0]
+    for _addr, _name, blocks in functions:
+        block_offsets.append(block_offsets[-1] + len(blocks))
+    blocks = [block for (_addr, _name, func_blocks) in functions for block in func_blocks]
+    edges = [(src, dst) for src, succs in successors.items() for dst in succs]
+    meta = {"angr_version": load_angr().__version__, "mode": mode,
+            "names": [name for (_addr, name, _blocks) in functions]}
+    arrays = {
+        "functions": {"addrs": np.array([addr for (addr, _n, _b) in functions], dtype=np.uint64),
+                      "block_offsets": np.array(block_offsets, dtype=np.int64)},
+        "blocks": {"addrs": np.array([addr for (addr, _size) in blocks], dtype=np.uint64),
+                   "sizes": np.array([size for (_addr, size) in blocks], dtype=np.uint64)},
+        "edges": np.array(edges, dtype=np.uint64).reshape(-1, 2),
+    }
+    arrays["edges"] = {"src": arrays["edges"][:, 0], "dst": arrays["edges"][:, 1]}
+    return meta, arrays
+
+
+def unpack_angr_snapshot(meta, arrays):
+    """Inverse of pack_angr_snapshot(): returns (functions, successors)."""
+    func_addrs = arrays["functions"]["addrs"].tolist()
+    offsets = arrays["functions"]["block_offsets"].tolist()
+    blocks = list(zip(arrays["blocks"]["addrs"].tolist(), arrays["blocks"]["sizes"].tolist()))
+    functions = [(addr, name, blocks[offsets[i]:offsets[i + 1]])
+                 for i, (addr, name) in enumerate(zip(func_addrs, meta["names"]))]
+    successors = {}
+    for src, dst in zip(arrays["edges"]["src"].tolist(), arrays["edges"]["dst"].tolist()):
+        successors.setdefault(src, []).append(dst)
+    return functions, successors
+
+
+def analyze_vex_ir_with_angr(binary_path, mode="fast", jobs=1, dump_stmts=False,
+                             dot_dir=ANGR_DOT_DIR, snapshot_cache=None, binary_hash=None):
+    """
+    Recover functions with angr (CFGFast, or CFGEmulated with
+    mode="emulated"), lift every block to VEX IR and write one DOT file per
+    function into 'dot_dir'. With jobs > 1 the blocks are lifted function by
+    function in a pool of worker processes. VEX statements are only logged
+    with 'dump_stmts'.
+
+    With 'snapshot_cache' (an AnalysisCache), the recovered functions,
+    block boundaries and CFG edges are stored under the binary's hash
+    ('binary_hash', computed if not given) and the angr version, and later
+    runs load them instead of rebuilding the CFG.
+
+    Returns a list of per-function records ({"name", "addr", "nodes":
+    [[addr, n_stmts]], "edges": [[src, dst]]}) that write_angr_function_dot()
+    can replay, e.g. from the analysis cache.
+    """
+    angr = load_angr()
+    proj = None  # only built when this process needs it: a CFG to recover or blocks to lift
+
+    recovered = snapshot_key = None
+    if snapshot_cache is not None:
+        snapshot_key = angr_snapshot_key(binary_hash or sha256_of(binary_path), mode)
+        loaded = snapshot_cache.load(snapshot_key)
+        if loaded is not None:
+            recovered = unpack_angr_snapshot(*loaded)
+            log_message(f"[ANGR] Using CFG snapshot {snapshot_key[:16]} "
+                        f"(angr {angr.__version__}).", LOG_SUMMARY)
+
+    if recovered is None:
+        log_message("[ANGR] Loading binary with angr for IR analysis...")
+        proj = angr.Project(binary_path, auto_load_libs=False)
+        if mode == "emulated":
+            log_message("[ANGR] Building CFGEmulated...")
+            cfg = proj.analyses.CFGEmulated()
+        else:
+            log_message("[ANGR] Building CFGFast...")
+            cfg = proj.analyses.CFGFast()
+        recovered = recover_angr_functions(cfg)
+        if snapshot_cache is not None:
+            snapshot_cache.store(snapshot_key, *pack_angr_snapshot(*recovered, mode))
+    funcs, successors = recovered
+
+    tasks = [(blocks, dump_stmts) for (_addr, _name, blocks) in funcs]
+    if jobs > 1 and len(tasks) > 1:
+        log_message(f"[ANGR] Lifting {len(tasks)} functions with {jobs} workers...")
+        flush_log()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_angr_worker,
+                                 initargs=(binary_path,)) as pool:
+            lifted = list(pool.map(_lift_task, tasks,
+                                   chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        if proj is None and tasks:
+            log_message("[ANGR] Loading binary with angr for lifting...")
+            proj = angr.Project(binary_path, auto_load_libs=False)
+        lifted = [lift_blocks(proj, blocks, dump) for blocks, dump in tasks]
+
+    functions = []
+    for (func_addr, func_name, _blocks), func_blocks in zip(funcs, lifted):
+        log_message(f"[ANGR] Function {func_name} at 0x{func_addr:x}")
+        func_graph = nx.DiGraph()
+        for addr, n_stmts, stmts, error in func_blocks:
+            if n_stmts is None:
+                log_message(f"  [WARN] Could not lift block @ 0x{addr:x} ({error}), skipping.", LOG_SUMMARY)
+                continue
+            if stmts is not None:
+                log_message(f"  -- BasicBlock @ 0x{addr:x}, IR statements:", LOG_DETAIL)
+                for i, stmt in enumerate(stmts):
+                    log_message(f"    Stmt[{i}]: {stmt}", LOG_DETAIL)
+            func_graph.add_node(addr, instructions=n_stmts)
+            for succ in successors.get(addr, ()):
+                func_graph.add_edge(addr, succ)
+
+        record = {
+            "name": func_name,
+            "addr": func_addr,
+            "nodes": [[addr, data.get("instructions")] for addr, data in func_graph.nodes(data=True)],
+            "edges": [list(edge) for edge in func_graph.edges()],
+        }
+        write_angr_function_dot(record, func_graph, dot_dir)
+        functions.append(record)
+
+    log_message(f"[ANGR] IR analysis complete: {len(functions)} functions, "
+                f"DOT files in {dot_dir}.", LOG_SUMMARY)
+    return functions
+
+
+def write_angr_function_dot(record, func_graph=None, dot_dir=ANGR_DOT_DIR):
+    """
+    Write the DOT file for one function record from analyze_vex_ir_with_angr()
+    into 'dot_dir', rebuilding its graph from the record if 'func_graph'
+    isn't given.
+    """
+    if func_graph is None:
+        func_graph = nx.DiGraph()
+        for addr, n_stmts in record["nodes"]:
+            if n_stmts is None:
+                func_graph.add_node(addr)
+            else:
+                func_graph.add_node(addr, instructions=n_stmts)
+        func_graph.add_edges_from(tuple(edge) for edge in record["edges"])
+
+    os.makedirs(dot_dir, exist_ok=True)
+    # Symbol names may contain path separators or C++ punctuation
+    safe_name = re.sub(r"[^\w.-]", "_", record["name"])
+    dot_file_path = os.path.join(dot_dir, f"cfg_{safe_name}.dot")
+    write_dot(dot_file_path, func_graph.nodes(data=True), func_graph.edges())
+    log_message(f"[INFO] CFG saved for {record['name']} as {dot_file_path}")
 ############################
 # ------------------------------------------------------------------------------
 # Basic CFG Builder
 # ------------------------------------------------------------------------------
-def build_cfg(insn_map):
+# How many instructions of a basic block to show in its DOT label
+DOT_BLOCK_LABEL_INSNS = 8
+
+
+def insn_successor_indices(table):
+    """
+    Return (fallthrough, branch) row-index arrays for every instruction in
+    'table', -1 meaning "no such edge". A branch to the fall-through address
+    is only reported once, as the fall-through.
     """
-    Build a minimal control flow graph from {addr: (mnemonic, op_str, size)}.
-    We'll produce a single DOT file 'firmware/cfg.dot'.
+    fallthrough = table.fallthrough_indices()
+    branch = table.branch_indices()
+    branch[branch == fallthrough] = -1
+    return fallthrough, branch
 
-    Approach:
-      - One node per instruction
-      - If insn is *not* ret/jmp, add an edge to next insn (addr + size)
-      - If insn is jmp/call/b/bl, parse immediate operand as hex => if found in insn_map, add edge
+
+def build_insn_graph(table):
+    """
+    Debug mode: one networkx node per instruction.
     """
-    log_message("[INFO] Building a basic control-flow graph (CFG)...")
+    cfg_graph = nx.DiGraph()
+    fallthrough, branch = insn_successor_indices(table)
+    rows = np.arange(len(table))
+    addrs = table.addrs
+    for succ in (fallthrough, branch):
+        has_edge = succ >= 0
+        cfg_graph.add_edges_from(zip(addrs[rows[has_edge]].tolist(),
+                                     addrs[succ[has_edge]].tolist()))
+    return cfg_graph
+
+
+def build_basic_blocks(table, split_unresolved=False):
+    """
+    Group the instructions of an InsnTable into basic blocks with a
+    leader-based pass.
+
+    A leader is the first instruction, any branch target, and any
+    instruction that follows one which does anything but plain fall-through
+    (a branch, a terminator, or a gap in the decoded code). Branches whose
+    target isn't in 'table' only end a block with 'split_unresolved' (used
+    when 'table' is one window of a larger image).
+
+    Returns {start_addr: {"start", "end", "insn_count", "first", "successors"}},
+    where 'end' is the exclusive end address, 'first' is the row of the
+    block's first instruction in 'table', and 'successors' lists the start
+    addresses of successor blocks.
+    """
+    n = len(table)
+    if n == 0:
+        return {}
+    rows = np.arange(n)
+    fallthrough, branch = insn_successor_indices(table)
+
+    # An instruction ends its block unless it simply falls through to the
+    # next row.
+    ends_block = (branch >= 0) | (fallthrough != rows + 1)
+    if split_unresolved:
+        ends_block |= ((table.flags & FLAG_BRANCH) != 0) & (table.targets > 0)
+    leaders = np.zeros(n, dtype=bool)
+    leaders[0] = True
+    leaders[1:] |= ends_block[:-1]
+    leaders[branch[branch >= 0]] = True
+    leaders[fallthrough[(fallthrough >= 0) & (fallthrough != rows + 1)]] = True
+
+    starts = np.flatnonzero(leaders)
+    lasts = np.append(starts[1:] - 1, n - 1)
+    start_addrs = table.addrs[starts].tolist()
+    end_addrs = (table.addrs[lasts] + table.sizes[lasts].astype(np.uint64)).tolist()
+    counts = (lasts - starts + 1).tolist()
+    last_ft = fallthrough[lasts].tolist()
+    last_br = branch[lasts].tolist()
+    addrs = table.addrs
+
+    blocks = {}
+    for i, start in enumerate(start_addrs):
+        successors = [int(addrs[succ]) for succ in (last_ft[i], last_br[i]) if succ >= 0]
+        blocks[start] = {"start": start, "end": end_addrs[i],
+                         "insn_count": counts[i], "first": int(starts[i]),
+                         "successors": successors}
+    return blocks
+
+
+def build_block_graph(blocks):
+    """
+    Build a networkx DiGraph with one node per basic block (keyed by start
+    address) and its start/end/insn_count as node attributes.
+    """
+    cfg_graph = nx.DiGraph()
+    for start, block in blocks.items():
+        cfg_graph.add_node(start, start=block["start"], end=block["end"],
+                           insn_count=block["insn_count"])
+    for start, block in blocks.items():
+        for succ in block["successors"]:
+            cfg_graph.add_edge(start, succ)
+    return cfg_graph
 
-    # We'll gather edges in the form: (src_addr, dst_addr).
-    # Then we'll output a single .dot file for everything.
-    edges = []
-    # Sort addresses so we can handle "fall-through"
-    sorted_addrs = sorted(insn_map.keys())
 
-    # Allowed "branch" mnemonics that might have an immediate
-    branch_mnemonics = {"jmp", "call", "b", "bl"}
+GRAPH_FORMATS = ("dot", "npz", "graphml")
 
-    # Instructions that typically end a function or block
-    # so we won't add a fall-through edge
-    end_block = {"ret", "jmp", "bra"}
+GRAPH_WRITE_BUFFER = 1024 * 1024
 
-    for i, addr in enumerate(sorted_addrs):
-        (mnemonic, op_str, size) = insn_map[addr]
 
-        # 1) Fall-through edge unless it's an end-block instruction
-        if mnemonic.lower() not in end_block:
-            next_addr = addr + size
-            if next_addr in insn_map:
-                edges.append((addr, next_addr))
+def dot_escape(text):
+    """Escape free text (e.g. an instruction) for use inside a DOT label."""
+    return text.replace("\\", "\\\\").replace("\"", "\\\"")
 
-        # 2) If it's a direct branch or call with an immediate operand, parse it
-        if mnemonic.lower() in branch_mnemonics:
-            target = parse_immediate(op_str)
-            if target and target in insn_map:
-                edges.append((addr, target))
 
-    # Now output the .dot
-    dot_path = "firmware/cfg.dot"
-    log_message(f"[INFO] Writing CFG to {dot_path} ...")
+def _graph_node_id(node):
+    return f"{node:#x}" if isinstance(node, int) else str(node)
 
-    with open(dot_path, "w") as f:
-        f.write("digraph RDA_CFG {\n")
-        f.write("  rankdir=LR;\n")  # Lay out left to right
-        # Create a node for each instruction
-        for addr in sorted_addrs:
-            (mnemonic, op_str, _) = insn_map[addr]
-            label = f"{mnemonic} {op_str}"
-            # Escape quotes
-            label = label.replace("\"", "\\\"")
-            f.write(f"  \"{addr:#x}\" [label=\"0x{addr:08X}: {label}\"];\n")
 
-        # Create edges
-        for (src, dst) in edges:
-            f.write(f"  \"{src:#x}\" -> \"{dst:#x}\";\n")
+def write_dot(path, nodes, edges, name="G", graph_attrs=()):
+    """
+    Stream a DOT digraph to 'path' without building it in memory first.
+    'nodes' yields (node, {attr: value}), 'edges' yields (src, dst); integer
+    nodes are written as hex ids. String attribute values are written as
+    DOT escStrings, so callers escape free text with dot_escape() and may
+    use "\\l" line breaks.
+    """
+    def lines():
+        yield f"digraph {name} {{\n"
+        for attr in graph_attrs:
+            yield f"  {attr};\n"
+        for node, attrs in nodes:
+            fields = ", ".join(f"{key}=\"{value}\"" if isinstance(value, str) else f"{key}={value}"
+                               for key, value in attrs.items())
+            yield (f"  \"{_graph_node_id(node)}\" [{fields}];\n" if fields
+                   else f"  \"{_graph_node_id(node)}\";\n")
+        for src, dst in edges:
+            yield f"  \"{_graph_node_id(src)}\" -> \"{_graph_node_id(dst)}\";\n"
+        yield "}\n"
+
+    with open(path, "w", buffering=GRAPH_WRITE_BUFFER) as f:
+        f.writelines(lines())
+
+
+def write_graphml(path, nodes, edges, node_keys=()):
+    """
+    Stream a GraphML document to 'path'. 'nodes'/'edges' are as for
+    write_dot(); 'node_keys' lists the integer node attributes to declare.
+    """
+    def lines():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        for key in node_keys:
+            yield f'  <key id="{key}" for="node" attr.name="{key}" attr.type="long"/>\n'
+        yield '  <graph edgedefault="directed">\n'
+        for node, attrs in nodes:
+            node_id = _graph_node_id(node)
+            if not attrs:
+                yield f'    <node id="{node_id}"/>\n'
+                continue
+            yield f'    <node id="{node_id}">'
+            yield "".join(f'<data key="{key}">{value}</data>' for key, value in attrs.items())
+            yield "</node>\n"
+        for src, dst in edges:
+            yield f'    <edge source="{_graph_node_id(src)}" target="{_graph_node_id(dst)}"/>\n'
+        yield "  </graph>\n</graphml>\n"
+
+    with open(path, "w", buffering=GRAPH_WRITE_BUFFER) as f:
+        f.writelines(lines())
+
+
+def cfg_block_label(table, block):
+    """DOT label for a basic block: its first few instructions, left-aligned."""
+    first = block["first"]
+    shown = min(block["insn_count"], DOT_BLOCK_LABEL_INSNS)
+    lines = []
+    for idx in range(first, first + shown):
+        insn_addr, mnemonic, op_str, _ = table.row(idx)
+        lines.append(dot_escape(f"0x{insn_addr:08X}: {mnemonic} {op_str}"))
+    if block["insn_count"] > DOT_BLOCK_LABEL_INSNS:
+        lines.append(f"... ({block['insn_count']} insns)")
+    return "\\l".join(lines) + "\\l"
+
+
+def write_cfg_dot(cfg_graph, table, dot_path, blocks=None):
+    """
+    Write 'cfg_graph' as a single DOT file, streamed node by node. With
+    'blocks', nodes are basic blocks labelled with their first few
+    instructions; otherwise nodes are single instructions.
+    """
+    def nodes():
+        for addr in sorted(cfg_graph.nodes()):
+            if blocks is not None:
+                label = cfg_block_label(table, blocks[addr])
+            else:
+                (mnemonic, op_str, _) = table[addr]
+                label = dot_escape(f"0x{addr:08X}: {mnemonic} {op_str}")
+            yield addr, {"label": label}
+
+    write_dot(dot_path, nodes(), cfg_graph.edges(), name="RDA_CFG",
+              graph_attrs=("rankdir=LR", "node [shape=box]"))
+
+
+def write_cfg_npz(cfg_graph, npz_path, blocks=None):
+    """
+    Write the CFG as NumPy arrays: 'nodes' (addresses), 'edges' (N x 2
+    address pairs) and, for basic blocks, 'end', 'insn_count' and 'first'
+    aligned with 'nodes'. Same layout as the "cfg"/"blocks" cache groups.
+    """
+    nodes = np.array(sorted(cfg_graph.nodes()), dtype=np.uint64)
+    arrays = {
+        "nodes": nodes,
+        "edges": np.array(list(cfg_graph.edges()), dtype=np.uint64).reshape(-1, 2),
+    }
+    if blocks is not None:
+        for field in ("end", "insn_count", "first"):
+            arrays[field] = np.array([blocks[start][field] for start in nodes.tolist()],
+                                     dtype=np.uint64)
+    np.savez_compressed(npz_path, **arrays)
+
+
+def write_cfg_graphml(cfg_graph, graphml_path, blocks=None):
+    """Write the CFG as GraphML, with block end/insn_count node attributes."""
+    keys = ("end", "insn_count") if blocks is not None else ()
+
+    def nodes():
+        for addr in sorted(cfg_graph.nodes()):
+            yield addr, {key: blocks[addr][key] for key in keys}
+
+    write_graphml(graphml_path, nodes(), cfg_graph.edges(), node_keys=keys)
 
-        f.write("}\n")
 
-    log_message("[INFO] CFG DOT file created. Convert to PNG with:\n"
-                "       dot -Tpng firmware/cfg.dot -o cfg.png")
+CFG_WRITERS = {"npz": write_cfg_npz, "graphml": write_cfg_graphml}
 
 
-def parse_immediate(operand_str):
+def build_cfg(table, graph_path="firmware/cfg.dot", insn_level=False, graph_format="dot"):
     """
-    Very naive parse of an operand like "0x401050".
-    Returns an int or None if we can't parse.
+    Build a control flow graph from an InsnTable and write it to a single
+    file in 'graph_format' (see save_cfg); with graph_path=None nothing is
+    written.
+
+    By default nodes are basic blocks (see build_basic_blocks). With
+    'insn_level' there is one node per instruction, which is only useful for
+    debugging small binaries.
+
+    Returns (cfg_graph, blocks); 'blocks' is None in instruction-level mode.
     """
-    op = operand_str.strip()
-    # If there's whitespace or commas, take the first token
-    # e.g. "0x400080, #0x3" => "0x400080"
-    token = op.split(',')[0].strip()
-    # ARM might have '#' prefix => "#0x400080"
-    token = token.lstrip('#')
-    if token.startswith("0x"):
-        try:
-            return int(token, 16)
-        except ValueError:
-            return None
-    return None
+    if insn_level:
+        log_message("[INFO] Building an instruction-level control-flow graph (CFG)...")
+        blocks = None
+        cfg_graph = build_insn_graph(table)
+    else:
+        log_message("[INFO] Building a basic-block control-flow graph (CFG)...")
+        blocks = build_basic_blocks(table)
+        cfg_graph = build_block_graph(blocks)
+        log_message(f"[INFO] {len(table)} instructions grouped into "
+                    f"{len(blocks)} basic blocks.", LOG_SUMMARY)
+
+    if graph_path is not None:
+        save_cfg(cfg_graph, table, graph_path, blocks, graph_format)
+    return cfg_graph, blocks
+
+
+def save_cfg(cfg_graph, table, graph_path, blocks=None, graph_format="dot"):
+    """
+    Write the CFG to 'graph_path' as DOT (rendered with Graphviz), a NumPy
+    .npz edge list or GraphML.
+    """
+    log_message(f"[INFO] Writing CFG to {graph_path} ...")
+    os.makedirs(os.path.dirname(graph_path) or ".", exist_ok=True)
+    if graph_format == "dot":
+        write_cfg_dot(cfg_graph, table, graph_path, blocks)
+    else:
+        CFG_WRITERS[graph_format](cfg_graph, graph_path, blocks)
+    log_message(f"[INFO] CFG saved as {graph_path}")
+    if graph_format == "dot":
+        log_message("[INFO] Convert to PNG with:\n"
+                    f"       dot -Tpng {graph_path} -o cfg.png")
 
 
 def detect_infinite_loops_in_cfg(cfg_graph):
     """
-    Detect infinite loops by checking cycles that have no exit conditions.
+    Detect infinite loops as *closed* strongly connected components: SCCs that
+    contain a cycle and have no edge leaving them. Once control enters such a
+    component it can never get out, which is exactly the "cycle without an
+    exit path" condition, but found in O(V+E) instead of enumerating every
+    simple cycle (exponential on real firmware).
+
+    Returns a list of loops, each a sorted list of node addresses.
     """
     infinite_loops = []
-    for cycle in nx.simple_cycles(cfg_graph):
-        if not cycle_has_exit_path(cfg_graph, cycle):
-            infinite_loops.append(cycle)
+    for scc in nx.attracting_components(cfg_graph):
+        if len(scc) == 1:
+            # A lone sink node is only a loop if it jumps to itself.
+            (node,) = scc
+            if not cfg_graph.has_edge(node, node):
+                continue
+        infinite_loops.append(sorted(scc))
+    infinite_loops.sort(key=lambda loop: loop[0])
     return infinite_loops
 
-def cycle_has_exit_path(cfg_graph, cycle):
+def sample_cycles_in_loop(cfg_graph, loop, limit=3):
     """
-    Check if the cycle has any outgoing edges to nodes not in the cycle.
+    Return up to 'limit' representative simple cycles inside one closed SCC.
+    Cycle enumeration is restricted to the SCC's subgraph and stops early,
+    so the cost stays bounded even for dense components.
     """
-    for node in cycle:
-        successors = cfg_graph.successors(node)
-        for succ in successors:
-            if succ_outside_cycle(succ, cycle):
-                return True  # Exit exists
-    return False  # No exit; infinite loop detected
+    if limit <= 0:
+        return []
+    subgraph = cfg_graph.subgraph(loop)
+    return list(islice(nx.simple_cycles(subgraph), limit))
 
-def cycle_has_exit_path(cfg, cycle):
-    cycle_set = set(cycle)
-    for node in cycle:
-        for successor in cfg.successors(node):
-            if successor not in cycle_set:
-                return True  # Found an exit node
-    return False  # No exit found; infinite loop
-
-def report_infinite_loops(infinite_loops):
+def report_infinite_loops(infinite_loops, cfg_graph=None, cycles_per_loop=0,
+                          function_index=None, cycles=None):
+    """
+    Log the loops found by detect_infinite_loops_in_cfg(). When 'cfg_graph' is
+    given and 'cycles_per_loop' > 0, also list a few representative cycles
+    for each offending SCC, or take them from 'cycles' ({tuple(loop):
+    cycles}) when they were sampled already. With 'function_index', each
+    loop is tagged with the function containing its first node.
+    """
     if infinite_loops:
-        log_message("[ALERT] Potential infinite loops detected:")
+        log_message("[ALERT] Potential infinite loops detected:", LOG_SUMMARY)
         for idx, loop in enumerate(infinite_loops, start=1):
-            loop_str = " -> ".join(f"0x{addr:x}" for addr in loop)
-            log_message(f"  Loop {idx}: {loop_str}")
+            # An SCC's members, not an execution order; --loop-cycles shows paths
+            loop_str = "{" + ", ".join(f"0x{addr:x}" for addr in loop) + "}"
+            found = function_index.lookup(loop[0]) if function_index is not None else None
+            func_name = found[0] if found else None
+            func_str = f" (in {func_name})" if func_name else ""
+            log_message(f"  Loop {idx}: {loop_str}{func_str}", LOG_SUMMARY, "loop",
+                        loop=idx, nodes=[f"0x{addr:x}" for addr in loop], function=func_name)
+            if cycles_per_loop <= 0:
+                continue
+            if cycles is not None and tuple(loop) in cycles:
+                loop_cycles = cycles[tuple(loop)]
+            elif cfg_graph is not None:
+                loop_cycles = sample_cycles_in_loop(cfg_graph, loop, cycles_per_loop)
+            else:
+                continue
+            for cyc_idx, cycle in enumerate(loop_cycles, start=1):
+                cycle_str = " -> ".join(f"0x{addr:x}" for addr in cycle)
+                log_message(f"    Cycle {idx}.{cyc_idx}: {cycle_str}", LOG_SUMMARY, "loop_cycle",
+                            loop=idx, nodes=[f"0x{addr:x}" for addr in cycle])
+    else:
+        log_message("[INFO] No infinite loops detected.", LOG_SUMMARY)
+
+def report_function_stats(function_index, table, blocks=None):
+    """
+    Log per-function instruction (and basic block) counts at detail level,
+    partitioning the sorted instruction/block addresses with one
+    searchsorted per function boundary.
+    """
+    if not len(function_index):
+        return
+    lo, hi = function_index.partition(table.addrs)
+    insn_counts = (hi - lo).tolist()
+    block_counts = None
+    if blocks is not None:
+        block_lo, block_hi = function_index.partition(np.array(sorted(blocks), dtype=np.uint64))
+        block_counts = (block_hi - block_lo).tolist()
+    for i, (name, start, end) in enumerate(function_index):
+        if not insn_counts[i]:
+            continue
+        block_str = f", {block_counts[i]} blocks" if block_counts is not None else ""
+        log_message(f"  Function {name} [0x{start:x}-0x{end:x}): "
+                    f"{insn_counts[i]} insns{block_str}", LOG_DETAIL, "function",
+                    function=name, start=f"0x{start:x}", end=f"0x{end:x}",
+                    insns=insn_counts[i],
+                    blocks=block_counts[i] if block_counts is not None else None)
+
+
+def log_instruction_listing(table, symbol_map, function_index):
+    """
+    Log every instruction of 'table' (detail level), tagged with its
+    function and offset, or with the symbol at its address if it lies
+    outside every function.
+    """
+    func_hints = function_index.annotate(table.addrs)
+    for (addr, mnemonic, op_str, _size), func_hint in zip(table.rows(), func_hints):
+        sym_name = symbol_map.get(addr, ("", False))[0]
+        if not func_hint and sym_name:
+            func_hint = f"<{sym_name}>"
+        sym_hint = f"{func_hint} " if func_hint else ""
+        line = f"0x{addr:08X}:  {sym_hint}{mnemonic} {op_str}"
+        log_message(line, LOG_DETAIL, "insn", addr=f"0x{addr:x}",
+                    mnemonic=mnemonic, op_str=op_str, symbol=sym_name,
+                    function=func_hint.strip("<>"))
+
+
+def report_strings(string_sections, max_strings=None, keep=True):
+    """
+    Log the printable strings of each data section.
+
+    'string_sections' is [(sec_name, base_addr, size, strings)] where
+    'strings' is any iterable of (addr, string), e.g. a lazy
+    iter_printable_strings() stream. At most 'max_strings' are consumed per
+    section. Returns the same list with every 'strings' materialized, so it
+    can be cached; without 'keep' the strings are only logged and the
+    returned lists are empty.
+    """
+    if not string_sections:
+        return []
+    log_message("\n[INFO] Searching data sections for printable strings:")
+    reported = []
+    total_strings = 0
+    for (sec_name, base_addr, size, strings) in string_sections:
+        log_message(f"\n  >> Section '{sec_name}' @0x{base_addr:X}, size={size} bytes", LOG_DETAIL)
+        found = []
+        count = 0
+        for (addr, s) in islice(strings, max_strings):
+            display_s = s if len(s) < 100 else s[:100] + "..."
+            log_message(f"    0x{addr:08X}:  \"{display_s}\"", LOG_DETAIL, "string",
+                        addr=f"0x{addr:x}", section=sec_name, value=s)
+            count += 1
+            if keep:
+                found.append((addr, s))
+        if not count:
+            log_message("    (No printable strings of length >= 4 found.)", LOG_DETAIL)
+        elif count == max_strings:
+            log_message(f"    (Stopped after {count} strings; raise --max-strings to see more.)", LOG_DETAIL)
+        total_strings += count
+        log_event("strings", section=sec_name, count=count)
+        reported.append((sec_name, base_addr, size, found))
+    log_message(f"\n[INFO] Found {total_strings} printable strings in "
+                f"{len(string_sections)} data sections.", LOG_SUMMARY)
+    return reported
+
+# ------------------------------------------------------------------------------
+# Analysis Cache (see analysis_cache.py)
+# ------------------------------------------------------------------------------
+def analysis_cache_options(args):
+    """The command-line options that change what gets cached."""
+    return {"insn_cfg": args.insn_cfg, "utf16": args.utf16,
+            "max_strings": args.max_strings, "angr": args.angr,
+            "angr_mode": args.angr_mode if args.angr else None,
+            "angr_stmts": args.angr_stmts if args.angr else None,
+            "disasm_mode": args.disasm_mode, "gap_sweep": not args.no_gap_sweep,
+            "detail": args.detail, "loop_budget": args.loop_budget,
+            "loop_max_nodes": args.loop_max_nodes}
+
+
+def pack_analysis(table, cfg_graph, blocks, loops, string_sections, angr_functions):
+    """
+    Turn the results of one run into (meta, arrays) for AnalysisCache.store().
+    """
+    meta = {
+        "mnemonics": table.mnemonics,
+        "operands": table.operands,
+        "insn_level": blocks is None,
+        "loops": loops,
+        "strings": [[name, base, size, [list(item) for item in found]]
+                    for (name, base, size, found) in string_sections],
+        "angr": angr_functions,
+    }
+    nodes = list(cfg_graph.nodes())
+    arrays = {
+        "insns": table.to_arrays(),
+        "cfg": {
+            "nodes": np.array(nodes, dtype=np.uint64),
+            "edges": np.array(list(cfg_graph.edges()), dtype=np.uint64).reshape(-1, 2),
+        },
+    }
+    if blocks is not None:
+        arrays["blocks"] = {
+            field: np.array([blocks[start][field] for start in nodes], dtype=np.uint64)
+            for field in ("start", "end", "insn_count", "first")
+        }
+    return meta, arrays
+
+
+def unpack_analysis(meta, arrays):
+    """
+    Inverse of pack_analysis(). Returns a dict with "insns" (InsnTable),
+    "cfg" (networkx graph), "blocks" (or None), "loops", "strings" and
+    "angr" (or None).
+    """
+    table = InsnTable.from_arrays(arrays["insns"], meta["mnemonics"], meta["operands"])
+    nodes = arrays["cfg"]["nodes"].tolist()
+    edges = arrays["cfg"]["edges"].tolist()
+
+    cfg_graph = nx.DiGraph()
+    blocks = None
+    if meta["insn_level"]:
+        cfg_graph.add_nodes_from(nodes)
+    else:
+        columns = {field: col.tolist() for field, col in arrays["blocks"].items()}
+        blocks = {}
+        for i, start in enumerate(nodes):
+            blocks[start] = {"start": start, "end": columns["end"][i],
+                             "insn_count": columns["insn_count"][i],
+                             "first": columns["first"][i], "successors": []}
+            cfg_graph.add_node(start, start=start, end=columns["end"][i],
+                               insn_count=columns["insn_count"][i])
+        for src, dst in edges:
+            blocks[src]["successors"].append(dst)
+    cfg_graph.add_edges_from(edges)
+
+    return {
+        "insns": table,
+        "cfg": cfg_graph,
+        "blocks": blocks,
+        "loops": meta["loops"],
+        "strings": [(name, base, size, [tuple(item) for item in found])
+                    for (name, base, size, found) in meta["strings"]],
+        "angr": meta["angr"],
+        "loop_results": meta.get("loop_results"),
+    }
+
+# ------------------------------------------------------------------------------
+# Incremental Re-analysis (--baseline)
+# ------------------------------------------------------------------------------
+def function_ranges(exec_sections, symbol_map):
+    """
+    Return [(key, name, start, end)] for every function symbol inside an
+    executable section. A function runs up to the next function symbol or
+    the end of its section. 'key' is the symbol name, suffixed with '#N' if
+    several functions share that name (e.g. static functions).
+    """
+    func_addrs = sorted(addr for addr, (_name, is_func) in symbol_map.items() if is_func)
+    seen = {}
+    ranges = []
+    for (_sec_name, _data, base_addr, size) in exec_sections:
+        sec_end = base_addr + size
+        starts = [addr for addr in func_addrs if base_addr <= addr < sec_end]
+        for start, end in zip(starts, starts[1:] + [sec_end]):
+            name = symbol_map[start][0]
+            seen[name] = seen.get(name, 0) + 1
+            key = name if seen[name] == 1 else f"{name}#{seen[name]}"
+            ranges.append((key, name, start, end))
+    return ranges
+
+
+def hash_functions(exec_sections, ranges):
+    """
+    Return [[key, name, start, end, sha256]] hashing each function's bytes.
+    """
+    hashed = []
+    for (_sec_name, data, base_addr, size) in exec_sections:
+        for (key, name, start, end) in ranges:
+            if base_addr <= start < base_addr + size:
+                digest = sha256_of(data[start - base_addr:end - base_addr])
+                hashed.append([key, name, start, end, digest])
+    return hashed
+
+
+def hash_data_sections(data_sections):
+    """Return {name: [base_addr, size, sha256]} for the string scan inputs."""
+    return {name: [base_addr, size, sha256_of(data)]
+            for (name, data, base_addr, size) in data_sections}
+
+
+def diff_functions(baseline_functions, functions):
+    """
+    Compare function hashes by key. Returns a dict of key lists:
+      "changed"   same name, different bytes
+      "added"     only in the new build
+      "removed"   only in the baseline
+      "moved"     same bytes at a different address (re-decoded, not changed)
+      "reused"    same bytes at the same address
+    """
+    old = {entry[0]: entry for entry in baseline_functions}
+    new = {entry[0]: entry for entry in functions}
+    diff = {"changed": [], "added": [], "removed": [], "moved": [], "reused": []}
+    for key, (_, _, start, end, digest) in new.items():
+        if key not in old:
+            diff["added"].append(key)
+        elif old[key][4] != digest:
+            diff["changed"].append(key)
+        elif (old[key][2], old[key][3]) != (start, end):
+            diff["moved"].append(key)
+        else:
+            diff["reused"].append(key)
+    diff["removed"] = [key for key in old if key not in new]
+    return diff
+
+
+def decode_option_mismatch(baseline_options, options):
+    """
+    Names of the options (from analysis_cache_options()) that decide which
+    instructions get decoded and differ between a baseline and this run;
+    the baseline's rows can only be reused if there are none. The gap sweep
+    only matters in recursive mode. A baseline without recorded options
+    mismatches on everything.
+    """
+    def decode_options(opts):
+        recursive = opts.get("disasm_mode") == "recursive"
+        return {"disasm_mode": opts.get("disasm_mode"), "detail": opts.get("detail"),
+                "gap_sweep": opts.get("gap_sweep") if recursive else None}
+
+    old, new = decode_options(baseline_options or {}), decode_options(options)
+    return [name for name in new if old[name] != new[name]]
+
+
+def report_function_diff(diff, baseline_path):
+    log_message(f"[INFO] Functions compared with baseline {baseline_path}: "
+                f"{len(diff['changed'])} changed, {len(diff['added'])} added, "
+                f"{len(diff['removed'])} removed, {len(diff['moved'])} moved, "
+                f"{len(diff['reused'])} reused functions.", LOG_SUMMARY)
+    for kind in ("changed", "added", "removed"):
+        if diff[kind]:
+            log_message(f"  {kind.capitalize()}: {', '.join(diff[kind])}", LOG_SUMMARY,
+                        "function_diff", kind=kind, functions=diff[kind])
+
+
+def incremental_disassemble(md, exec_sections, functions, reused_keys, baseline_table):
+    """
+    Sweep each executable section region by region: functions listed in
+    'reused_keys' copy their rows from 'baseline_table', everything else
+    (changed/added/moved functions and the gaps between functions) is
+    decoded again. Returns (InsnTableBuilder, dirty) where 'dirty' is the
+    list of (start, end) ranges that were re-decoded.
+    """
+    builder = InsnTableBuilder()
+    dirty = []
+    for (_sec_name, data, base_addr, size) in exec_sections:
+        sec_end = base_addr + size
+        regions = sorted((start, end, key) for (key, _name, start, end, _digest) in functions
+                         if base_addr <= start < sec_end)
+        pos = base_addr
+        for start, end, key in regions + [(sec_end, sec_end, None)]:
+            if pos < start:
+                linear_sweep_disassemble(md, data[pos - base_addr:start - base_addr], pos, builder)
+                dirty.append((pos, start))
+            if start == end:
+                break
+            if key in reused_keys:
+                lo = int(np.searchsorted(baseline_table.addrs, start))
+                hi = int(np.searchsorted(baseline_table.addrs, end))
+                builder.extend_from(baseline_table, lo, hi)
+            else:
+                linear_sweep_disassemble(md, data[start - base_addr:end - base_addr], start, builder)
+                dirty.append((start, end))
+            pos = end
+    return builder, dirty
+
+
+def incremental_infinite_loops(cfg_graph, function_index, baseline_loops, baseline_results,
+                               dirty, jobs=1, cycles_per_loop=0, max_nodes=None, seconds=None):
+    """
+    partitioned_infinite_loops() that only re-analyzes the functions
+    holding code reachable from the re-decoded 'dirty' address ranges,
+    under the same 'max_nodes'/'seconds' budgets.
+
+    Every other function that the baseline analyzed within its budget
+    (per 'baseline_results', the baseline's loop_results) keeps its
+    baseline loops. A kept loop first
+    passes an O(loop size) check that it is still a strongly connected
+    node set with no edge leaving it, which makes it exactly a closed SCC
+    of the new graph. Reachability starts at the dirty nodes plus the block
+    right after each dirty range, in case it used to be entered by
+    fall-through. Same return value as partitioned_infinite_loops().
+    """
+    nodes = sorted(cfg_graph.nodes())
+    seeds = set()
+    for (start, end) in dirty:
+        lo = bisect_left(nodes, start)
+        hi = bisect_left(nodes, end)
+        seeds.update(nodes[lo:min(hi + 1, len(nodes))])
+
+    affected = set()
+    stack = list(seeds)
+    while stack:
+        node = stack.pop()
+        if node in affected:
+            continue
+        affected.add(node)
+        stack.extend(succ for succ in cfg_graph.successors(node) if succ not in affected)
+
+    kept = []
+    for loop in baseline_loops:
+        loop_set = set(loop)
+        if (loop_set & affected or not all(node in cfg_graph for node in loop)
+                or any(succ not in loop_set for node in loop for succ in cfg_graph.successors(node))):
+            continue
+        if len(loop) == 1 and not cfg_graph.has_edge(loop[0], loop[0]):
+            continue
+        if nx.is_strongly_connected(cfg_graph.subgraph(loop)):
+            kept.append(loop)
+    baseline_status = {name: status for (name, _nodes, status, _loops) in baseline_results or []}
+
+    def reuse(name, part_nodes):
+        # Functions the baseline could not finish are retried under the current budgets
+        part_set = set(part_nodes)
+        if part_set & affected or baseline_status.get(name) != "ok":
+            return None
+        return "ok", [loop for loop in kept if all(node in part_set for node in loop)]
+
+    return partitioned_infinite_loops(cfg_graph, function_index, jobs, cycles_per_loop,
+                                      max_nodes, seconds, reuse)
+
+# ------------------------------------------------------------------------------
+# Per-function Loop Analysis
+# ------------------------------------------------------------------------------
+LOOP_BUDGET_MARKER = "budget exceeded"
+
+
+class LoopBudgetExceeded(Exception):
+    """Raised inside a partition's loop analysis when its time budget runs out."""
+
+
+@contextmanager
+def time_budget(seconds):
+    """
+    Raise LoopBudgetExceeded if the body runs longer than 'seconds'. Uses a
+    SIGALRM interval timer, so it only applies in a process's main thread on
+    POSIX; elsewhere (or with no budget) the body runs unbounded.
+    """
+    if (not seconds or not hasattr(signal, "setitimer")
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expired(_signum, _frame):
+        raise LoopBudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def partition_cfg(cfg_graph, function_index):
+    """
+    Split the CFG nodes by function: [(name, nodes)] with one entry per
+    function (from 'function_index') that has nodes, then one per weakly
+    connected region of the nodes outside every function (recovered
+    boundaries, named sub_<addr> after their lowest address).
+    """
+    nodes = np.array(sorted(cfg_graph.nodes()), dtype=np.uint64)
+    func_idx, _offsets = function_index.lookup_indices(nodes)
+    node_list = nodes.tolist()
+
+    partitions = []
+    order = np.argsort(func_idx, kind="stable")
+    sorted_idx = func_idx[order]
+    bounds = np.flatnonzero(np.diff(sorted_idx)) + 1
+    for group in np.split(order, bounds):
+        if not len(group):
+            continue
+        func = int(func_idx[group[0]])
+        members = [node_list[i] for i in group.tolist()]
+        if func >= 0:
+            partitions.append((function_index.names[func], members))
+            continue
+        # Nodes outside any known function: split into connected regions
+        for region in nx.weakly_connected_components(cfg_graph.subgraph(members)):
+            region = sorted(region)
+            partitions.append((f"sub_{region[0]:x}", region))
+    return partitions
+
+
+def analyze_partition_loops(task):
+    """
+    Loop analysis of one CFG partition (also the process-pool worker).
+    'task' is (name, nodes, edges, leaky, cycles_per_loop, max_nodes,
+    seconds): 'edges' are the edges inside the partition and 'leaky' the
+    nodes with an edge leaving it.
+
+    Returns (name, loops, cycles, status) where 'cycles' holds up to
+    'cycles_per_loop' sampled cycles per loop and 'status' is "ok" or
+    LOOP_BUDGET_MARKER when the partition has more than 'max_nodes' nodes
+    or took longer than 'seconds'.
+    """
+    name, nodes, edges, leaky, cycles_per_loop, max_nodes, seconds = task
+    if max_nodes and len(nodes) > max_nodes:
+        return name, [], [], LOOP_BUDGET_MARKER
+    try:
+        with time_budget(seconds):
+            graph = nx.DiGraph()
+            graph.add_nodes_from(nodes)
+            graph.add_edges_from(edges)
+            # An edge out of the partition is an exit: route them all to a
+            # sink, which is never reported itself (no self-loop).
+            graph.add_edges_from((node, -1) for node in leaky)
+            loops = detect_infinite_loops_in_cfg(graph)
+            cycles = [sample_cycles_in_loop(graph, loop, cycles_per_loop) for loop in loops]
+    except LoopBudgetExceeded:
+        return name, [], [], LOOP_BUDGET_MARKER
+    return name, loops, cycles, "ok"
+
+
+def cross_partition_loops(edge_chunks, keys, owners, cycles_per_loop=0):
+    """
+    The closed SCCs that span several partitions, which the per-partition
+    pass cannot see (it treats every edge out of a partition as an exit),
+    e.g. two functions tail-jumping into each other forever.
+
+    'edge_chunks()' returns a fresh iterable of (src, dst) uint64 arrays and
+    is walked twice. A node's partition is owners[i] for the last keys[i]
+    <= node ('keys' sorted: every node, or the first address of each
+    address-contiguous partition).
+
+    Such an SCC can only lie in partitions that form a cycle of their own
+    over the inter-partition edges, so the condensation of that small
+    partition graph picks the candidates. Whole-CFG detection then runs
+    only on their nodes, with edges to other partitions routed to an exit
+    sink. Returns (loops, cycles) like partitioned_infinite_loops().
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    owners = np.asarray(owners, dtype=np.int64)
+
+    def owner_of(addrs):
+        return owners[np.searchsorted(keys, addrs, side="right") - 1]
+
+    quotient = nx.DiGraph()
+    for src, dst in edge_chunks():
+        src_part, dst_part = owner_of(src), owner_of(dst)
+        cross = src_part != dst_part
+        quotient.add_edges_from(set(zip(src_part[cross].tolist(), dst_part[cross].tolist())))
+    candidates = set()
+    for scc in nx.strongly_connected_components(quotient):
+        if len(scc) > 1:
+            candidates |= scc
+    if not candidates:
+        return [], {}
+
+    candidate_ids = np.array(sorted(candidates), dtype=np.int64)
+    graph = nx.DiGraph()
+    for src, dst in edge_chunks():
+        keep = np.isin(owner_of(src), candidate_ids)
+        src, dst = src[keep], dst[keep]
+        exits = ~np.isin(owner_of(dst), candidate_ids)
+        graph.add_edges_from(zip(src[~exits].tolist(), dst[~exits].tolist()))
+        graph.add_edges_from((node, -1) for node in np.unique(src[exits]).tolist())
+
+    loops, cycles = [], {}
+    for loop in detect_infinite_loops_in_cfg(graph):
+        if len(set(owner_of(np.array(loop, dtype=np.uint64)).tolist())) > 1:
+            loops.append(loop)
+            cycles[tuple(loop)] = sample_cycles_in_loop(graph, loop, cycles_per_loop)
+    return loops, cycles
+
+
+def partitioned_infinite_loops(cfg_graph, function_index, jobs=1, cycles_per_loop=0,
+                               max_nodes=None, seconds=None, reuse=None):
+    """
+    Closed-SCC loop detection run per function (see partition_cfg()), in a
+    pool of 'jobs' worker processes, with each function limited to
+    'max_nodes' CFG nodes and 'seconds' of analysis time.
+
+    A loop found inside a partition has no edge leaving it at all, so it is
+    a closed SCC of the whole CFG. Closed SCCs that span several functions
+    are found afterwards by cross_partition_loops(), which is not subject
+    to the per-function budgets.
+
+    'reuse(name, nodes)' may return (status, loops) to take a partition's
+    outcome from an earlier run instead of analyzing it again (see
+    incremental_infinite_loops()).
+
+    Returns (loops, cycles, results): the loops sorted by address, a
+    {tuple(loop): sampled cycles} dict and [(name, n_nodes, status,
+    n_loops)] per partition.
+    """
+    partitions = partition_cfg(cfg_graph, function_index)
+    owner = {}
+    for part, (_name, nodes) in enumerate(partitions):
+        for node in nodes:
+            owner[node] = part
+    edges = [[] for _ in partitions]
+    leaky = [set() for _ in partitions]
+    for src, dst in cfg_graph.edges():
+        part = owner[src]
+        if owner[dst] == part:
+            edges[part].append((src, dst))
+        else:
+            leaky[part].add(src)
+    outcomes = [None] * len(partitions)
+    tasks, task_parts = [], []
+    for part, (name, nodes) in enumerate(partitions):
+        reused = reuse(name, nodes) if reuse is not None else None
+        if reused is not None:
+            status, part_loops = reused
+            outcomes[part] = (name, part_loops, None, status)  # cycles sampled when reported
+            continue
+        tasks.append((name, nodes, edges[part], sorted(leaky[part]), cycles_per_loop,
+                      max_nodes, seconds))
+        task_parts.append(part)
+
+    if jobs > 1 and len(tasks) > 1:
+        flush_log()
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            analyzed = list(pool.map(analyze_partition_loops, tasks,
+                                     chunksize=max(1, len(tasks) // (jobs * 8))))
+    else:
+        analyzed = [analyze_partition_loops(task) for task in tasks]
+    for part, outcome in zip(task_parts, analyzed):
+        outcomes[part] = outcome
+
+    loops, cycles, results = [], {}, []
+    for (name, nodes), (_name, part_loops, part_cycles, status) in zip(partitions, outcomes):
+        results.append((name, len(nodes), status, len(part_loops)))
+        loops += part_loops
+        if part_cycles is not None:
+            for loop, loop_cycles in zip(part_loops, part_cycles):
+                cycles[tuple(loop)] = loop_cycles
+
+    keys = sorted(owner)
+    edge_array = np.array(list(cfg_graph.edges()), dtype=np.uint64).reshape(-1, 2)
+    cross_loops, cross_cycles = cross_partition_loops(
+        lambda: [(edge_array[:, 0], edge_array[:, 1])], keys, [owner[node] for node in keys],
+        cycles_per_loop)
+    loops += cross_loops
+    cycles.update(cross_cycles)
+    loops.sort(key=lambda loop: loop[0])
+    return loops, cycles, results
+
+
+def report_partition_results(results):
+    """
+    Log each function's loop-analysis outcome (detail level) and every
+    function whose budget ran out (summary level).
+    """
+    skipped = 0
+    for name, n_nodes, status, n_loops in results:
+        if status == LOOP_BUDGET_MARKER:
+            skipped += 1
+            log_message(f"[WARNING] Loop analysis of {name} ({n_nodes} nodes): {LOOP_BUDGET_MARKER}",
+                        LOG_SUMMARY, "loop_budget", function=name, nodes=n_nodes)
+        else:
+            log_message(f"  Loop analysis of {name} ({n_nodes} nodes): {n_loops} loops",
+                        LOG_DETAIL, "function_loops", function=name, nodes=n_nodes,
+                        loops=n_loops)
+    log_message(f"[INFO] Loop analysis covered {len(results) - skipped} of "
+                f"{len(results)} functions.", LOG_SUMMARY if skipped else LOG_INFO)
+
+# ------------------------------------------------------------------------------
+# Streaming Analysis (--stream)
+# ------------------------------------------------------------------------------
+STREAM_DIR = "firmware/stream"
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Rough peak memory per byte of code in one decode window (instruction
+# columns, interned strings, block dicts), used to size the windows from
+# the part of the budget the process is not already using.
+STREAM_BYTES_PER_CODE_BYTE = 256
+STREAM_MIN_WINDOW = 64 * 1024
+STREAM_MAX_WINDOW = 64 * 1024 * 1024
+STREAM_MIN_HEADROOM = 2 * STREAM_MIN_WINDOW * STREAM_BYTES_PER_CODE_BYTE
+
+# Rough memory per CFG node of a function under loop analysis (networkx),
+# used to derive --loop-max-nodes from what is left of the memory budget.
+STREAM_BYTES_PER_NODE = 2048
+
+# Code outside every function symbol is analyzed in regions of at most
+# this many blocks.
+STREAM_REGION_BLOCKS = 65536
+
+# Rows read per step when walking spilled columns
+STREAM_READ_ROWS = 1 << 20
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ColumnSpill:
+    """
+    Append-only set of equal-length columns spilled to raw files named
+    <prefix>.<column> in 'directory'. finish() closes them and maps them
+    back read-only, so they can be walked without loading them.
+    """
+
+    def __init__(self, directory, prefix, columns):
+        self.columns = columns  # {name: dtype}
+        self.paths = {name: os.path.join(directory, f"{prefix}.{name}") for name in columns}
+        self._files = {name: open(path, "wb") for name, path in self.paths.items()}
+        self.rows = 0
+
+    def append(self, **arrays):
+        for name, dtype in self.columns.items():
+            np.asarray(arrays[name], dtype=dtype).tofile(self._files[name])
+        self.rows += len(arrays[next(iter(self.columns))])
+
+    def finish(self):
+        """Close the files and return {column: read-only memory-mapped array}."""
+        for f in self._files.values():
+            f.close()
+        return {name: (np.memmap(self.paths[name], dtype=dtype, mode="r") if self.rows
+                       else np.empty(0, dtype=dtype))
+                for name, dtype in self.columns.items()}
+
+
+def stream_section_windows(md, data, base_addr, window_size):
+    """
+    Linear-sweep one section a window at a time, yielding (InsnTable,
+    window_start, window_end) per window. 'window_size' is a callable
+    returning the current window size in bytes. An instruction straddling a
+    window end is decoded whole in the window where it starts, so the
+    windows hold exactly what linear_sweep_disassemble() would decode.
+    """
+    pos = base_addr
+    sec_end = base_addr + len(data)
+    while pos < sec_end:
+        win_end = min(pos + window_size(), sec_end)
+        code = data[pos - base_addr:min(win_end + MAX_INSN_BYTES, sec_end) - base_addr]
+        builder = InsnTableBuilder()
+        next_pos = pos
+        for (address, size, mnemonic, op_str,
+             flags, target) in decode_instructions(md, code, pos):
+            if address >= win_end:
+                break
+            builder.append(address, mnemonic, op_str, size, flags, target)
+            next_pos = address + size
+        yield builder.finish(), pos, max(next_pos, win_end)
+        if next_pos < win_end:
+            return  # Capstone stopped on an invalid instruction, as the serial sweep does
+        pos = next_pos
+
+
+def window_blocks_and_edges(table, window_end):
+    """
+    Basic blocks of one window's InsnTable as (starts, ends, insn_counts)
+    arrays plus its edges as (src, dst) arrays sorted by source block.
+
+    Branches to code outside the window and fall-through off the window end
+    become edges to the raw target address; stream_infinite_loops() maps
+    them to the block containing that address. That block may start before
+    the target (its window didn't know the target was a leader), which can
+    only pull the block's head into a reported loop: its single edge leads
+    into the rest of the block, so which loops are found is unchanged.
+    """
+    blocks = build_basic_blocks(table, split_unresolved=True)
+    if not blocks:
+        empty = np.empty(0, dtype=np.uint64)
+        return empty, empty, empty, empty, empty
+    starts = np.fromiter(blocks, dtype=np.uint64, count=len(blocks))
+    ends = np.array([block["end"] for block in blocks.values()], dtype=np.uint64)
+    counts = np.array([block["insn_count"] for block in blocks.values()], dtype=np.uint64)
+    firsts = np.array([block["first"] for block in blocks.values()], dtype=np.int64)
+
+    src = [start for start, block in blocks.items() for _succ in block["successors"]]
+    dst = [succ for block in blocks.values() for succ in block["successors"]]
+
+    lasts = firsts + counts.astype(np.int64) - 1
+    flags = table.flags[lasts]
+    targets = table.targets[lasts]
+    unresolved = (((flags & FLAG_BRANCH) != 0) & (targets > 0)
+                  & (table.branch_indices()[lasts] < 0))
+    next_addrs = table.addrs[lasts] + table.sizes[lasts].astype(np.uint64)
+    falls_off = (((flags & FLAG_NO_FALLTHROUGH) == 0) & (next_addrs == window_end)
+                 & (lasts == len(table) - 1))
+    src = np.concatenate([np.array(src, dtype=np.uint64), starts[unresolved], starts[falls_off]])
+    dst = np.concatenate([np.array(dst, dtype=np.uint64),
+                          targets[unresolved].astype(np.uint64), next_addrs[falls_off]])
+    order = np.argsort(src, kind="stable")
+    return starts, ends, counts, src[order], dst[order]
+
+
+def map_spilled_edges(blocks, src, dst):
+    """
+    Map raw edge targets to the start of the spilled block containing them.
+    Returns (src, dst) of the edges whose target lies inside a block.
+    """
+    starts, ends = blocks["start"], blocks["end"]
+    idx = np.searchsorted(starts, dst, side="right").astype(np.int64) - 1
+    valid = idx >= 0
+    valid[valid] = dst[valid] < ends[idx[valid]]
+    return src[valid], starts[idx[valid]]
+
+
+def iter_spilled_edges(blocks, edges):
+    """Yield the (src, dst) block edges of a spilled CFG, a chunk at a time."""
+    for lo in range(0, len(edges["src"]), STREAM_READ_ROWS):
+        src, dst = map_spilled_edges(blocks, edges["src"][lo:lo + STREAM_READ_ROWS],
+                                     edges["dst"][lo:lo + STREAM_READ_ROWS])
+        yield from zip(src.tolist(), dst.tolist())
+
+
+def iter_spilled_blocks(blocks):
+    """Yield (start, end, insn_count) of every spilled block, a chunk at a time."""
+    for lo in range(0, len(blocks["start"]), STREAM_READ_ROWS):
+        yield from zip(blocks["start"][lo:lo + STREAM_READ_ROWS].tolist(),
+                       blocks["end"][lo:lo + STREAM_READ_ROWS].tolist(),
+                       blocks["insn_count"][lo:lo + STREAM_READ_ROWS].tolist())
+
+
+def write_spilled_cfg(graph_format, graph_path, blocks, edges, spill_dir):
+    """Write a spilled CFG in 'graph_format' without loading it into memory."""
+    log_message(f"[INFO] Writing CFG to {graph_path} ...")
+    os.makedirs(os.path.dirname(graph_path) or ".", exist_ok=True)
+    if graph_format == "dot":
+        nodes = ((start, {"label": f"0x{start:08X}-0x{end:08X}\\l{count} insns\\l"})
+                 for start, end, count in iter_spilled_blocks(blocks))
+        write_dot(graph_path, nodes, iter_spilled_edges(blocks, edges), name="RDA_CFG",
+                  graph_attrs=("rankdir=LR", "node [shape=box]"))
+    elif graph_format == "graphml":
+        nodes = ((start, {"end": end, "insn_count": count})
+                 for start, end, count in iter_spilled_blocks(blocks))
+        write_graphml(graph_path, nodes, iter_spilled_edges(blocks, edges),
+                      node_keys=("end", "insn_count"))
+    else:
+        # Same layout as write_cfg_npz(); the edge pairs are spilled first
+        pairs_path = os.path.join(spill_dir, "cfg_edges.pairs")
+        n_edges = 0
+        with open(pairs_path, "wb") as f:
+            for lo in range(0, len(edges["src"]), STREAM_READ_ROWS):
+                src, dst = map_spilled_edges(blocks, edges["src"][lo:lo + STREAM_READ_ROWS],
+                                             edges["dst"][lo:lo + STREAM_READ_ROWS])
+                np.column_stack([src, dst]).astype(np.uint64).tofile(f)
+                n_edges += len(src)
+        pairs = (np.memmap(pairs_path, dtype=np.uint64, mode="r").reshape(-1, 2) if n_edges
+                 else np.empty((0, 2), dtype=np.uint64))
+        np.savez_compressed(graph_path, nodes=blocks["start"], edges=pairs,
+                            end=blocks["end"], insn_count=blocks["insn_count"])
+    log_message(f"[INFO] CFG saved as {graph_path}")
+
+
+def stream_regions(function_index, lo, hi):
+    """
+    Yield (name, start, end, is_function) regions covering [lo, hi): every
+    function, and the gaps between functions as sub_<addr> regions.
+    """
+    pos = lo
+    for name, start, end in function_index:
+        if end <= lo or start >= hi:
+            continue
+        if pos < start:
+            yield f"sub_{pos:x}", pos, start, False
+        yield name, start, end, True
+        pos = max(pos, end)
+    if pos < hi:
+        yield f"sub_{pos:x}", pos, hi, False
+
+
+def stream_partitions(blocks, function_index):
+    """
+    Yield (name, lo, hi) per partition of the spilled CFG: blocks[lo:hi]
+    of one function, or of at most STREAM_REGION_BLOCKS outside them.
+    """
+    starts = blocks["start"]
+    if not len(starts):
+        return
+    lo_addr, hi_addr = int(starts[0]), int(blocks["end"][-1])
+    for name, start, end, is_function in stream_regions(function_index, lo_addr, hi_addr):
+        b_lo, b_hi = np.searchsorted(starts, np.array([start, end], dtype=np.uint64)).tolist()
+        # Functions stay whole (over-large ones hit max_nodes); gaps are split
+        step = max(b_hi - b_lo, 1) if is_function else STREAM_REGION_BLOCKS
+        for part_lo in range(b_lo, b_hi, step):
+            part_hi = min(part_lo + step, b_hi)
+            yield name if part_lo == b_lo else f"sub_{int(starts[part_lo]):x}", part_lo, part_hi
+
+
+def stream_partition_tasks(blocks, edges, function_index, cycles_per_loop, max_nodes, seconds):
+    """
+    Yield one analyze_partition_loops() task per region of the spilled CFG,
+    or a finished (name, [], [], LOOP_BUDGET_MARKER) outcome for regions
+    over 'max_nodes', building only one region's graph at a time.
+    """
+    starts, edge_src = blocks["start"], edges["src"]
+    for part_name, part_lo, part_hi in stream_partitions(blocks, function_index):
+        if max_nodes and part_hi - part_lo > max_nodes:
+            yield "done", (part_name, [], [], LOOP_BUDGET_MARKER), part_hi - part_lo
+            continue
+        nodes = starts[part_lo:part_hi]
+        first, last = nodes[0], nodes[-1]
+        e_lo = int(np.searchsorted(edge_src, first, side="left"))
+        e_hi = int(np.searchsorted(edge_src, last, side="right"))
+        src, dst = map_spilled_edges(blocks, edge_src[e_lo:e_hi], edges["dst"][e_lo:e_hi])
+        inside = (dst >= first) & (dst <= last)
+        task = (part_name, nodes.tolist(),
+                list(zip(src[inside].tolist(), dst[inside].tolist())),
+                np.unique(src[~inside]).tolist(), cycles_per_loop, max_nodes, seconds)
+        yield "task", task, part_hi - part_lo
+
+
+def stream_infinite_loops(blocks, edges, function_index, jobs=1, cycles_per_loop=0,
+                          max_nodes=None, seconds=None):
+    """
+    partitioned_infinite_loops() over a spilled CFG: regions are read from
+    the spill one at a time and at most a few per worker are in flight, so
+    memory is bounded by the largest region rather than the whole graph
+    (plus, for cross_partition_loops(), the regions that jump into each
+    other in a cycle).
+    Same return value as partitioned_infinite_loops().
+    """
+    tasks = stream_partition_tasks(blocks, edges, function_index, cycles_per_loop,
+                                   max_nodes, seconds)
+    loops, cycles, results = [], {}, []
+
+    def collect(outcome, n_nodes):
+        name, part_loops, part_cycles, status = outcome
+        results.append((name, n_nodes, status, len(part_loops)))
+        for loop, loop_cycles in zip(part_loops, part_cycles):
+            loops.append(loop)
+            cycles[tuple(loop)] = loop_cycles
+
+    if jobs > 1:
+        flush_log()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for kind, item, n_nodes in tasks:
+                if kind == "done":
+                    pending.append((None, item, n_nodes))
+                else:
+                    pending.append((pool.submit(analyze_partition_loops, item), None, n_nodes))
+                while len(pending) > jobs * 2 or (pending and pending[0][0] is None):
+                    future, outcome, n = pending.popleft()
+                    collect(outcome if future is None else future.result(), n)
+            while pending:
+                future, outcome, n = pending.popleft()
+                collect(outcome if future is None else future.result(), n)
+    else:
+        for kind, item, n_nodes in tasks:
+            collect(item if kind == "done" else analyze_partition_loops(item), n_nodes)
+
+    keys = [int(blocks["start"][part_lo])
+            for (_name, part_lo, _hi) in stream_partitions(blocks, function_index)]
+
+    def edge_chunks():
+        for lo in range(0, len(edges["src"]), STREAM_READ_ROWS):
+            yield map_spilled_edges(blocks, edges["src"][lo:lo + STREAM_READ_ROWS],
+                                    edges["dst"][lo:lo + STREAM_READ_ROWS])
+
+    # nx.attracting_components() leaves reference cycles behind; free the
+    # regions' graphs before the cross-partition graph is built
+    gc.collect()
+    if keys:
+        cross_loops, cross_cycles = cross_partition_loops(edge_chunks, keys, range(len(keys)),
+                                                          cycles_per_loop)
+        loops += cross_loops
+        cycles.update(cross_cycles)
+    loops.sort(key=lambda loop: loop[0])
+    return loops, cycles, results
+
+
+def stream_analysis(args, elffile, mapped, md, symbol_map, function_index, profiler=None,
+                    progress=None):
+    """
+    --stream: decode the executable sections in windows sized from the
+    memory budget, spilling basic blocks and edges to args.stream_dir as
+    each window is done, then run per-function loop detection and write the
+    CFG from the spilled data. Nothing proportional to the image size is
+    kept in memory; file pages already processed are dropped from RSS.
+    Stages are recorded in 'profiler' (a StageProfiler) and decode
+    progress is reported through 'progress' (a ProgressReporter) if given.
+
+    Exits with status 1 up front if the process already leaves less than
+    STREAM_MIN_HEADROOM of the budget. Returns False if the peak RSS ended
+    up above the budget anyway.
+    """
+    profiler = profiler or StageProfiler()
+    progress = progress or ProgressReporter(())
+    budget = args.memory_budget * 1024 * 1024
+    for flag, value in (("--angr", args.angr), ("--baseline", args.baseline),
+                        ("--save-artifact", args.save_artifact), ("--insn-cfg", args.insn_cfg),
+                        ("--disasm-mode recursive", args.disasm_mode == "recursive")):
+        if value:
+            log_message(f"[WARNING] {flag} is not supported with --stream; ignoring it.", LOG_SUMMARY)
+
+    # Interpreter, imports and the ELF already take part of the budget
+    headroom = budget - current_rss()
+    if headroom < STREAM_MIN_HEADROOM:
+        needed = -(-(budget - headroom + STREAM_MIN_HEADROOM) // 2 ** 20)
+        log_message(f"[ERROR] --memory-budget {args.memory_budget} MiB is too small: the analyzer "
+                    f"already uses {(budget - headroom) / 2 ** 20:.0f} MiB before decoding; "
+                    f"use at least {needed} MiB.", LOG_SUMMARY, "rss",
+                    rss_bytes=budget - headroom, budget_bytes=budget)
+        sys.exit(1)
+
+    profiler.start("disassembly")
+    os.makedirs(args.stream_dir, exist_ok=True)
+    # Half of the headroom is left for loop detection after decoding
+    decode_budget = budget - headroom // 2
+    window = min(max(headroom // 2 // STREAM_BYTES_PER_CODE_BYTE, STREAM_MIN_WINDOW),
+                 STREAM_MAX_WINDOW)
+    window_state = {"size": window}
+    block_spill = ColumnSpill(args.stream_dir, "blocks",
+                              {"start": np.uint64, "end": np.uint64, "insn_count": np.uint32})
+    edge_spill = ColumnSpill(args.stream_dir, "edges", {"src": np.uint64, "dst": np.uint64})
+
+    log_message(f"[INFO] Disassembling executable sections (streaming, {window // 1024} KiB "
+                f"windows, budget {args.memory_budget} MiB).")
+    sections = sorted((section for section in elffile.iter_sections()
+                       if section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR
+                       and section['sh_type'] != 'SHT_NOBITS'),
+                      key=lambda section: section['sh_addr'])
+    total_insns = 0
+    total_bytes = sum(section['sh_size'] for section in sections) or 1
+    done_bytes = 0
+    for section in sections:
+        name, base_addr, size = section.name, section['sh_addr'], section['sh_size']
+        log_message(f"  >> Section '{name}' at 0x{base_addr:X}, size={size}")
+        data = section_bytes(section, mapped)
+        in_file = not section['sh_flags'] & SH_FLAGS.SHF_COMPRESSED
+        section_insns = 0
+        for table, win_start, win_end in stream_section_windows(
+                md, data, base_addr, lambda: window_state["size"]):
+            total_insns += len(table)
+            section_insns += len(table)
+            log_instruction_listing(table, symbol_map, function_index)
+            starts, ends, counts, src, dst = window_blocks_and_edges(table, win_end)
+            block_spill.append(start=starts, end=ends, insn_count=counts)
+            edge_spill.append(src=src, dst=dst)
+            del table
+            if in_file:
+                mapped.release(section['sh_offset'] + (win_start - base_addr), win_end - win_start)
+            # Shrink the window once the next one would no longer fit in the budget
+            rss = current_rss()
+            if (rss + window_state["size"] * STREAM_BYTES_PER_CODE_BYTE > decode_budget
+                    and window_state["size"] > STREAM_MIN_WINDOW):
+                window_state["size"] = max(window_state["size"] // 2, STREAM_MIN_WINDOW)
+                log_message(f"[INFO] Decode window reduced to {window_state['size'] // 1024} KiB "
+                            f"to stay within the budget (RSS {rss / 2 ** 20:.0f} MiB).")
+            progress.advance((done_bytes + win_end - base_addr) / total_bytes, section=name)
+        done_bytes += size
+        log_event("section", section=name, addr=f"0x{base_addr:x}", size=size,
+                  instructions=section_insns)
+    blocks = block_spill.finish()
+    edges = edge_spill.finish()
+    log_message(f"[INFO] Decoded {total_insns} instructions.", LOG_SUMMARY)
+    log_message(f"[INFO] {total_insns} instructions grouped into {len(blocks['start'])} "
+                f"basic blocks (spilled to {args.stream_dir}).", LOG_SUMMARY)
+    profiler.count(instructions=total_insns, blocks=len(blocks["start"]), edges=len(edges["src"]))
+
+    profiler.start("graph_write")
+    write_spilled_cfg(args.graph_format, f"firmware/cfg.{args.graph_format}",
+                      blocks, edges, args.stream_dir)
+
+    profiler.start("loops")
+    log_message("[INFO] Checking CFG for infinite loops...")
+    max_nodes = args.loop_max_nodes or max((budget - current_rss()) // STREAM_BYTES_PER_NODE, 1)
+    infinite_loops, loop_cycles, loop_results = stream_infinite_loops(
+        blocks, edges, function_index, args.jobs, args.loop_cycles, max_nodes, args.loop_budget)
+    report_partition_results(loop_results)
+    report_infinite_loops(infinite_loops, None, args.loop_cycles, function_index, loop_cycles)
+    profiler.count(loops=len(infinite_loops), functions=len(loop_results))
+
+    profiler.start("strings")
+    string_sections = [(sec_name, base_addr, size,
+                        iter_printable_strings(data, base_addr, min_len=4, utf16=args.utf16))
+                       for (sec_name, data, base_addr, size) in load_data_sections(elffile, mapped)]
+    report_strings(string_sections, args.max_strings, keep=False)
+    profiler.stop()
+
+    peak = peak_rss()
+    if not peak:
+        return True
+    if peak > budget:
+        log_message(f"[ERROR] Peak RSS {peak / 2 ** 20:.0f} MiB exceeded --memory-budget "
+                    f"{args.memory_budget} MiB.", LOG_SUMMARY, "rss",
+                    peak_bytes=peak, budget_bytes=budget)
+        return False
+    log_message(f"[INFO] Peak RSS {peak / 2 ** 20:.0f} MiB (budget {args.memory_budget} MiB).",
+                LOG_INFO, "rss", peak_bytes=peak, budget_bytes=budget)
+    return True
+
+# ------------------------------------------------------------------------------
+# Profiling (--profile, see analysis_profile.py) and Progress Events
+# ------------------------------------------------------------------------------
+# Rough share of a run spent in each stage, for the percent in progress events
+STAGE_WEIGHTS = {"elf": 2, "cache_lookup": 1, "disassembly": 30, "listing": 15, "cfg": 12,
+                 "graph_write": 10, "loops": 20, "strings": 5, "angr": 60, "cache_store": 5}
+
+
+class ProgressReporter:
+    """
+    Emits --jsonl progress events for a run made of 'stages' (names from
+    STAGE_WEIGHTS): "stage" when a stage starts (use start() as
+    StageProfiler.on_start), "progress" for work done inside a stage
+    (advance()) and "done" at the end. Each carries the overall 'percent'.
+    Stages that do not run are skipped over.
+    """
+
+    def __init__(self, stages):
+        self.stages = [name for name in stages if name in STAGE_WEIGHTS]
+        self.total = sum(STAGE_WEIGHTS[name] for name in self.stages) or 1
+        self.current = None
+
+    def _percent(self, fraction=0.0):
+        if self.current not in self.stages:
+            return None
+        position = self.stages.index(self.current)
+        done = sum(STAGE_WEIGHTS[name] for name in self.stages[:position])
+        done += STAGE_WEIGHTS[self.current] * min(max(fraction, 0.0), 1.0)
+        return round(100.0 * done / self.total, 1)
+
+    def start(self, name):
+        self.current = name
+        log_event("stage", stage=name, percent=self._percent())
+
+    def advance(self, fraction, **fields):
+        """Report that 'fraction' (0..1) of the current stage is done."""
+        log_event("progress", stage=self.current, percent=self._percent(fraction), **fields)
+
+    def finish(self):
+        log_event("done", percent=100.0)
+
+
+def report_sections(table, exec_sections):
+    """One "section" progress event per executable section with its instruction count."""
+    for (sec_name, _data, base_addr, size) in exec_sections:
+        lo, hi = np.searchsorted(table.addrs, [base_addr, base_addr + size])
+        log_event("section", section=sec_name, addr=f"0x{base_addr:x}", size=size,
+                  instructions=int(hi - lo))
+
+
+def report_profile(profiler, profile_path=None):
+    """
+    Log the one-line stage summary and, with 'profile_path', write the full
+    per-stage metrics there as JSON.
+    """
+    if profile_path:
+        document = profiler.write_json(profile_path)
     else:
-        log_message("[INFO] No infinite loops detected.")
+        document = profiler.to_dict()
+    log_message(profiler.summary(), LOG_SUMMARY, "profile",
+                total=document["total"], stages=document["stages"])
+    if profile_path:
+        log_message(f"[INFO] Stage metrics written to {profile_path}", LOG_SUMMARY)
+
 
 # ------------------------------------------------------------------------------
 # Main
 # ------------------------------------------------------------------------------
 
-def main():
-    # Argument Parsing
+def build_arg_parser():
+    """Command-line options, shared by main() and the run() library entry point."""
     parser = argparse.ArgumentParser()
     parser.add_argument("elf_path", help="Path to the firmware ELF file")
     parser.add_argument("--angr", action="store_true", help="Enable VEX IR analysis with angr")
-    args = parser.parse_args()
-    
+    parser.add_argument("--angr-mode", choices=ANGR_MODES, default="fast",
+                        help="angr CFG recovery: CFGFast (default) or the much slower CFGEmulated")
+    parser.add_argument("--angr-stmts", action="store_true",
+                        help="Log every VEX IR statement of every block (detail level)")
+    parser.add_argument("--angr-dot-dir", default=ANGR_DOT_DIR, metavar="DIR",
+                        help=f"Directory for per-function angr DOT files (default {ANGR_DOT_DIR})")
+    parser.add_argument("--loop-cycles", type=int, default=0, metavar="N",
+                        help="List up to N representative cycles per detected infinite loop")
+    parser.add_argument("--utf16", action="store_true",
+                        help="Also extract UTF-16LE strings from data sections")
+    parser.add_argument("--max-strings", type=int, default=None, metavar="N",
+                        help="Report at most N strings per data section")
+    parser.add_argument("--disasm-mode", choices=("linear", "recursive"), default="linear",
+                        help="linear: sweep every executable byte (default). recursive: follow "
+                             "control flow from the entry point and function symbols")
+    parser.add_argument("--no-gap-sweep", action="store_true",
+                        help="In recursive mode, don't linear-sweep bytes that were never reached")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="Disassemble executable sections with N worker processes (images "
+                             "with less than 4 MiB of code are swept serially); also sizes the "
+                             "loop and angr pools")
+    parser.add_argument("--graph-format", choices=GRAPH_FORMATS, default="dot",
+                        help="CFG output format: Graphviz DOT (default), NumPy .npz edge list "
+                             "or GraphML, written to firmware/cfg.<format>")
+    parser.add_argument("--detail", action="store_true",
+                        help="Decode with Capstone detail mode and read branch targets from "
+                             "operand structs (slower; default parses the operand string)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only print summaries to the terminal (the log file still gets everything)")
+    parser.add_argument("--log-file", default=LOG_PATH, metavar="PATH",
+                        help=f"Where to write the full text log (default: {LOG_PATH})")
+    parser.add_argument("--jsonl", default=None, metavar="PATH",
+                        help="Also write every log event as JSON Lines to PATH")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Don't read or write the on-disk analysis cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, metavar="DIR",
+                        help=f"Analysis cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                        metavar="MB", help="Evict least recently used cache entries beyond this size")
+    parser.add_argument("--save-artifact", default=None, metavar="DIR",
+                        help="Save this run's analysis to DIR for use as a later --baseline")
+    parser.add_argument("--baseline", default=None, metavar="DIR",
+                        help="Previous analysis artifact (or cache entry): only re-analyze "
+                             "functions whose bytes changed")
+    parser.add_argument("--loop-budget", type=float, default=None, metavar="SECONDS",
+                        help="Give up loop analysis of a function after SECONDS and report it as "
+                             "'budget exceeded'")
+    parser.add_argument("--loop-max-nodes", type=int, default=None, metavar="N",
+                        help="Skip loop analysis of functions with more than N CFG nodes "
+                             "(reported as 'budget exceeded')")
+    parser.add_argument("--stream", action="store_true",
+                        help="Bounded-memory mode for very large images: decode in windows and "
+                             "spill basic blocks/edges to disk (no cache, angr or baseline)")
+    parser.add_argument("--memory-budget", type=int, default=DEFAULT_MEMORY_BUDGET_MB, metavar="MB",
+                        help="Peak RSS limit in --stream mode: sizes decode windows and the "
+                             "default --loop-max-nodes, and the run exits with status 1 if it is "
+                             f"exceeded (default {DEFAULT_MEMORY_BUDGET_MB})")
+    parser.add_argument("--stream-dir", default=STREAM_DIR, metavar="DIR",
+                        help=f"Where --stream spills blocks and edges (default {STREAM_DIR})")
+    parser.add_argument("--insn-cfg", action="store_true",
+                        help="Debug: build the CFG with one node per instruction instead of per basic block")
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_PROFILE_PATH, default=None,
+                        metavar="PATH",
+                        help="Record wall/CPU time, peak RSS and item counts per stage and write "
+                             f"them as JSON to PATH (default {DEFAULT_PROFILE_PATH})")
+    return parser
+
+
+def run(argv=None):
+    """
+    Library entry point: run one analysis in this process with the same
+    arguments as the command line, e.g. run(["fw.elf", "--quiet"]). Output
+    paths are relative to the working directory, as for the CLI. The log
+    is closed before returning. Bad arguments or a missing file raise
+    SystemExit, as they do for the CLI.
+
+    This lets a long-lived process (see analysis_jobs.py) pay for the
+    imports once and then analyze many images.
+    """
+    args = build_arg_parser().parse_args(argv)
+    configure_logging(args.log_file, args.jsonl, args.quiet)
+    try:
+        analyze(args)
+    finally:
+        close_logging()
+
+
+def analyze(args):
+    """Run the analysis for parsed arguments 'args' (see build_arg_parser())."""
+    profiler = StageProfiler(binary=args.elf_path, options=vars(args))
+
+    # Progress events for --jsonl followers; stages that won't run are left out
+    skipped = set() if args.angr else {"angr"}
+    if args.no_cache:
+        skipped.add("cache_lookup")
+        if not args.save_artifact:
+            skipped.add("cache_store")
+    if args.stream:
+        skipped |= {"cache_lookup", "listing", "cfg", "angr", "cache_store"}
+    progress = ProgressReporter(name for name in STAGE_WEIGHTS if name not in skipped)
+    profiler.on_start = progress.start
+
     elf_path = args.elf_path  # Get firmware path from arguments
 
     if not os.path.exists(elf_path):
-        log_message(f"[ERROR] File not found: {elf_path}")
+        log_message(f"[ERROR] File not found: {elf_path}", LOG_SUMMARY)
         sys.exit(1)
 
     # 1) Open ELF and detect arch
-    with open(elf_path, "rb") as f:
+    profiler.start("elf", file_bytes=os.path.getsize(elf_path))
+    with open(elf_path, "rb") as f, MappedFile(f) as mapped:
         elffile = ELFFile(f)
         cs_arch, cs_mode, ptr_size = detect_arch(elffile)
 
-        # 2) Create Capstone disassembler
+        # 2) Create Capstone disassembler and this arch's branch classifier.
+        # Detail mode is only needed to read targets from operand structs;
+        # otherwise the disasm_lite() fast path is used.
         md = Cs(cs_arch, cs_mode)
-        md.detail = True
+        md.detail = args.detail
+        branch_classifier(cs_arch, cs_mode)
 
         # 3) Gather symbol info (function names, etc.)
         symbol_map = gather_symbols(elffile)
+        function_index = FunctionIndex.from_elf(elffile)
+        profiler.count(symbols=len(symbol_map), functions=len(function_index))
+
+        if args.stream:
+            within_budget = stream_analysis(args, elffile, mapped, md, symbol_map,
+                                            function_index, profiler, progress)
+            if args.profile:
+                report_profile(profiler, args.profile)
+            progress.finish()
+            log_message(f"\n[INFO] Done. Full output is in {args.log_file}.", LOG_SUMMARY)
+            if not within_budget:
+                sys.exit(1)
+            return
+
+        # Look up earlier results for this exact firmware + options
+        cache = cache_key_str = cached = content_hash = None
+        if not args.no_cache:
+            profiler.start("cache_lookup")
+            cache = AnalysisCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+            content_hash = sha256_of(mapped.view(0, os.path.getsize(elf_path)))
+            cache_key_str = cache_key(content_hash, analysis_cache_options(args))
+            loaded = cache.load(cache_key_str)
+            if loaded is not None:
+                cached = unpack_analysis(*loaded)
+                log_message(f"[INFO] Using cached analysis {cache_key_str[:16]} "
+                            f"from {args.cache_dir}.", LOG_SUMMARY)
+            profiler.count(hit=cached is not None)
 
         # 4) Disassemble all executable sections *linearly*
-        exec_sections = load_executable_sections(elffile)
-        all_insns = {}
-        if not exec_sections:
-            log_message("[WARNING] No executable sections found.")
+        profiler.start("disassembly")
+        exec_sections = load_executable_sections(elffile, mapped)
+        data_sections = load_data_sections(elffile, mapped)
+        code_bytes = sum(size for (_n, _d, _a, size) in exec_sections)
+        functions = hash_functions(exec_sections, function_ranges(exec_sections, symbol_map))
+
+        # With --baseline, the function diff is always reported; only functions
+        # whose bytes changed are redone unless the whole run is cached
+        baseline = dirty = None
+        if args.baseline:
+            reuse_baseline = cached is None and args.disasm_mode == "linear"
+            loaded = read_entry(args.baseline, meta_only=not reuse_baseline)
+            if loaded is None or "functions" not in loaded[0]:
+                log_message(f"[WARNING] No usable baseline artifact at {args.baseline}"
+                            + ("; running a full analysis." if cached is None else "."),
+                            LOG_SUMMARY)
+            else:
+                baseline_meta = loaded[0]
+                diff = diff_functions(baseline_meta["functions"], functions)
+                report_function_diff(diff, args.baseline)
+                mismatch = decode_option_mismatch(baseline_meta.get("options"),
+                                                  analysis_cache_options(args))
+                if reuse_baseline and mismatch:
+                    log_message(f"[INFO] Baseline was decoded with a different "
+                                f"{', '.join(mismatch)}; disassembling everything.", LOG_SUMMARY)
+                elif reuse_baseline:
+                    baseline = unpack_analysis(*loaded)
+
+        if cached is not None:
+            all_insns = cached["insns"]
+        elif args.disasm_mode == "recursive":
+            log_message("[INFO] Disassembling executable sections (recursive descent).")
+            seeds = [elffile.header['e_entry']] + sorted(
+                addr for addr, (_name, is_func) in symbol_map.items() if is_func)
+            insn_builder, reached, total = recursive_descent_disassemble(
+                md, exec_sections, seeds, sweep_gaps=not args.no_gap_sweep)
+            coverage = 100.0 * reached / total if total else 0.0
+            log_message(f"[INFO] Recursive descent reached {reached} of {total} bytes "
+                        f"({coverage:.1f}%) of executable sections"
+                        + ("; gaps were linear-swept." if not args.no_gap_sweep else "."),
+                        LOG_SUMMARY, "coverage", reached=reached, total=total,
+                        percent=round(coverage, 2))
+            all_insns = insn_builder.finish()
+        elif baseline is not None:
+            log_message("[INFO] Disassembling changed functions (linear sweep).")
+            insn_builder, dirty = incremental_disassemble(md, exec_sections, functions,
+                                                          set(diff["reused"]), baseline["insns"])
+            all_insns = insn_builder.finish()
         else:
-            log_message("[INFO] Disassembling executable sections (linear sweep).")
-            for (sec_name, data, base_addr, size) in exec_sections:
-                log_message(f"  >> Section '{sec_name}' at 0x{base_addr:X}, size={size}")
-                sec_insns = linear_sweep_disassemble(md, data, base_addr)
-                all_insns.update(sec_insns)
-
-            # 5) Sort and log final code disassembly
+            insn_builder = InsnTableBuilder()
+            if not exec_sections:
+                log_message("[WARNING] No executable sections found.", LOG_SUMMARY)
+            elif args.jobs > 1 and code_bytes >= SWEEP_MIN_PARALLEL_BYTES:
+                log_message(f"[INFO] Disassembling executable sections (linear sweep, {args.jobs} jobs).")
+                parallel_sweep_disassemble(elf_path, elffile, mapped, md, cs_arch, cs_mode,
+                                           symbol_map, args.jobs, insn_builder)
+            else:
+                log_message("[INFO] Disassembling executable sections (linear sweep).")
+                if args.jobs > 1:
+                    log_message(f"[INFO] {code_bytes} bytes of code is below the parallel sweep "
+                                f"threshold ({SWEEP_MIN_PARALLEL_BYTES} bytes); sweeping serially.")
+                done_bytes = 0
+                for (sec_name, data, base_addr, size) in exec_sections:
+                    log_message(f"  >> Section '{sec_name}' at 0x{base_addr:X}, size={size}")
+                    linear_sweep_disassemble(md, data, base_addr, insn_builder)
+                    done_bytes += size
+                    progress.advance(done_bytes / code_bytes, section=sec_name)
+            all_insns = insn_builder.finish()
+        log_message(f"[INFO] Decoded {len(all_insns)} instructions.", LOG_SUMMARY)
+        report_sections(all_insns, exec_sections)
+        profiler.count(instructions=len(all_insns), code_bytes=code_bytes)
+
+        if len(all_insns):
+            # 5) Log final code disassembly (the table is already address-sorted)
+            profiler.start("listing", instructions=len(all_insns))
             log_message("[INFO] Final Disassembly Results (executable sections):\n")
-            for addr in sorted(all_insns.keys()):
-                mnemonic, op_str, _size = all_insns[addr]
-                sym_info = symbol_map.get(addr, ("", False))
-                sym_name = sym_info[0]
-                sym_hint = f"<{sym_name}> " if sym_name else ""
-                line = f"0x{addr:08X}:  {sym_hint}{mnemonic} {op_str}"
-                log_message(line)
+            log_instruction_listing(all_insns, symbol_map, function_index)
 
         # ------------------------------
-        # Clearly build CFG graph here:
+        # Build the CFG (basic blocks unless --insn-cfg) and check for loops
         # ------------------------------
-        # ZAK
-        log_message("[INFO] Building CFG graph...")
-        cfg_graph = nx.DiGraph() #**************
-
-
-        # Clearly populate CFG from all_insns
-        sorted_addrs = sorted(all_insns.keys())
-        branch_mnemonics = {"jmp", "b", "bl", "br", "cbz", "cbnz", "ret"}
-
-        for addr in sorted_addrs: #**************
-            mnemonic, op_str, size = all_insns[addr]
-
-            # Add fall-through edge unless it's a terminating instruction
-            if mnemonic.lower() not in {"ret", "jmp", "br"}: #**************
-                next_addr = addr + size
-                if next_addr in all_insns:
-                    cfg_graph.add_edge(addr, next_addr)
-
-            # Parse direct branch or call targets
-            target = parse_immediate(op_str)
-            if mnemonic.lower() in branch_mnemonics and target and target in all_insns: #**************
-
-                cfg_graph.add_edge(addr, target)
-
-        # Immediately run infinite loop detection (clearly placed here):
-        log_message("[INFO] Checking CFG for infinite loops...")
-        infinite_loops = detect_infinite_loops_in_cfg(cfg_graph) #**************
-        report_infinite_loops(infinite_loops)
-
-        # Write CFG to .dot file (optional clearly here):
-        dot_path = "firmware/cfg.dot"
-        nx_pydot.write_dot(cfg_graph, dot_path) #**************
-        log_message(f"[INFO] CFG saved as {dot_path}")
+        loop_cycles = None
+        graph_path = f"firmware/cfg.{args.graph_format}"
+        profiler.start("cfg")
+        if cached is not None:
+            cfg_graph, blocks = cached["cfg"], cached["blocks"]
+            if blocks is not None:
+                log_message(f"[INFO] {len(all_insns)} instructions grouped into "
+                            f"{len(blocks)} basic blocks.", LOG_SUMMARY)
+        else:
+            cfg_graph, blocks = build_cfg(all_insns, None, insn_level=args.insn_cfg)
+        profiler.count(nodes=cfg_graph.number_of_nodes(), edges=cfg_graph.number_of_edges())
+
+        profiler.start("graph_write")
+        save_cfg(cfg_graph, all_insns, graph_path, blocks, args.graph_format)
+        profiler.count(bytes=os.path.getsize(graph_path))
+
+        profiler.start("loops")
+        if cached is not None:
+            infinite_loops = cached["loops"]
+            loop_results = cached["loop_results"]
+            # Running out of --loop-budget depends on the machine and its load,
+            # so those functions are retried rather than served from the cache
+            if args.loop_budget and any(status == LOOP_BUDGET_MARKER
+                                        for (_name, _nodes, status, _loops) in loop_results or []):
+                log_message("[INFO] Retrying loop analysis of the functions that ran out of "
+                            "budget in the cached run...")
+                infinite_loops, loop_cycles, loop_results = incremental_infinite_loops(
+                    cfg_graph, function_index, infinite_loops, loop_results, [],
+                    args.jobs, args.loop_cycles, args.loop_max_nodes, args.loop_budget)
+        else:
+            log_message("[INFO] Checking CFG for infinite loops...")
+            if baseline is not None and baseline_meta["insn_level"] == args.insn_cfg:
+                infinite_loops, loop_cycles, loop_results = incremental_infinite_loops(
+                    cfg_graph, function_index, baseline["loops"], baseline["loop_results"], dirty,
+                    args.jobs, args.loop_cycles, args.loop_max_nodes, args.loop_budget)
+            else:
+                # One task per function, so a pathological one can't stall the run
+                infinite_loops, loop_cycles, loop_results = partitioned_infinite_loops(
+                    cfg_graph, function_index, args.jobs, args.loop_cycles,
+                    args.loop_max_nodes, args.loop_budget)
+        profiler.count(loops=len(infinite_loops))
+        if loop_results is not None:
+            report_partition_results(loop_results)
+            profiler.count(functions=len(loop_results))
+        report_infinite_loops(infinite_loops, cfg_graph, args.loop_cycles, function_index,
+                              loop_cycles)
+        report_function_stats(function_index, all_insns, blocks)
 
         # --------------------------------------
 
         # 6) Dump data sections for strings AARON
-        data_sections = load_data_sections(elffile)
-        if data_sections:
-            log_message("\n[INFO] Searching data sections for printable strings:")
-            for (sec_name, data, base_addr, size) in data_sections:
-                log_message(f"\n  >> Section '{sec_name}' @0x{base_addr:X}, size={size} bytes")
-                found_strings = extract_printable_strings(data, base_addr, min_len=4)
-                if not found_strings:
-                    log_message("    (No printable strings of length >= 4 found.)")
-                else:
-                    for (addr, s) in found_strings:
-                        display_s = s if len(s) < 100 else s[:100] + "..."
-                        log_message(f"    0x{addr:08X}:  \"{display_s}\"")
+        profiler.start("strings", sections=len(data_sections))
+        data_hashes = hash_data_sections(data_sections)
+        if cached is not None:
+            string_sections = cached["strings"]
+        else:
+            # Reuse the baseline's strings for data sections that didn't change
+            reusable_strings = {}
+            if (baseline is not None
+                    and baseline_meta.get("options", {}).get("utf16") == args.utf16
+                    and baseline_meta.get("options", {}).get("max_strings") == args.max_strings):
+                old_hashes = baseline_meta.get("data_sections", {})
+                reusable_strings = {name: found for (name, _base, _size, found) in baseline["strings"]
+                                    if old_hashes.get(name) == data_hashes.get(name)}
+            string_sections = [
+                (sec_name, base_addr, size,
+                 iter(reusable_strings[sec_name]) if sec_name in reusable_strings
+                 else iter_printable_strings(data, base_addr, min_len=4, utf16=args.utf16))
+                for (sec_name, data, base_addr, size) in data_sections]
+        string_sections = report_strings(string_sections, args.max_strings)
+        profiler.count(strings=sum(len(found) for (_n, _a, _s, found) in string_sections))
 
         # 7) Run angr analysis if --angr flag is used
+        angr_functions = None
         if args.angr:
+            profiler.start("angr")
             log_message("\n[INFO] Running angr for VEX IR analysis...")
-            analyze_vex_ir_with_angr(elf_path)  # Call angr-based analysis
+            if cached is not None and cached["angr"] is not None:
+                angr_functions = cached["angr"]
+                for record in angr_functions:
+                    log_message(f"[ANGR] Function {record['name']} at 0x{record['addr']:x} (cached)")
+                    write_angr_function_dot(record, dot_dir=args.angr_dot_dir)
+            else:
+                # angr CFG snapshots share the analysis cache's --cache-max-mb
+                snapshot_cache = None
+                if cache is not None:
+                    snapshot_cache = cache.subcache(ANGR_SNAPSHOT_SUBDIR)
+                angr_functions = analyze_vex_ir_with_angr(elf_path, args.angr_mode, args.jobs,
+                                                          args.angr_stmts, args.angr_dot_dir,
+                                                          snapshot_cache, content_hash)
+            profiler.count(functions=len(angr_functions))
+
+        if (cache is not None and cached is None) or args.save_artifact:
+            profiler.start("cache_store")
+            meta, arrays = pack_analysis(all_insns, cfg_graph, blocks, infinite_loops,
+                                         string_sections, angr_functions)
+            meta.update(functions=functions, data_sections=data_hashes, loop_results=loop_results,
+                        code_sections=[[name, base_addr, size]
+                                       for (name, _data, base_addr, size) in exec_sections],
+                        function_index=[list(record) for record in function_index],
+                        options=analysis_cache_options(args))
+            if cache is not None and cached is None:
+                cache.store(cache_key_str, meta, arrays)
+            if args.save_artifact:
+                write_entry(args.save_artifact, meta, arrays)
+                log_message(f"[INFO] Analysis artifact saved to {args.save_artifact}", LOG_SUMMARY)
+
+        if args.profile:
+            report_profile(profiler, args.profile)
+        progress.finish()
+        log_message(f"\n[INFO] Done. Full output is in {args.log_file}.", LOG_SUMMARY)
 
-        log_message("\n[INFO] Done. Full output is in firmware/disassembly.log.")
+
+def main():
+    run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+from analysis_cache import AnalysisCache, cache_key, read_entry, write_entry
+
+MB = 1024 * 1024
+
+
+def entry(size_bytes):
+    return {"note": "x"}, {"cols": {"data": np.zeros(size_bytes, dtype=np.uint8)}}
+
+
+def age(cache, key, seconds_ago):
+    meta_path = os.path.join(cache.entry_dir(key), "meta.json")
+    stamp = os.path.getmtime(meta_path) - seconds_ago
+    os.utime(meta_path, (stamp, stamp))
+
+
+def test_entry_round_trip(tmp_path):
+    meta = {"loops": [[1, 2]], "strings": ["abc"]}
+    arrays = {"insns": {"addrs": np.arange(5, dtype=np.uint64),
+                        "flags": np.array([0, 1, 3, 4, 10], dtype=np.uint8)}}
+    write_entry(str(tmp_path / "e"), meta, arrays)
+    loaded_meta, loaded_arrays = read_entry(str(tmp_path / "e"))
+    assert {k: v for k, v in loaded_meta.items() if not k.startswith("_")} == meta
+    for name, column in arrays["insns"].items():
+        np.testing.assert_array_equal(loaded_arrays["insns"][name], column)
+        assert loaded_arrays["insns"][name].dtype == column.dtype
+    assert read_entry(str(tmp_path / "e"), meta_only=True) == (loaded_meta, {})
+    assert read_entry(str(tmp_path / "missing")) is None
+
+
+def test_cache_key_ignores_option_order_but_not_values():
+    assert cache_key("abc", {"a": 1, "b": 2}) == cache_key("abc", {"b": 2, "a": 1})
+    assert cache_key("abc", {"a": 1}) != cache_key("abc", {"a": 2})
+    assert cache_key("abc", {"a": 1}) != cache_key("abd", {"a": 1})
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = AnalysisCache(str(tmp_path), max_bytes=int(2.5 * MB))
+    cache.store("old", *entry(MB))
+    cache.store("used", *entry(MB))
+    age(cache, "old", 20)
+    age(cache, "used", 30)
+    assert cache.load("used") is not None  # a hit makes it the most recent
+    cache.store("new", *entry(MB))
+    assert cache.load("old") is None
+    assert cache.load("used") is not None and cache.load("new") is not None
+
+
+def test_sub_caches_share_the_size_budget(tmp_path):
+    cache = AnalysisCache(str(tmp_path), max_bytes=int(2.5 * MB))
+    snapshots = cache.subcache("angr")
+    cache.store("analysis", *entry(MB))
+    age(cache, "analysis", 60)
+    snapshots.store("snap1", *entry(MB))
+    snapshots.store("snap2", *entry(MB))
+    assert cache.load("analysis") is None
+    assert snapshots.load("snap1") is not None and snapshots.load("snap2") is not None
+    assert sum(size for _, size, _ in cache.entries()) <= 2.5 * MB
@@ -0,0 +1,74 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+
+from analysis_jobs import EVENTS_FILE, JOB_DONE
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setenv("RDA_JOBS_DIR", str(tmp_path / "jobs"))
+    return importlib.import_module("api")
+
+
+class FinishedJob:
+    status, error = JOB_DONE, None
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+
+    def path(self, name):
+        return str(self.workspace / name)
+
+
+def collect(events):
+    async def drain():
+        return [item async for item in events]
+    return asyncio.run(drain())
+
+
+def test_events_are_read_in_bounded_chunks(api, tmp_path, monkeypatch):
+    records = [{"event": "insn", "addr": i} for i in range(200)]
+    records[50] = {"event": "progress", "percent": 25.0}
+    records[199] = {"event": "progress", "percent": 100.0}
+    with open(tmp_path / EVENTS_FILE, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+    reads = []
+    real_open = open
+
+    class CountingFile:
+        def __init__(self, f):
+            self._f = f
+
+        def read(self, size=-1):
+            reads.append(size)
+            return self._f.read(size)
+
+        def __getattr__(self, name):
+            return getattr(self._f, name)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self._f.close()
+
+    monkeypatch.setattr(api, "EVENT_READ_BYTES", 100)
+    monkeypatch.setattr(api, "open", lambda *a, **k: CountingFile(real_open(*a, **k)),
+                        raising=False)
+    events = collect(api.follow_job_events(FinishedJob(tmp_path)))
+
+    assert events == [(51, "progress", {"percent": 25.0}),
+                      (200, "progress", {"percent": 100.0}),
+                      (None, "status", {"status": JOB_DONE, "error": None})]
+    assert reads and all(0 < size <= 100 for size in reads)
+
+
+def test_resuming_after_an_event_id_skips_earlier_records(api, tmp_path):
+    with open(tmp_path / EVENTS_FILE, "w") as f:
+        for percent in (10.0, 20.0, 30.0):
+            f.write(json.dumps({"event": "progress", "percent": percent}) + "\n")
+    events = collect(api.follow_job_events(FinishedJob(tmp_path), after=2))
+    assert events[0] == (3, "progress", {"percent": 30.0})
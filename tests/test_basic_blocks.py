@@ -0,0 +1,56 @@
+from capstone import CS_ARCH_X86, CS_MODE_64, Cs
+
+import rda_disassembler_enhanced as rda
+
+BASE = 0x1000
+
+# 0x1000 xor eax, eax ; 0x1002 test eax, eax ; 0x1004 je 0x1009
+# 0x1006 nop ; 0x1007 jmp 0x100a
+# 0x1009 nop                          (je target, falls into 0x100a)
+# 0x100a ret
+CODE = bytes.fromhex("31c0" "85c0" "7403" "90" "eb01" "90" "c3")
+
+
+def sweep(code=CODE, base=BASE):
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    return rda.linear_sweep_disassemble(md, code, base).finish()
+
+
+def test_blocks_split_at_branches_and_their_targets():
+    blocks = rda.build_basic_blocks(sweep())
+    assert {start: (b["end"], b["insn_count"], b["successors"]) for start, b in blocks.items()} == {
+        0x1000: (0x1006, 3, [0x1006, 0x1009]),
+        0x1006: (0x1009, 2, [0x100a]),
+        0x1009: (0x100a, 1, [0x100a]),
+        0x100a: (0x100b, 1, []),
+    }
+    assert [b["first"] for b in blocks.values()] == [0, 3, 5, 6]
+
+
+def test_a_gap_in_the_decoded_code_ends_the_block():
+    # Two runs of nops with undecoded bytes between them
+    builder = rda.InsnTableBuilder()
+    for addr in (0x1000, 0x1001, 0x1010, 0x1011):
+        builder.append(addr, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET)
+    blocks = rda.build_basic_blocks(builder.finish())
+    assert {start: (b["end"], b["successors"]) for start, b in blocks.items()} == {
+        0x1000: (0x1002, []),
+        0x1010: (0x1012, []),
+    }
+
+
+def test_unresolved_branches_only_split_windows_on_request():
+    # je to an address outside the table
+    table = sweep(bytes.fromhex("90" "7410" "90"))
+    assert list(rda.build_basic_blocks(table)) == [BASE]
+    assert list(rda.build_basic_blocks(table, split_unresolved=True)) == [BASE, BASE + 3]
+
+
+def test_block_graph_has_one_node_per_block():
+    cfg_graph, blocks = rda.build_cfg(sweep(), None)
+    assert sorted(cfg_graph.nodes()) == sorted(blocks)
+    assert sorted(cfg_graph.edges()) == [(0x1000, 0x1006), (0x1000, 0x1009),
+                                         (0x1006, 0x100a), (0x1009, 0x100a)]
+    assert cfg_graph.nodes[0x1000]["insn_count"] == 3
+    insn_graph, no_blocks = rda.build_cfg(sweep(), None, insn_level=True)
+    assert no_blocks is None and insn_graph.number_of_nodes() == 7
@@ -0,0 +1,88 @@
+import pytest
+from capstone import (CS_ARCH_ARM, CS_ARCH_ARM64, CS_ARCH_MIPS, CS_ARCH_PPC, CS_ARCH_RISCV,
+                      CS_ARCH_X86, CS_MODE_32, CS_MODE_64, CS_MODE_ARM, CS_MODE_BIG_ENDIAN,
+                      CS_MODE_LITTLE_ENDIAN, CS_MODE_MIPS32, CS_MODE_RISCV64, CS_MODE_RISCVC, Cs)
+
+import rda_disassembler_enhanced as rda
+
+NONE, COND, JUMP, CALL, RET = (rda.BRANCH_NONE, rda.BRANCH_COND, rda.BRANCH_JUMP,
+                               rda.BRANCH_CALL, rda.BRANCH_RET)
+
+# (arch, mode, [(bytes, disassembly, kind)]), decoded in one run per arch
+CASES = {
+    "x86": (CS_ARCH_X86, CS_MODE_64, [
+        ("c3", "ret ", RET),
+        ("c20800", "ret 8", RET),
+        ("ebfe", "jmp 0x1004", JUMP),
+        ("ffe0", "jmp rax", JUMP),
+        ("7402", "je 0x100c", COND),
+        ("e800000000", "call 0x100f", CALL),
+        ("ffd0", "call rax", CALL),
+        ("90", "nop ", NONE),
+    ]),
+    # ARM writes to pc that Capstone gives no branch group
+    "arm": (CS_ARCH_ARM, CS_MODE_ARM, [
+        ("1080bde8", "pop {r4, pc}", RET),
+        ("0080bde8", "ldm sp!, {pc}", RET),
+        ("04f09de4", "pop {pc}", RET),
+        ("0ef0a0e1", "mov pc, lr", RET),
+        ("1eff2fe1", "bx lr", RET),
+        ("0080bd18", "ldmne sp!, {pc}", COND),
+        ("1eff2f01", "bxeq lr", COND),
+        ("108091e8", "ldm r1, {r4, pc}", JUMP),
+        ("03f0a0e1", "mov pc, r3", JUMP),
+        ("03f08fe0", "add pc, pc, r3", JUMP),
+        ("13ff2fe1", "bx r3", JUMP),
+        ("33ff2fe1", "blx r3", CALL),
+        ("1040bde8", "pop {r4, lr}", NONE),
+        ("08309fe5", "ldr r3, [pc, #8]", NONE),
+    ]),
+    "aarch64": (CS_ARCH_ARM64, CS_MODE_ARM, [
+        ("c0035fd6", "ret ", RET),
+        ("c0031fd6", "br x30", RET),
+        ("60021fd6", "br x19", JUMP),
+        ("03000014", "b #0x1018", JUMP),
+        ("03000094", "bl #0x101c", CALL),
+        ("60003fd6", "blr x3", CALL),
+        ("40000054", "b.eq #0x1020", COND),
+        ("400000b4", "cbz x0, #0x1024", COND),
+    ]),
+    "mips": (CS_ARCH_MIPS, CS_MODE_MIPS32 + CS_MODE_LITTLE_ENDIAN, [
+        ("0800e003", "jr $ra", RET),
+        ("08002003", "jr $t9", JUMP),
+        ("09f82003", "jalr $t9", CALL),
+        ("03008510", "beq $a0, $a1, 0x101c", COND),
+    ]),
+    "riscv": (CS_ARCH_RISCV, CS_MODE_RISCV64 | CS_MODE_RISCVC, [
+        ("8280", "c.jr ra", RET),
+        ("8287", "c.jr a5", JUMP),
+        ("67800000", "ret ", RET),
+        ("e7800000", "jalr ra", CALL),
+        ("6f00c000", "j 0xc", JUMP),
+        ("ef00c000", "jal 0xc", CALL),
+        ("63040000", "beqz zero, 8", COND),
+        ("0295", "c.jalr a0", CALL),
+    ]),
+    "ppc": (CS_ARCH_PPC, CS_MODE_32 | CS_MODE_BIG_ENDIAN, [
+        ("4e800020", "blr ", RET),
+        ("4e800420", "bctr ", JUMP),
+        ("48000010", "b 0x1018", JUMP),
+        ("48000011", "bl 0x101c", CALL),
+        ("41820010", "beq 0x1020", COND),
+        ("4e800421", "bctrl ", CALL),
+    ]),
+}
+
+
+@pytest.mark.parametrize("detail", [True, False], ids=["detail", "lite"])
+@pytest.mark.parametrize("arch", sorted(CASES))
+def test_branch_kinds(arch, detail):
+    cs_arch, cs_mode, cases = CASES[arch]
+    md = Cs(cs_arch, cs_mode)
+    md.detail = detail
+    rda.branch_classifier.cache_clear()
+    code = bytes.fromhex("".join(hex_bytes for hex_bytes, _text, _kind in cases))
+    decoded = [(f"{mnemonic} {op_str}", flags)
+               for (_addr, _size, mnemonic, op_str, flags, _target)
+               in rda.decode_instructions(md, code, 0x1000)]
+    assert decoded == [(text, kind) for _hex, text, kind in cases]
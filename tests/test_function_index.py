@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+from elftools.elf.elffile import ELFFile
+
+from rda_disassembler_enhanced import FunctionIndex
+
+TEST_PROGRAM = os.path.join(os.path.dirname(__file__), os.pardir, "test_program")
+
+# f [0x100, 0x110), a gap, then g [0x120, 0x130) and h [0x130, 0x131)
+INDEX = FunctionIndex([0x100, 0x120, 0x130], [0x110, 0x130, 0x131], ["f", "g", "h"])
+
+
+def test_lookup_returns_name_and_offset_inside_intervals_only():
+    assert INDEX.lookup(0x100) == ("f", 0)
+    assert INDEX.lookup(0x10f) == ("f", 0xf)
+    assert INDEX.lookup(0x130) == ("h", 0)
+    for outside in (0x0, 0xff, 0x110, 0x11f, 0x131):
+        assert INDEX.lookup(outside) is None
+
+
+def test_vectorized_lookup_agrees_with_lookup():
+    addrs = np.arange(0xf0, 0x140, dtype=np.uint64)
+    idx, offsets = INDEX.lookup_indices(addrs)
+    for addr, func, off in zip(addrs.tolist(), idx.tolist(), offsets.tolist()):
+        found = INDEX.lookup(addr)
+        assert (found is None and func == -1 and off == 0) or found == (INDEX.names[func], off)
+    assert INDEX.annotate([0x100, 0x125, 0x115]) == ["<f>", "<g+0x5>", ""]
+
+
+def test_partition_slices_sorted_addresses_by_function():
+    addrs = np.array([0x0f0, 0x100, 0x104, 0x112, 0x120, 0x12f, 0x130, 0x200], dtype=np.uint64)
+    lo, hi = INDEX.partition(addrs)
+    assert [addrs[a:b].tolist() for a, b in zip(lo.tolist(), hi.tolist())] == [
+        [0x100, 0x104], [0x120, 0x12f], [0x130]]
+
+
+def test_from_elf_sizes_sizeless_symbols_up_to_the_next_function():
+    with open(TEST_PROGRAM, "rb") as f:
+        index = FunctionIndex.from_elf(ELFFile(f))
+    functions = {name: (start, end) for name, start, end in index}
+    assert functions["main"] == (0x40114d, 0x40114d + 37)
+    # frame_dummy has st_size 0 and is followed by test_function
+    assert functions["frame_dummy"] == (0x401130, 0x401136)
+    assert index.lookup(0x401140) == ("test_function", 0xa)
+    assert list(index.starts) == sorted(index.starts)
+    assert all(index.ends[:-1] <= index.starts[1:])
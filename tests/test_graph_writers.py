@@ -0,0 +1,72 @@
+import networkx as nx
+import numpy as np
+import pydot
+import pytest
+from capstone import CS_ARCH_X86, CS_MODE_64, Cs
+
+import rda_disassembler_enhanced as rda
+
+# pydot's parser still uses the pre-3.0 pyparsing method names
+pytestmark = pytest.mark.filterwarnings("ignore:'.*' deprecated - use")
+
+BASE = 0x1000
+
+# 0x1000 test eax, eax ; 0x1002 je 0x1005 ; 0x1004 nop ; 0x1005 ret
+CODE = bytes.fromhex("85c0" "7401" "90" "c3")
+
+
+def cfg(insn_level=False):
+    table = rda.linear_sweep_disassemble(Cs(CS_ARCH_X86, CS_MODE_64), CODE, BASE).finish()
+    cfg_graph, blocks = rda.build_cfg(table, None, insn_level=insn_level)
+    return table, cfg_graph, blocks
+
+
+def edge_set(graph):
+    return {(int(str(src).strip('"'), 16), int(str(dst).strip('"'), 16))
+            for src, dst in graph.edges()}
+
+
+def test_dot_parses_back_to_the_same_graph(tmp_path):
+    table, cfg_graph, blocks = cfg()
+    path = tmp_path / "cfg.dot"
+    rda.save_cfg(cfg_graph, table, str(path), blocks, "dot")
+    parsed = nx.nx_pydot.from_pydot(pydot.graph_from_dot_file(str(path))[0])
+    assert edge_set(parsed) == set(cfg_graph.edges())
+    label = parsed.nodes["0x1000"]["label"]
+    assert "0x00001000: test eax, eax\\l" in label and "je 0x1005" in label
+
+
+def test_dot_labels_are_escaped(tmp_path):
+    path = tmp_path / "g.dot"
+    rda.write_dot(str(path), iter([(1, {"label": rda.dot_escape('say "hi" \\o/')})]),
+                  iter([(1, 1)]))
+    node = pydot.graph_from_dot_file(str(path))[0].get_node('"0x1"')[0]
+    assert node.get("label") == '"say \\"hi\\" \\\\o/"'
+
+
+def test_graphml_round_trips_with_block_attributes(tmp_path):
+    table, cfg_graph, blocks = cfg()
+    path = tmp_path / "cfg.graphml"
+    rda.save_cfg(cfg_graph, table, str(path), blocks, "graphml")
+    parsed = nx.read_graphml(str(path))
+    assert edge_set(parsed) == set(cfg_graph.edges())
+    assert parsed.nodes["0x1000"] == {"end": 0x1004, "insn_count": 2}
+
+
+def test_npz_matches_the_cache_layout(tmp_path):
+    table, cfg_graph, blocks = cfg()
+    path = tmp_path / "cfg.npz"
+    rda.save_cfg(cfg_graph, table, str(path), blocks, "npz")
+    with np.load(str(path)) as arrays:
+        assert arrays["nodes"].tolist() == sorted(blocks)
+        assert {tuple(edge) for edge in arrays["edges"].tolist()} == set(cfg_graph.edges())
+        assert arrays["insn_count"].tolist() == [blocks[start]["insn_count"]
+                                                 for start in sorted(blocks)]
+
+
+def test_instruction_level_graph_has_no_block_columns(tmp_path):
+    table, cfg_graph, blocks = cfg(insn_level=True)
+    rda.save_cfg(cfg_graph, table, str(tmp_path / "cfg.npz"), blocks, "npz")
+    with np.load(str(tmp_path / "cfg.npz")) as arrays:
+        assert set(arrays.files) == {"nodes", "edges"}
+        assert len(arrays["nodes"]) == len(table)
@@ -0,0 +1,20 @@
+import rda_disassembler_enhanced as rda
+
+LINEAR = {"disasm_mode": "linear", "detail": False, "gap_sweep": True}
+
+
+def test_same_linear_options_match_whatever_the_gap_sweep():
+    assert rda.decode_option_mismatch(LINEAR, dict(LINEAR, gap_sweep=False)) == []
+
+
+def test_recursive_baseline_is_not_reused_by_a_linear_run():
+    baseline = {"disasm_mode": "recursive", "detail": False, "gap_sweep": False}
+    assert rda.decode_option_mismatch(baseline, LINEAR) == ["disasm_mode", "gap_sweep"]
+
+
+def test_detail_mode_must_match():
+    assert rda.decode_option_mismatch(dict(LINEAR, detail=True), LINEAR) == ["detail"]
+
+
+def test_baseline_without_options_is_not_reused():
+    assert rda.decode_option_mismatch(None, LINEAR) == ["disasm_mode", "detail"]
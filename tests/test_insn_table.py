@@ -0,0 +1,67 @@
+import numpy as np
+
+import rda_disassembler_enhanced as rda
+
+
+def build(rows):
+    builder = rda.InsnTableBuilder()
+    for row in rows:
+        builder.append(*row)
+    return builder, builder.finish()
+
+
+def test_finish_sorts_and_keeps_the_last_decode_of_an_address():
+    _builder, table = build([
+        (0x1004, "ret", "", 1, rda.BRANCH_RET, rda.NO_TARGET),
+        (0x1000, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+        (0x1000, "jmp", "0x1004", 2, rda.BRANCH_JUMP, 0x1004),  # overlapping section
+    ])
+    assert list(table.rows()) == [(0x1000, "jmp", "0x1004", 2), (0x1004, "ret", "", 1)]
+    assert table[0x1000] == ("jmp", "0x1004", 2)
+    assert 0x1001 not in table and table.index_of(0x1001) == -1
+
+
+def test_mnemonics_and_operands_are_interned():
+    builder, table = build([
+        (0x1000, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+        (0x1001, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+        (0x1002, "push", "rbp", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+        (0x1003, "pop", "rbp", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+    ])
+    assert builder.mnemonics == ["nop", "push", "pop"]
+    assert builder.operands == ["", "rbp"]
+    assert table.mnem_ids.tolist() == [0, 0, 1, 2]
+    assert table.op_ids.tolist() == [0, 0, 1, 1]
+
+
+def test_extend_from_reinterns_into_the_new_pools():
+    _src_builder, src = build([
+        (0x2000, "push", "rbp", 1, rda.BRANCH_NONE, rda.NO_TARGET),
+        (0x2001, "ret", "", 1, rda.BRANCH_RET, rda.NO_TARGET),
+    ])
+    builder = rda.InsnTableBuilder()
+    builder.append(0x1000, "ret", "", 1, rda.BRANCH_RET, rda.NO_TARGET)
+    builder.extend_from(src, 0, len(src))
+    assert list(builder.finish().rows()) == [(0x1000, "ret", "", 1), (0x2000, "push", "rbp", 1),
+                                             (0x2001, "ret", "", 1)]
+
+
+def test_fallthrough_stops_at_terminators_and_gaps():
+    _builder, table = build([
+        (0x1000, "je", "0x1010", 2, rda.BRANCH_COND, 0x1010),
+        (0x1002, "jmp", "0x1010", 2, rda.BRANCH_JUMP, 0x1010),
+        (0x1004, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET),   # next byte not decoded
+        (0x1010, "call", "0x9000", 5, rda.BRANCH_CALL, 0x9000),
+        (0x1015, "ret", "", 1, rda.BRANCH_RET, rda.NO_TARGET),
+    ])
+    assert table.fallthrough_indices().tolist() == [1, -1, -1, 4, -1]
+    # Calls return to the fall-through; their targets aren't jump edges
+    assert table.branch_indices().tolist() == [3, 3, -1, -1, -1]
+
+
+def test_arrays_round_trip():
+    _builder, table = build([(0x1000, "nop", "", 1, rda.BRANCH_NONE, rda.NO_TARGET)])
+    copy = rda.InsnTable.from_arrays(table.to_arrays(), table.mnemonics, table.operands)
+    assert list(copy.rows()) == list(table.rows())
+    assert all(np.array_equal(getattr(copy, name), getattr(table, name))
+               for name in rda.InsnTable.COLUMNS)
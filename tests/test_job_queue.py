@@ -0,0 +1,23 @@
+import json
+
+from analysis_jobs import JOB_FAILED, JobQueue
+
+
+def test_job_fails_when_no_worker_can_be_started(tmp_path, monkeypatch):
+    finished = []
+    jobs = JobQueue(jobs_dir=str(tmp_path / "jobs"), cache_dir=str(tmp_path / "cache"),
+                    on_finish=finished.append)
+
+    def broken_spawn():
+        raise OSError("cannot fork")
+
+    monkeypatch.setattr(jobs, "_spawn_worker", broken_spawn)
+    job = jobs.create("fw.bin")
+    jobs._run(job)
+
+    assert job.status == JOB_FAILED
+    assert job.error == "OSError: cannot fork"
+    assert job.finished is not None
+    assert finished == [job]
+    with open(job.path("job.json")) as f:
+        assert json.load(f)["status"] == JOB_FAILED
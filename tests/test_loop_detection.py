@@ -0,0 +1,47 @@
+import networkx as nx
+
+import rda_disassembler_enhanced as rda
+from rda_disassembler_enhanced import detect_infinite_loops_in_cfg
+
+
+def graph(edges, nodes=()):
+    cfg = nx.DiGraph()
+    cfg.add_nodes_from(nodes)
+    cfg.add_edges_from(edges)
+    return cfg
+
+
+def test_closed_multi_node_scc_is_reported():
+    # 0x10 -> 0x20 -> 0x30 -> 0x20: {0x20, 0x30} can never be left
+    cfg = graph([(0x10, 0x20), (0x20, 0x30), (0x30, 0x20)])
+    assert detect_infinite_loops_in_cfg(cfg) == [[0x20, 0x30]]
+
+
+def test_self_loop_is_reported():
+    cfg = graph([(0x10, 0x20), (0x20, 0x20)])
+    assert detect_infinite_loops_in_cfg(cfg) == [[0x20]]
+
+
+def test_scc_with_exit_edge_is_not_reported():
+    # The cycle 0x20 <-> 0x30 can leave to 0x40, which returns
+    cfg = graph([(0x10, 0x20), (0x20, 0x30), (0x30, 0x20), (0x30, 0x40)])
+    assert detect_infinite_loops_in_cfg(cfg) == []
+
+
+def test_plain_sink_block_is_not_reported():
+    cfg = graph([(0x10, 0x20)], nodes=[0x30])
+    assert detect_infinite_loops_in_cfg(cfg) == []
+
+
+def test_loops_are_sorted_by_first_address():
+    cfg = graph([(0x50, 0x60), (0x60, 0x50), (0x10, 0x10), (0x00, 0x10), (0x00, 0x50)])
+    assert detect_infinite_loops_in_cfg(cfg) == [[0x10], [0x50, 0x60]]
+
+
+def test_alert_lists_members_as_a_set_and_cycles_as_paths(monkeypatch):
+    lines = []
+    monkeypatch.setattr(rda, "log_message", lambda msg, *args, **kwargs: lines.append(msg))
+    cfg = graph([(0x10, 0x20), (0x20, 0x30), (0x30, 0x20)])
+    rda.report_infinite_loops(detect_infinite_loops_in_cfg(cfg), cfg, cycles_per_loop=1)
+    assert lines[1] == "  Loop 1: {0x20, 0x30}"
+    assert lines[2].startswith("    Cycle 1.1: ") and " -> " in lines[2]
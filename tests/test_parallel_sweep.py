@@ -0,0 +1,53 @@
+import pytest
+from capstone import CS_ARCH_X86, CS_MODE_64, Cs
+
+import rda_disassembler_enhanced as rda
+
+SEC_ADDR = 0x1000
+
+# 10-byte movabs, 5-byte mov, 1-byte nop, 7-byte lea and a 2-byte jmp:
+# fixed-size windows rarely fall on an instruction boundary
+CODE = (bytes.fromhex("48b88877665544332211")
+        + bytes.fromhex("b801000000")
+        + bytes.fromhex("90")
+        + bytes.fromhex("488d0500100000")
+        + bytes.fromhex("ebf0")) * 40
+
+
+def serial_rows(md, code):
+    return list(rda.linear_sweep_disassemble(md, code, SEC_ADDR).finish().rows())
+
+
+def chunked_rows(md, code, path, max_chunk):
+    rda._init_sweep_worker(str(path), CS_ARCH_X86, CS_MODE_64)
+    chunks = rda.plan_sweep_chunks(SEC_ADDR, len(code), [], min_chunk=1, max_chunk=max_chunk)
+    results = [rda._sweep_chunk((0, SEC_ADDR, len(code), start, end)) for (start, end) in chunks]
+    table = rda.InsnTableBuilder()
+    rda._merge_sweep_chunks(md, code, SEC_ADDR, chunks, results, table)
+    return chunks, list(table.finish().rows())
+
+
+@pytest.mark.parametrize("max_chunk", [7, 16, 33, 64, 101])
+def test_chunk_boundaries_inside_instructions_merge_to_serial_result(tmp_path, max_chunk):
+    path = tmp_path / "code.bin"
+    path.write_bytes(CODE)
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+
+    chunks, rows = chunked_rows(md, CODE, path, max_chunk)
+    serial = serial_rows(md, CODE)
+
+    boundaries = {addr for (addr, _m, _o, _s) in serial}
+    assert any(start not in boundaries for (start, _end) in chunks[1:])
+    assert rows == serial
+
+
+def test_undecodable_bytes_stop_the_merge_like_the_serial_sweep(tmp_path):
+    # 0x06 (push es) is invalid in 64-bit mode: the serial sweep stops there
+    code = CODE[:225] + b"\x06" + CODE[:100]
+    path = tmp_path / "code.bin"
+    path.write_bytes(code)
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+
+    _chunks, rows = chunked_rows(md, code, path, 48)
+    assert rows == serial_rows(md, code)
+    assert rows[-1][0] < SEC_ADDR + 225
@@ -0,0 +1,63 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+import rda_disassembler_enhanced as rda
+
+# Functions a [0x100, 0x200), b [0x200, 0x300), c [0x300, 0x400)
+FUNCTIONS = rda.FunctionIndex([0x100, 0x200, 0x300], [0x200, 0x300, 0x400], ["a", "b", "c"])
+
+# a tail-jumps into b, b jumps back into a: {0x180, 0x200, 0x280} is closed
+CROSS = [(0x100, 0x180), (0x180, 0x200), (0x200, 0x280), (0x280, 0x180)]
+# c spins on its own
+LOCAL = [(0x300, 0x340), (0x340, 0x340)]
+
+
+def in_memory(edges):
+    cfg = nx.DiGraph(edges)
+    loops, _cycles, _results = rda.partitioned_infinite_loops(cfg, FUNCTIONS)
+    return loops
+
+
+def streamed(edges):
+    nodes = sorted({node for edge in edges for node in edge})
+    blocks = {"start": np.array(nodes, dtype=np.uint64),
+              "end": np.array([node + 0x10 for node in nodes], dtype=np.uint64),
+              "insn_count": np.ones(len(nodes), dtype=np.uint64)}
+    edges = sorted(edges)
+    spilled = {"src": np.array([src for src, _dst in edges], dtype=np.uint64),
+               "dst": np.array([dst for _src, dst in edges], dtype=np.uint64)}
+    loops, _cycles, _results = rda.stream_infinite_loops(blocks, spilled, FUNCTIONS)
+    return loops
+
+
+@pytest.mark.parametrize("detect", [in_memory, streamed])
+def test_closed_scc_spanning_two_functions_is_reported(detect):
+    assert detect(CROSS + LOCAL) == [[0x180, 0x200, 0x280], [0x340]]
+
+
+@pytest.mark.parametrize("detect", [in_memory, streamed])
+def test_cross_function_cycle_with_an_exit_is_not_reported(detect):
+    # b can also leave to c, which returns
+    assert detect(CROSS + [(0x280, 0x300), (0x300, 0x3f0)]) == []
+
+
+@pytest.mark.parametrize("detect", [in_memory, streamed])
+def test_matches_whole_graph_detection(detect):
+    edges = CROSS + LOCAL + [(0x1f0, 0x100), (0x100, 0x1f0), (0x2f0, 0x1f0)]
+    assert detect(edges) == rda.detect_infinite_loops_in_cfg(nx.DiGraph(edges))
+
+
+def test_incremental_reanalyzes_only_dirty_functions_under_the_budget():
+    # a and c spin on their own; b changed and is now too large for the budget
+    edges = [(0x100, 0x140), (0x140, 0x140), (0x300, 0x340), (0x340, 0x340),
+             (0x200, 0x210), (0x210, 0x220), (0x220, 0x210)]
+    baseline_results = [("a", 2, "ok", 1), ("b", 2, "ok", 0),
+                        ("c", 2, rda.LOOP_BUDGET_MARKER, 0)]
+    loops, _cycles, results = rda.incremental_infinite_loops(
+        nx.DiGraph(edges), FUNCTIONS, [[0x140]], baseline_results, [(0x200, 0x300)],
+        max_nodes=2)
+    # a's loop is kept from the baseline; c failed there and is retried; b is over budget
+    assert loops == [[0x140], [0x340]]
+    assert [(name, status) for (name, _n, status, _l) in results] == [
+        ("a", "ok"), ("b", rda.LOOP_BUDGET_MARKER), ("c", "ok")]
@@ -0,0 +1,26 @@
+import pytest
+
+from analysis_profile import StageProfiler, peak_rss, reset_peak_rss
+
+
+def test_profiler_reports_this_runs_peak_not_an_earlier_one():
+    block = bytearray(256 * 1024 * 1024)  # an earlier job's peak
+    block[::4096] = b"\1" * len(block[::4096])
+    del block
+    if not reset_peak_rss():
+        pytest.skip("peak RSS cannot be reset on this platform")
+    profiler = StageProfiler()
+    with profiler.stage("small"):
+        pass
+    peak_mb = profiler.to_dict()["total"]["peak_rss_mb"]
+    assert peak_mb is not None and peak_mb < 200
+
+
+def test_peak_rss_grows_with_the_run():
+    if not reset_peak_rss():
+        pytest.skip("peak RSS cannot be reset on this platform")
+    before = peak_rss()
+    block = bytearray(64 * 1024 * 1024)
+    block[::4096] = b"\1" * len(block[::4096])
+    assert peak_rss() >= before + 60 * 1024 * 1024
+    del block
@@ -0,0 +1,59 @@
+import pytest
+
+from analysis_query import MAX_PAGE_SIZE, QueryError, _page, parse_address
+
+
+def test_pages_walk_the_whole_range_once():
+    seen, cursor = [], None
+    while True:
+        first, stop, cursor = _page(10, 35, cursor, 10)
+        seen.extend(range(first, stop))
+        if cursor is None:
+            break
+    assert seen == list(range(10, 35))
+
+
+def test_first_page_starts_at_lo_and_last_page_has_no_cursor():
+    assert _page(5, 8, None, 10) == (5, 8, None)
+    assert _page(5, 25, None, 10) == (5, 15, "15")
+    assert _page(5, 25, "15", 10) == (15, 25, None)
+
+
+def test_empty_range():
+    assert _page(7, 7, None, 10) == (7, 7, None)
+
+
+def test_cursor_at_the_end_gives_an_empty_last_page():
+    assert _page(0, 20, "20", 10) == (20, 20, None)
+
+
+@pytest.mark.parametrize("cursor", ["abc", "", "1.5", "0x10"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(QueryError):
+        _page(0, 100, cursor, 10)
+
+
+@pytest.mark.parametrize("cursor", ["-1", "4", "101"])
+def test_cursor_outside_the_query_is_rejected(cursor):
+    with pytest.raises(QueryError):
+        _page(5, 100, cursor, 10)
+
+
+@pytest.mark.parametrize("limit", [0, -1, MAX_PAGE_SIZE + 1])
+def test_limit_out_of_bounds_is_rejected(limit):
+    with pytest.raises(QueryError):
+        _page(0, 100, None, limit)
+
+
+def test_limit_bounds_are_inclusive():
+    assert _page(0, 5000, None, 1) == (0, 1, "1")
+    assert _page(0, 5000, None, MAX_PAGE_SIZE) == (0, MAX_PAGE_SIZE, str(MAX_PAGE_SIZE))
+
+
+def test_parse_address():
+    assert parse_address("0x1139") == 0x1139
+    assert parse_address("4409") == 4409
+    assert parse_address(None) is None
+    for text in ("-0x10", "zz", ""):
+        with pytest.raises(QueryError):
+            parse_address(text)
@@ -0,0 +1,50 @@
+from capstone import CS_ARCH_X86, CS_MODE_64, Cs
+
+import rda_disassembler_enhanced as rda
+
+BASE = 0x1000
+
+# 0x1000 jmp 0x1005
+# 0x1002 xor eax, eax + a lone 0xb8: data that only the gap sweep decodes
+# 0x1005 call 0x100b ; 0x100a ret
+# 0x100b nop ; 0x100c ret            (reached only through the call)
+CODE = bytes.fromhex("eb03" "31c0b8" "e801000000" "c3" "90" "c3")
+
+
+def disassemble(sweep_gaps):
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    sections = [(".text", CODE, BASE, len(CODE))]
+    builder, reached, total = rda.recursive_descent_disassemble(
+        md, sections, [BASE], sweep_gaps=sweep_gaps)
+    table = builder.finish()
+    return [(addr, mnemonic) for (addr, mnemonic, _op, _size) in table.rows()], reached, total
+
+
+def test_follows_jumps_and_calls_past_embedded_data():
+    rows, reached, total = disassemble(sweep_gaps=False)
+    assert rows == [(0x1000, "jmp"), (0x1005, "call"), (0x100a, "ret"),
+                    (0x100b, "nop"), (0x100c, "ret")]
+    assert (reached, total) == (len(CODE) - 3, len(CODE))
+
+
+def test_linear_sweep_is_desynchronised_by_the_same_data():
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    addrs = [addr for (addr, *_rest) in rda.linear_sweep_disassemble(md, CODE, BASE).finish().rows()]
+    assert 0x1005 not in addrs
+
+
+def test_gap_sweep_covers_unreached_bytes_without_overlap():
+    rows, reached, total = disassemble(sweep_gaps=True)
+    assert (0x1002, "xor") in rows
+    assert [addr for (addr, _m) in rows] == sorted({addr for (addr, _m) in rows})
+    # Reached bytes are still only what the descent found
+    assert (reached, total) == (len(CODE) - 3, len(CODE))
+    # The gap ends at 0x1005, so its truncated 0xb8 never runs into reached code
+    assert all(not 0x1004 <= addr < 0x1005 for (addr, _m) in rows)
+
+
+def test_seeds_outside_the_code_are_ignored():
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    builder, reached, _total = rda.recursive_descent_disassemble(
+        md, [(".text", CODE, BASE, len(CODE))], [0x9000], sweep_gaps=False)
+    assert len(builder.finish()) == 0 and reached == 0
@@ -0,0 +1,54 @@
+from capstone import CS_ARCH_X86, CS_MODE_64, Cs
+
+import rda_disassembler_enhanced as rda
+
+BASE = 0x1000
+
+# Mixed lengths so window ends fall inside instructions:
+# 0x1000 mov eax, 1 (5) ; 0x1005 nop (1) ; 0x1006 movabs rax, imm64 (10)
+# 0x1010 xor eax, eax (2) ; 0x1012 ret (1)
+CODE = bytes.fromhex("b801000000" "90" "48b88877665544332211" "31c0" "c3")
+
+
+def windows(code, size):
+    sizes = iter(size) if not isinstance(size, int) else None
+    window_size = (lambda: next(sizes)) if sizes else (lambda: size)
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    return [([row[0] for row in table.rows()], start, end)
+            for table, start, end in rda.stream_section_windows(md, code, BASE, window_size)]
+
+
+def serial_addrs(code):
+    md = Cs(CS_ARCH_X86, CS_MODE_64)
+    return [row[0] for row in rda.linear_sweep_disassemble(md, code, BASE).finish().rows()]
+
+
+def test_windows_concatenate_to_the_serial_sweep_for_any_size():
+    expected = serial_addrs(CODE)
+    for size in range(1, len(CODE) + 2):
+        result = windows(CODE, size)
+        assert [addr for addrs, _s, _e in result for addr in addrs] == expected
+        # Contiguous, covering the section, each holding what starts inside it
+        assert result[0][1] == BASE and result[-1][2] == BASE + len(CODE)
+        for (addrs, start, end), (_next, next_start, _e) in zip(result, result[1:]):
+            assert end == next_start
+        assert all(start <= addr < end for addrs, start, end in result for addr in addrs)
+
+
+def test_an_instruction_straddling_the_window_end_stays_whole():
+    # The 10-byte movabs starts 1 byte before the first 7-byte window ends
+    result = windows(CODE, 7)
+    assert result[0] == ([0x1000, 0x1005, 0x1006], BASE, 0x1010)
+    assert result[1] == ([0x1010, 0x1012], 0x1010, 0x1013)
+
+
+def test_window_size_is_read_per_window():
+    result = windows(CODE, [5, 1, 100])
+    assert [(start, end) for _a, start, end in result] == [
+        (0x1000, 0x1005), (0x1005, 0x1006), (0x1006, 0x1013)]
+
+
+def test_stops_at_an_invalid_instruction_like_the_serial_sweep():
+    code = CODE[:6] + b"\x06" + CODE[6:]  # 0x06 (push es) is invalid in 64-bit mode
+    result = windows(code, 4)
+    assert [addr for addrs, _s, _e in result for addr in addrs] == serial_addrs(code) == [0x1000, 0x1005]
@@ -0,0 +1,49 @@
+import random
+import string
+
+import rda_disassembler_enhanced as rda
+
+
+def old_scanner(data, base_addr, min_len=4):
+    """The per-byte scanner the regex replaced, kept as the reference."""
+    results, current, start = [], [], 0
+    printable = set(string.printable)
+    for i, byte_val in enumerate(data):
+        ch = chr(byte_val)
+        # Compared an int with str literals, so \x0b and \x0c always passed
+        if ch in printable and byte_val not in ("\x0B", "\x0C"):
+            if not current:
+                start = i
+            current.append(ch)
+        else:
+            if len(current) >= min_len:
+                results.append((base_addr + start, "".join(current)))
+            current = []
+    if len(current) >= min_len:
+        results.append((base_addr + start, "".join(current)))
+    return results
+
+
+def test_matches_the_old_scanner_including_vertical_tab_and_form_feed():
+    rng = random.Random(1234)
+    alphabet = list(range(0x20, 0x7f)) + [0x00, 0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x80, 0xff]
+    for _ in range(50):
+        data = bytes(rng.choice(alphabet) for _ in range(rng.randrange(0, 400)))
+        for min_len in (1, 4, 8):
+            assert rda.extract_printable_strings(data, 0x400, min_len) == \
+                old_scanner(data, 0x400, min_len)
+    assert rda.extract_printable_strings(b"\x00ab\x0bcd\x0c\x00", 0) == [(1, "ab\x0bcd\x0c")]
+
+
+def test_utf16le_strings_are_merged_in_address_order():
+    data = b"\x00ascii1\x00\x00" + "wide".encode("utf-16-le") + b"\x00\x00ascii2\x00"
+    assert rda.extract_printable_strings(data, 0x1000) == [(0x1001, "ascii1"), (0x1013, "ascii2")]
+    assert rda.extract_printable_strings(data, 0x1000, utf16=True) == [
+        (0x1001, "ascii1"), (0x1009, "wide"), (0x1013, "ascii2")]
+
+
+def test_max_results_stops_early():
+    data = b"\x00".join(b"str%d" % i for i in range(10))
+    assert rda.extract_printable_strings(data, 0, max_results=3) == [
+        (0, "str0"), (5, "str1"), (10, "str2")]
+    assert list(rda.iter_printable_strings(memoryview(data), 0))[-1] == (45, "str9")